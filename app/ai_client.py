@@ -1,17 +1,209 @@
  ##Handles OpenAi connnections: isolates API
 
-from openai import OpenAI
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, NamedTuple, Optional
 from app.config import Config
+from app import client_registry
+from app.cost_tracker import TokenAccountant, count_prompt_tokens
+from app.messages import to_api
+from app.models import record_latency
+from app.resilience import get_resilience
+from app.response_cache import get_response_cache, make_cache_key
+from app.scheduler import get_scheduler
+from app.telemetry import telemetry
+from app.usage_ledger import UNATTRIBUTED, get_usage_ledger
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class ChatResult:
+    """Response text plus what the API reported about the request"""
+    text: str = ""
+    model: str = ""
+    # response.usage from the API (authoritative token counts), if returned
+    usage: Optional[Any] = None
+    # True when served from the response cache (no tokens were billed)
+    cached: bool = False
+    # "stop", or "length" when the reply hit max_tokens
+    finish_reason: Optional[str] = None
+
+
+def estimate_request_tokens(messages, model: str, max_tokens: int = None) -> int:
+    """Token estimate used for the tokens-per-minute budget"""
+    output = Config.RATE_LIMIT_OUTPUT_ESTIMATE
+    if max_tokens:
+        output = min(output, max_tokens)
+    return count_prompt_tokens(messages, model) + output
+
+
+def _limits(max_tokens: int = None, stop=None) -> Dict[str, Any]:
+    """Optional request parameters that bound the reply"""
+    limits = {}
+    if max_tokens:
+        limits["max_tokens"] = max_tokens
+    if stop:
+        limits["stop"] = list(stop)
+    return limits
+
+
+def _used_tokens(usage) -> Optional[int]:
+    if usage is None or getattr(usage, "total_tokens", None) is None:
+        return None
+    return usage.total_tokens
+
+
+def _record_lost_hedge(model: str, messages, estimate: int, text: str = "", usage=None):
+    """
+    The losing copy of a hedged request is billed too: its tokens go to the
+    scheduler's budget (it was admitted with `estimate`) and the usage ledger
+    """
+    used = _used_tokens(usage)
+    if used is not None:
+        get_scheduler().adjust(estimate, used)
+    lost = TokenAccountant(model).measure_turn(messages, text or "", usage, model=model)
+    get_usage_ledger().record(UNATTRIBUTED, "hedge", lost)
+
+
+class _OpenStream(NamedTuple):
+    """A stream that was opened, and on which model"""
+    model: str
+    estimate: int
+    sent_at: float
+    stream: Any
+
+
+def _report_error(model: str, e: Exception):
+    telemetry.inc("openai_errors_total", model=model, error=e.__class__.__name__)
+    logger.warning("Error communicating with OpenAI (%s): %s", model, e)
+
 
 class AIClient:
-    def __init__(self):
-        """Initialises OPenAI connection with settings from config"""
-        #Initialise client
-        self.client = OpenAI(api_key=Config.OPENAI_API_KEY)
+    def __init__(self, client=None, model: str = None):
+        """
+        Initialises OPenAI connection with settings from config.
+        By default borrows the process-wide pooled client from client_registry
+        """
+        #Borrow the shared client unless one is passed in (e.g. for testing).
+        #It is looked up on each call, so a client replaced after
+        #client_registry.close_clients() is picked up
+        self._client = client
         #give client name so it can be accessed later
-        self.model = Config.MODEL_NAME
+        self.model = model or Config.MODEL_NAME
+
+    @property
+    def client(self):
+        return self._client or client_registry.get_client()
 
-    def get_chat_completion(self, messages, temperature:float=0.7) -> str:
+    def complete(self, messages, temperature:float=0.7,
+                 use_cache: bool = True, session_id=None, model: str = None,
+                 max_tokens: int = None, stop=None) -> ChatResult:
+        """
+        Sends list of messages to the AI and returns the response text
+        together with the token usage reported by the API
+
+        Args:
+
+        messages (list): list of message dictionaries (e.g. [{"role": "user",
+        ...}])
+        use_cache (bool): serve identical requests from the response cache;
+        pass False when varied answers are wanted
+        session_id: who is asking, for fair queueing in the scheduler
+        model (str): model for this request (e.g. picked by app.models
+        router); defaults to the client's model
+        max_tokens (int), stop (list): optional bounds on the reply (see
+        app.length_governor); result.finish_reason tells if it was cut off
+
+        Returns:
+
+        ChatResult: the AIs response text and usage
+        """
+        model = model or self.model
+        limits = _limits(max_tokens, stop)
+
+        if not (use_cache and Config.RESPONSE_CACHE_ENABLED):
+            return self._create(messages, temperature, session_id, model, limits)
+
+        # Identical concurrent requests share one upstream call
+        upstream = []
+
+        def compute():
+            upstream.append(self._create(messages, temperature, session_id, model, limits))
+            return upstream[0].text
+
+        key = make_cache_key(messages, model, temperature, limits)
+        # A reply cut off at max_tokens is not cached (it would be continued)
+        text, from_cache = get_response_cache().get_or_compute(
+            key, compute, should_store=lambda _: upstream[0].finish_reason != "length"
+        )
+        if from_cache:
+            return ChatResult(text=text, model=model, cached=True, finish_reason="stop")
+        return upstream[0]
+
+    def _create(self, messages, temperature:float=0.7, session_id=None,
+                model: str = None, limits: Dict[str, Any] = None) -> ChatResult:
+        """
+        Makes the actual API request, through the rate limiter / scheduler,
+        failing over to the backup models (see app.resilience)
+        """
+        model = model or self.model
+        limits = limits or {}
+        return get_resilience().failover(
+            model, lambda candidate: self._create_on(candidate, messages, temperature,
+                                                     session_id, limits)
+        )
+
+    def _create_on(self, model: str, messages, temperature: float, session_id,
+                   limits: Dict[str, Any]) -> ChatResult:
+        scheduler = get_scheduler()
+        resilience = get_resilience()
+        estimate = estimate_request_tokens(messages, model, limits.get("max_tokens"))
+
+        def create():
+            # Timed per attempt, so queueing and backoff are not included
+            with telemetry.span("upstream", model=model):
+                sent_at = time.perf_counter()
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=to_api(messages),
+                    temperature=temperature,
+                    **limits
+                )
+                record_latency(model, time.perf_counter() - sent_at)
+                return response
+
+        def discard(response):
+            _record_lost_hedge(model, messages, estimate, response.choices[0].message.content,
+                               getattr(response, "usage", None))
+
+        def send():
+            # Through the model's breaker, hedged if it runs late (a hedge
+            # is admitted only if the scheduler has room for it right now)
+            return resilience.call(model, "complete", create, discard=discard,
+                                   admit=lambda: scheduler.try_acquire(estimate))
+
+        try:
+            response = scheduler.call(session_id, estimate, send)
+            telemetry.inc("openai_requests_total", model=model)
+            used = _used_tokens(getattr(response, "usage", None))
+            if used is not None:
+                scheduler.adjust(estimate, used)
+            return ChatResult(
+                text=response.choices[0].message.content,
+                model=model,
+                usage=getattr(response, "usage", None),
+                finish_reason=response.choices[0].finish_reason,
+            )
+        except Exception as e:
+            _report_error(model, e)
+            raise e
+
+    def get_chat_completion(self, messages, temperature:float=0.7,
+                            use_cache: bool = True, session_id=None,
+                            model: str = None, max_tokens: int = None, stop=None) -> str:
         """
         Sends list of messages to the AI and returns text response
 
@@ -24,14 +216,304 @@ class AIClient:
 
         str: the AIs response text
         """
+        return self.complete(messages, temperature, use_cache, session_id, model,
+                             max_tokens, stop).text
+
+    def stream_chat_completion(self, messages, temperature:float=0.7,
+                               result: ChatResult = None,
+                               use_cache: bool = True,
+                               session_id=None,
+                               model: str = None,
+                               max_tokens: int = None,
+                               stop=None) -> Iterator[str]:
+        """
+        Sends list of messages to the AI and yields the response text as it
+        arrives, so the caller can show it before the whole reply is done
+
+        Args:
+
+        messages (list): list of message dictionaries (e.g. [{"role": "user",
+        ...}])
+        result (ChatResult): optional, filled in with the full text and usage
+        once the stream ends
+        use_cache (bool): a cached response is yielded in one piece and a
+        completed stream is stored (streams are not coalesced)
+        session_id: who is asking, for fair queueing in the scheduler
+        model (str): model for this request; defaults to the client's model
+        max_tokens (int), stop (list): optional bounds on the reply;
+        result.finish_reason tells if it was cut off
+
+        Yields:
+
+        str: the next piece (delta) of the AIs response text
+        """
+
+        model = model or self.model
+        if result is None:
+            result = ChatResult()
+        result.model = model
+        limits = _limits(max_tokens, stop)
+
+        cache = None
+        if use_cache and Config.RESPONSE_CACHE_ENABLED:
+            cache = get_response_cache()
+            key = make_cache_key(messages, model, temperature, limits)
+            cached_text = cache.get(key)
+            if cached_text is not None:
+                result.text = cached_text
+                result.cached = True
+                result.finish_reason = "stop"
+                yield cached_text
+                return
+
+        parts = []
+        completed = False
+        started = time.perf_counter()
+        # Rate limits, retries and failover apply to opening the stream;
+        # once tokens are flowing a failure is passed on to the caller
+        model, estimate, sent_at, stream = get_resilience().failover(
+            model, lambda candidate: self._open_stream(candidate, messages, temperature,
+                                                       session_id, limits)
+        )
+        result.model = model
+
+        try:
+            telemetry.inc("openai_requests_total", model=model)
+            for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    result.usage = chunk.usage
+                # some chunks (e.g. the final one) carry no choices or no text
+                if not chunk.choices:
+                    continue
+                if chunk.choices[0].finish_reason:
+                    result.finish_reason = chunk.choices[0].finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        # As the user sees it: includes queueing and retries
+                        telemetry.observe("ttft", time.perf_counter() - started, model=model)
+                        # The model's own latency, for the router
+                        record_latency(model, time.perf_counter() - sent_at)
+                    parts.append(delta)
+                    yield delta
+            completed = True
+            telemetry.observe("upstream", time.perf_counter() - sent_at, model=model)
+            used = _used_tokens(result.usage)
+            if used is not None:
+                get_scheduler().adjust(estimate, used)
+        except Exception as e:
+            _report_error(model, e)
+            raise e
+        finally:
+            # Also when the consumer stops early (e.g. a Streamlit rerun):
+            # give the connection back instead of holding it until GC
+            stream.close()
+            result.text = "".join(parts)
+            if cache is not None and completed and result.text and result.finish_reason != "length":
+                cache.set(key, result.text)
+
+    def _open_stream(self, model: str, messages, temperature: float, session_id,
+                     limits: Dict[str, Any]) -> _OpenStream:
+        """
+        Opens a stream on `model` through the scheduler and the model's
+        breaker, hedged if opening it runs late (see app.resilience)
+        """
+        estimate = estimate_request_tokens(messages, model, limits.get("max_tokens"))
+
+        def create():
+            # When this attempt was sent, i.e. after queueing and backoff
+            sent_at = time.perf_counter()
+            return sent_at, self.client.chat.completions.create(
+                model=model,
+                messages=to_api(messages),
+                temperature=temperature,
+                stream=True,
+                # the final chunk then carries the usage for the request
+                stream_options={"include_usage": True},
+                **limits
+            )
+
+        def discard(opened):
+            # Closed before any tokens were read: only the prompt is counted
+            opened[1].close()
+            _record_lost_hedge(model, messages, estimate)
+
+        def send():
+            return get_resilience().call(model, "stream", create, discard=discard,
+                                         admit=lambda: scheduler.try_acquire(estimate))
+
+        scheduler = get_scheduler()
+        try:
+            sent_at, stream = scheduler.call(session_id, estimate, send)
+        except Exception as e:
+            _report_error(model, e)
+            raise e
+        return _OpenStream(model, estimate, sent_at, stream)
+
+
+class AsyncAIClient:
+    """asyncio version of AIClient, for async servers and batch jobs"""
+
+    def __init__(self, client=None, model: str = None):
+        # The shared async client is bound to the running event loop, so it
+        # is looked up lazily on each call unless one is passed in
+        self._client = client
+        self.model = model or Config.MODEL_NAME
+
+    @property
+    def client(self):
+        return self._client or client_registry.get_async_client()
+
+    async def complete(self, messages, temperature: float = 0.7,
+                       session_id=None, model: str = None,
+                       max_tokens: int = None, stop=None) -> ChatResult:
+        """Async version of AIClient.complete (without the response cache)"""
+        model = model or self.model
+        limits = _limits(max_tokens, stop)
+        return await get_resilience().afailover(
+            model, lambda candidate: self._create_on(candidate, messages, temperature,
+                                                     session_id, limits)
+        )
+
+    async def _create_on(self, model: str, messages, temperature: float, session_id,
+                         limits: Dict[str, Any]) -> ChatResult:
+        scheduler = get_scheduler()
+        resilience = get_resilience()
+        estimate = estimate_request_tokens(messages, model, limits.get("max_tokens"))
+
+        async def create():
+            with telemetry.span("upstream", model=model):
+                sent_at = time.perf_counter()
+                response = await self.client.chat.completions.create(
+                    model=model,
+                    messages=to_api(messages),
+                    temperature=temperature,
+                    **limits
+                )
+                record_latency(model, time.perf_counter() - sent_at)
+                return response
+
+        async def discard(response):
+            _record_lost_hedge(model, messages, estimate, response.choices[0].message.content,
+                               getattr(response, "usage", None))
+
+        def send():
+            return resilience.acall(model, "complete", create, discard=discard,
+                                    admit=lambda: scheduler.try_acquire(estimate))
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model, 
-                messages=messages,
-                temperature=temperature
+            response = await scheduler.acall(session_id, estimate, send)
+            telemetry.inc("openai_requests_total", model=model)
+            used = _used_tokens(getattr(response, "usage", None))
+            if used is not None:
+                scheduler.adjust(estimate, used)
+            return ChatResult(
+                text=response.choices[0].message.content,
+                model=model,
+                usage=getattr(response, "usage", None),
+                finish_reason=response.choices[0].finish_reason,
             )
-            return response.choices[0].message.content
         except Exception as e:
-            print(f"Error communicating with OpenAi: {e}")
+            _report_error(model, e)
             raise e
+
+    async def get_chat_completion(self, messages, temperature: float = 0.7,
+                                  session_id=None, model: str = None) -> str:
+        """Async version of AIClient.get_chat_completion"""
+        return (await self.complete(messages, temperature, session_id, model)).text
+
+    async def stream_chat_completion(self, messages, temperature: float = 0.7,
+                                     result: ChatResult = None,
+                                     session_id=None,
+                                     model: str = None,
+                                     max_tokens: int = None,
+                                     stop=None) -> AsyncIterator[str]:
+        """Async version of AIClient.stream_chat_completion"""
+        model = model or self.model
+        if result is None:
+            result = ChatResult()
+        result.model = model
+        limits = _limits(max_tokens, stop)
+        parts = []
+        started = time.perf_counter()
+        model, estimate, sent_at, stream = await get_resilience().afailover(
+            model, lambda candidate: self._open_stream(candidate, messages, temperature,
+                                                       session_id, limits)
+        )
+        result.model = model
+
+        try:
+            telemetry.inc("openai_requests_total", model=model)
+            async for chunk in stream:
+                if getattr(chunk, "usage", None) is not None:
+                    result.usage = chunk.usage
+                if not chunk.choices:
+                    continue
+                if chunk.choices[0].finish_reason:
+                    result.finish_reason = chunk.choices[0].finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        telemetry.observe("ttft", time.perf_counter() - started, model=model)
+                        record_latency(model, time.perf_counter() - sent_at)
+                    parts.append(delta)
+                    yield delta
+            telemetry.observe("upstream", time.perf_counter() - sent_at, model=model)
+            used = _used_tokens(result.usage)
+            if used is not None:
+                get_scheduler().adjust(estimate, used)
+        except Exception as e:
+            _report_error(model, e)
+            raise e
+        finally:
+            await stream.close()
+            result.text = "".join(parts)
+
+    async def _open_stream(self, model: str, messages, temperature: float, session_id,
+                           limits: Dict[str, Any]) -> _OpenStream:
+        """Async version of AIClient._open_stream"""
+        estimate = estimate_request_tokens(messages, model, limits.get("max_tokens"))
+
+        async def create():
+            sent_at = time.perf_counter()
+            return sent_at, await self.client.chat.completions.create(
+                model=model,
+                messages=to_api(messages),
+                temperature=temperature,
+                stream=True,
+                stream_options={"include_usage": True},
+                **limits
+            )
+
+        async def discard(opened):
+            await opened[1].close()
+            _record_lost_hedge(model, messages, estimate)
+
+        def send():
+            return get_resilience().acall(model, "stream", create, discard=discard,
+                                          admit=lambda: scheduler.try_acquire(estimate))
+
+        scheduler = get_scheduler()
+        try:
+            sent_at, stream = await scheduler.acall(session_id, estimate, send)
+        except Exception as e:
+            _report_error(model, e)
+            raise e
+        return _OpenStream(model, estimate, sent_at, stream)
+
+
+_shared_lock = threading.Lock()
+_shared_ai_client = None
+
+
+def get_ai_client() -> AIClient:
+    """
+    Returns the process-wide AIClient that interviewers borrow.
+    It wraps the pooled client from client_registry.
+    """
+    global _shared_ai_client
+    if _shared_ai_client is None:
+        with _shared_lock:
+            if _shared_ai_client is None:
+                _shared_ai_client = AIClient()
+    return _shared_ai_client
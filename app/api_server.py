@@ -0,0 +1,516 @@
+# Headless HTTP API for the interviewer, on asyncio and the standard library.
+#
+# One event loop serves every connection; model calls go through the async
+# OpenAI client (AsyncAIClient), so a waiting turn costs a coroutine, not a
+# thread. Sessions live in a SessionStorage: idle ones are evicted to its
+# backend and cost nothing until their next turn.
+#
+#   python -m app.api_server --port 8080
+#   # against a local fake model:
+#   python -m tools.fake_openai_server --port 8089 &
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake python -m app.api_server
+#
+# Endpoints (JSON in and out):
+#   POST   /sessions                 {"job_role", "skills", "difficulty", "technique",
+#                                     "open": true, "temperature": 0.7, "use_cache": true}
+#                                    the opening comes from the question bank if it
+#                                    has these settings (then with its pre-generated
+#                                    "follow_ups"), unless "use_cache" is false
+#   GET    /sessions/{id}            settings and transcript
+#   DELETE /sessions/{id}
+#   POST   /sessions/{id}/turns      {"message", "temperature": 0.7, "stream": false,
+#                                     "from_index": null}
+#                                    with "stream" (or Accept: text/event-stream) the
+#                                    reply is sent as server-sent events:
+#                                    "delta" {"text"}, then "done" {"reply", "usage"}
+#                                    or "error" {"error"}. With "from_index" the turn
+#                                    starts a new branch after the first from_index
+#                                    messages (to answer or regenerate again)
+#   POST   /sessions/{id}/branch     {"branch"}: continue on another branch
+#   GET    /health
+#
+# Turns are billed to the user named in the USAGE_USER_HEADER request header
+# (see app.usage_ledger); once a daily budget is used up, turns get 429.
+import argparse
+import asyncio
+import json
+import logging
+import re
+import sys
+import uuid
+from contextlib import aclosing
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlsplit
+
+from app.ai_client import AsyncAIClient
+from app.config import Config
+from app.interviewer import Interviewer, InterviewerFactory
+from app.prompts import available_techniques
+from app.question_bank import get_question_bank
+from app.resilience import CircuitOpenError
+from app.scheduler import QueueTimeoutError
+from app.security import unwrap_user_input, validate_input, wrap_user_input
+from app.session_store import InMemoryBackend, SessionStorage, get_session_storage
+from app.telemetry import configure_logging, telemetry
+from app.usage_ledger import (ANONYMOUS, BudgetExceededError, get_usage_ledger,
+                              seconds_until_tomorrow)
+
+logger = logging.getLogger(__name__)
+
+DIFFICULTIES = ("Easy", "Medium", "Hard")
+# Longest accepted setting value (job role, skills)
+MAX_SETTING_LENGTH = 200
+
+_REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request",
+            404: "Not Found", 405: "Method Not Allowed", 409: "Conflict",
+            413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error", 502: "Bad Gateway",
+            503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    """Ends a request with `status` and a JSON {"error": message} body"""
+
+    def __init__(self, status: int, message: str, headers: Dict[str, str] = None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+class Request:
+    __slots__ = ("method", "path", "headers", "body")
+
+    def __init__(self, method: str, path: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Dict[str, Any]:
+        if not self.body:
+            return {}
+        try:
+            data = json.loads(self.body)
+        except ValueError:
+            raise HTTPError(400, "Body is not valid JSON")
+        if not isinstance(data, dict):
+            raise HTTPError(400, "Body must be a JSON object")
+        return data
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+    @property
+    def wants_events(self) -> bool:
+        return "text/event-stream" in self.headers.get("accept", "")
+
+    @property
+    def user_id(self) -> str:
+        """Who the request's usage is billed to (set by an auth proxy)"""
+        return self.headers.get(Config.USAGE_USER_HEADER.lower()) or ANONYMOUS
+
+
+async def read_request(reader: asyncio.StreamReader, max_body: int) -> Optional[Request]:
+    """Reads one HTTP/1.1 request; None when the client closed the connection"""
+    try:
+        head = await reader.readuntil(b"\r\n\r\n")
+    except asyncio.IncompleteReadError:
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(400, "Request headers too large")
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, _ = lines[0].split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    for line in lines[1:]:
+        if ":" in line:
+            name, value = line.split(":", 1)
+            headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", "0"))
+    except ValueError:
+        raise HTTPError(400, "Invalid Content-Length")
+    if length > max_body:
+        raise HTTPError(413, f"Body larger than {max_body} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return Request(method.upper(), urlsplit(target).path, headers, body)
+
+
+def _response_head(status: int, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}"]
+    lines += [f"{k}: {v}" for k, v in headers.items()]
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+def _sse(event: str, data: Dict[str, Any]) -> bytes:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n".encode()
+
+
+def _usage_dict(usage) -> Optional[Dict[str, Any]]:
+    if usage is None:
+        return None
+    return {"model": usage.model, "input_tokens": usage.input_tokens,
+            "output_tokens": usage.output_tokens,
+            "cached_input_tokens": usage.cached_input_tokens,
+            "cost": usage.cost, "source": usage.source}
+
+
+def _text(data: Dict[str, Any], name: str, default: str = "") -> str:
+    value = data.get(name, default)
+    if not isinstance(value, str) or len(value) > MAX_SETTING_LENGTH:
+        raise HTTPError(400, f"'{name}' must be a string of at most {MAX_SETTING_LENGTH} characters")
+    return value
+
+
+def _temperature(data: Dict[str, Any]) -> float:
+    value = data.get("temperature", 0.7)
+    if not isinstance(value, (int, float)) or not 0 <= value <= 2:
+        raise HTTPError(400, "'temperature' must be a number between 0 and 2")
+    return float(value)
+
+
+class InterviewAPI:
+    """
+    The HTTP service. Request handling is all async; SessionStorage calls
+    (which may hit SQLite or a log file) run in worker threads.
+
+    Args:
+        storage: Where sessions live (default: Config.SESSION_STORE, or an
+            in-memory store if that is "session_state")
+        ai: Async client for model calls (default: the pooled one)
+        max_body: Largest accepted request body in bytes
+    """
+
+    ROUTES = (
+        ("POST", re.compile(r"^/sessions/?$"), "create_session"),
+        ("GET", re.compile(r"^/sessions/(?P<sid>[\w-]+)$"), "get_session"),
+        ("DELETE", re.compile(r"^/sessions/(?P<sid>[\w-]+)$"), "delete_session"),
+        ("POST", re.compile(r"^/sessions/(?P<sid>[\w-]+)/turns$"), "post_turn"),
+        ("POST", re.compile(r"^/sessions/(?P<sid>[\w-]+)/branch$"), "switch_branch"),
+        ("GET", re.compile(r"^/health$"), "health"),
+    )
+
+    def __init__(self, storage: SessionStorage = None, ai: AsyncAIClient = None,
+                 max_body: int = None):
+        if storage is None:
+            storage = get_session_storage()
+        if storage is None:
+            storage = SessionStorage(InMemoryBackend(),
+                                     max_in_memory=Config.SESSION_MAX_IN_MEMORY,
+                                     max_idle_seconds=Config.SESSION_MAX_IDLE_SECONDS)
+        self.storage = storage
+        self.ai = ai or AsyncAIClient()
+        self.max_body = max_body or Config.API_MAX_BODY_BYTES
+        # Sessions with a turn in progress; a second concurrent turn gets 409
+        self._busy = set()
+        self._connections = 0
+
+    # ---------- connection handling ----------
+
+    async def handle_connection(self, reader: asyncio.StreamReader,
+                                writer: asyncio.StreamWriter):
+        self._connections += 1
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(read_request(reader, self.max_body),
+                                                     Config.API_KEEPALIVE_TIMEOUT)
+                except asyncio.TimeoutError:
+                    break
+                except HTTPError as e:
+                    await self._send_json(writer, e.status, {"error": e.message}, close=True)
+                    break
+                if request is None:
+                    break
+                keep_alive = await self.dispatch(request, writer)
+                if not (keep_alive and request.keep_alive):
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def dispatch(self, request: Request, writer: asyncio.StreamWriter) -> bool:
+        """Runs the handler for `request`; returns False if the connection must close"""
+        allowed = False
+        for method, pattern, name in self.ROUTES:
+            match = pattern.match(request.path)
+            if match is None:
+                continue
+            allowed = True
+            if method != request.method:
+                continue
+            with telemetry.span("api_request", route=name):
+                try:
+                    result = await getattr(self, name)(request, writer, **match.groupdict())
+                except HTTPError as e:
+                    telemetry.inc("api_errors_total", route=name, status=e.status)
+                    await self._send_json(writer, e.status, {"error": e.message}, e.headers)
+                    return True
+                except Exception as e:
+                    telemetry.inc("api_errors_total", route=name, status=500)
+                    logger.exception("Unhandled error in %s", name)
+                    await self._send_json(writer, 500, {"error": f"{e.__class__.__name__}"},
+                                          close=True)
+                    return False
+            if result is None:
+                # The handler streamed its own response and closed it
+                return False
+            status, body = result
+            await self._send_json(writer, status, body)
+            return True
+        status = 405 if allowed else 404
+        await self._send_json(writer, status, {"error": _REASONS[status]})
+        return True
+
+    async def _send_json(self, writer: asyncio.StreamWriter, status: int, body: Any,
+                         headers: Dict[str, str] = None, close: bool = False):
+        payload = b"" if body is None else json.dumps(body, ensure_ascii=False).encode()
+        head = {"Content-Type": "application/json", "Content-Length": str(len(payload))}
+        if close:
+            head["Connection"] = "close"
+        head.update(headers or {})
+        writer.write(_response_head(status, head) + payload)
+        await writer.drain()
+
+    async def _load(self, sid: str) -> Interviewer:
+        try:
+            return await asyncio.to_thread(self.storage.__getitem__, sid)
+        except KeyError:
+            raise HTTPError(404, f"No session '{sid}'")
+
+    # ---------- handlers ----------
+
+    async def health(self, request, writer) -> Tuple[int, Dict[str, Any]]:
+        return 200, {"status": "ok", "live_sessions": self.storage.live_count(),
+                     "connections": self._connections, "busy_sessions": len(self._busy)}
+
+    async def create_session(self, request, writer) -> Tuple[int, Dict[str, Any]]:
+        data = request.json()
+        settings = {
+            "job_role": _text(data, "job_role"),
+            "skills": _text(data, "skills"),
+            "difficulty": _text(data, "difficulty", "Medium"),
+            "technique": _text(data, "technique", "Zero-shot"),
+        }
+        if settings["difficulty"] not in DIFFICULTIES:
+            raise HTTPError(400, f"'difficulty' must be one of {', '.join(DIFFICULTIES)}")
+        if settings["technique"] not in available_techniques():
+            raise HTTPError(400, f"Unknown technique '{settings['technique']}'")
+        temperature = _temperature(data)
+
+        interviewer = InterviewerFactory.create(**settings)
+        interviewer.user_id = request.user_id
+        opening, source, follow_ups = None, "none", []
+        bank = get_question_bank()
+        # Asked for a varied opening: not the bank's stored one
+        record = bank.lookup(**settings) if bank and data.get("use_cache", True) else None
+        if record is not None:
+            interviewer.seed_opening(record["opening"])
+            opening, source = record["opening"], "bank"
+            follow_ups = record.get("follow_ups") or []
+        elif data.get("open", True):
+            self._check_budget(interviewer.user_id)
+            opening = await self._guarded(interviewer.aopen(self.ai, temperature))
+            source = "live"
+
+        sid = uuid.uuid4().hex
+        await asyncio.to_thread(self.storage.__setitem__, sid, interviewer)
+        telemetry.inc("api_sessions_created_total", source=source)
+        return 201, {"session_id": sid, "settings": settings,
+                     "opening": opening, "opening_source": source, "follow_ups": follow_ups}
+
+    async def get_session(self, request, writer, sid: str) -> Tuple[int, Dict[str, Any]]:
+        return 200, self._describe_session(sid, await self._load(sid))
+
+    @staticmethod
+    def _describe_session(sid: str, interviewer: Interviewer) -> Dict[str, Any]:
+        evaluations = interviewer.branch_evaluations()
+        return {
+            "session_id": sid,
+            "settings": interviewer.get_settings(),
+            # The system prompt is internal; user turns are shown as typed
+            "messages": [{"role": m.role, "content": unwrap_user_input(m.content)}
+                         for m in interviewer.messages[1:]],
+            # Answer scores finished so far, by position in "messages"
+            "evaluations": [{"message_index": index - 1, **evaluation.to_dict()}
+                            for index, evaluation in sorted(evaluations.items())],
+            "branch": interviewer.branch,
+            "branches": len(interviewer.branches),
+        }
+
+    async def switch_branch(self, request, writer, sid: str) -> Tuple[int, Dict[str, Any]]:
+        branch = request.json().get("branch")
+        if sid in self._busy:
+            raise HTTPError(409, "A turn is in progress for this session")
+        interviewer = await self._load(sid)
+        if not isinstance(branch, int) or not 0 <= branch < len(interviewer.branches):
+            raise HTTPError(400, f"'branch' must be a number from 0 to "
+                                 f"{len(interviewer.branches) - 1}")
+        interviewer.switch_branch(branch)
+        await asyncio.to_thread(InterviewerFactory.save, self.storage, sid, interviewer)
+        return 200, self._describe_session(sid, interviewer)
+
+    async def delete_session(self, request, writer, sid: str) -> Tuple[int, None]:
+        if sid in self._busy:
+            raise HTTPError(409, "A turn is in progress for this session")
+        if not await asyncio.to_thread(self.storage.__contains__, sid):
+            raise HTTPError(404, f"No session '{sid}'")
+        await asyncio.to_thread(self.storage.__delitem__, sid)
+        return 204, None
+
+    async def post_turn(self, request, writer, sid: str):
+        data = request.json()
+        message = data.get("message")
+        if not isinstance(message, str):
+            raise HTTPError(400, "'message' must be a string")
+        is_valid, error = validate_input(message)
+        if not is_valid:
+            raise HTTPError(400, error)
+        temperature = _temperature(data)
+        stream = bool(data.get("stream", request.wants_events))
+        from_index = data.get("from_index")
+        if from_index is not None and (not isinstance(from_index, int) or from_index < 0):
+            raise HTTPError(400, "'from_index' must be a message index")
+
+        if sid in self._busy:
+            raise HTTPError(409, "A turn is already in progress for this session")
+        self._busy.add(sid)
+        try:
+            # Kept in memory until the turn is stored (see SessionStorage.hold)
+            with self.storage.hold(sid):
+                interviewer = await self._load(sid)
+                interviewer.user_id = request.user_id
+                self._check_budget(interviewer.user_id)
+                if from_index is not None and from_index >= len(interviewer.messages):
+                    raise HTTPError(400, f"'from_index' must be at most "
+                                         f"{len(interviewer.messages) - 1}")
+                deltas = interviewer.achat_stream(
+                    wrap_user_input(message), self.ai, temperature,
+                    # The system prompt is not in "messages"
+                    from_index=None if from_index is None else from_index + 1,
+                )
+                if stream:
+                    await self._stream_turn(writer, sid, interviewer, deltas)
+                    return None
+                parts = []
+                try:
+                    async with aclosing(deltas):
+                        async for delta in deltas:
+                            parts.append(delta)
+                except Exception as e:
+                    raise self._describe(e) from e
+                reply = "".join(parts)
+                usage = await self._finish(sid, interviewer)
+                return 200, {"reply": reply, "usage": _usage_dict(usage)}
+        finally:
+            self._busy.discard(sid)
+
+    async def _stream_turn(self, writer, sid: str, interviewer: Interviewer, deltas):
+        """Sends the reply as server-sent events, then closes the connection"""
+        writer.write(_response_head(200, {"Content-Type": "text/event-stream",
+                                          "Cache-Control": "no-cache",
+                                          "Connection": "close"}))
+        parts = []
+        try:
+            async with aclosing(deltas):
+                async for delta in deltas:
+                    parts.append(delta)
+                    writer.write(_sse("delta", {"text": delta}))
+                    await writer.drain()
+        except ConnectionError:
+            # Client went away; what was sent is kept, as in the UI
+            logger.info("Client disconnected during a turn of session %s", sid)
+            await self._finish(sid, interviewer)
+            return
+        except Exception as e:
+            error = self._describe(e)
+            writer.write(_sse("error", {"error": error.message, "status": error.status}))
+        else:
+            usage = await self._finish(sid, interviewer)
+            writer.write(_sse("done", {"reply": "".join(parts), "usage": _usage_dict(usage)}))
+        await writer.drain()
+
+    async def _finish(self, sid: str, interviewer: Interviewer):
+        """Persists the turn and returns its usage (None if there was no reply)"""
+        await asyncio.to_thread(InterviewerFactory.save, self.storage, sid, interviewer)
+        if interviewer.last_usage is None:
+            return None
+        return await asyncio.wrap_future(interviewer.last_usage)
+
+    @staticmethod
+    def _describe(e: Exception) -> HTTPError:
+        """Maps an upstream failure to the HTTP error sent to the client"""
+        if isinstance(e, HTTPError):
+            return e
+        if isinstance(e, QueueTimeoutError):
+            return HTTPError(503, "The interviewer is busy, try again shortly",
+                             {"Retry-After": "5"})
+        if isinstance(e, CircuitOpenError):
+            return HTTPError(503, "The interviewer is unavailable, try again shortly",
+                             {"Retry-After": str(max(1, round(e.retry_in)))})
+        return HTTPError(502, f"Model request failed ({e.__class__.__name__})")
+
+    @staticmethod
+    def _check_budget(user_id: str):
+        try:
+            get_usage_ledger().check_budget(user_id)
+        except BudgetExceededError as e:
+            telemetry.inc("api_budget_rejections_total", scope=e.scope)
+            raise HTTPError(429, str(e), {"Retry-After": str(seconds_until_tomorrow())})
+
+    async def _guarded(self, awaitable):
+        try:
+            return await awaitable
+        except Exception as e:
+            raise self._describe(e) from e
+
+    # ---------- running ----------
+
+    async def evict_idle_loop(self, interval: float = 60):
+        """Moves idle sessions out of memory every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            evicted = await asyncio.to_thread(self.storage.evict_idle)
+            if evicted:
+                logger.debug("Evicted %d idle sessions from memory", evicted)
+
+    async def serve(self, host: str = None, port: int = None,
+                    ready: asyncio.Event = None) -> None:
+        """Serves until cancelled"""
+        server = await asyncio.start_server(self.handle_connection,
+                                            host or Config.API_HOST,
+                                            Config.API_PORT if port is None else port)
+        self.address = server.sockets[0].getsockname()[:2]
+        logger.info("Interview API listening on http://%s:%d", *self.address)
+        if ready is not None:
+            ready.set()
+        evictor = asyncio.create_task(self.evict_idle_loop())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            evictor.cancel()
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Headless HTTP API for the interviewer")
+    parser.add_argument("--host", default=None, help="default: API_HOST")
+    parser.add_argument("--port", type=int, default=None, help="default: API_PORT")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    Config.validate()
+    try:
+        asyncio.run(InterviewAPI().serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# Pre-generates opening questions (and likely follow-ups) for a matrix of
+# interview settings, so they can be served without a live model call.
+#
+#   python -m app.batch_generate \
+#       --roles "Python Backend Engineer" "Data Analyst" \
+#       --skills "Django, REST, SQL" "Pandas" \
+#       --out question_bank.jsonl --workers 8
+#
+# Interrupted runs resume from the checkpoint file (<out>.checkpoint).
+# Point OPENAI_BASE_URL (or --base-url) at tools/fake_openai_server.py to
+# try it without an API key (OPENAI_API_KEY must still be set to anything).
+import argparse
+import itertools
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Set, Tuple
+
+from app.config import Config
+from app.length_governor import split_structured
+from app.prompts import DIFFICULTY_INSTRUCTIONS, END_MARK, available_techniques, is_structured
+from app.question_bank import make_record, open_store, settings_key
+from app.telemetry import configure_logging
+
+FOLLOW_UP_REQUEST = (
+    "List {n} follow-up questions you might ask after the question above, "
+    "depending on the candidate's answer. One question per line, no numbering."
+)
+
+Combination = Tuple[str, str, str, str]
+
+
+def load_checkpoint(path: str) -> Set[str]:
+    """Keys of combinations that were already generated"""
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.rstrip("\n") for line in f if line.strip()}
+
+
+def parse_follow_ups(text: str, n: int) -> List[str]:
+    """The first `n` non-empty lines of a reply, without list bullets"""
+    questions = [line.strip(" -*\t") for line in text.splitlines() if line.strip(" -*\t")]
+    return questions[:n]
+
+
+def generate_one(combo: Combination, follow_ups: int, temperature: float) -> Dict:
+    """Runs the real Interviewer prompts for one combination"""
+    # Imported here so --help works without an API key configured
+    from app.interviewer import Interviewer
+
+    job_role, skills, difficulty, technique = combo
+    interviewer = Interviewer(job_role, skills, difficulty, technique)
+    opening = interviewer.open(temperature=temperature, use_cache=False)
+
+    questions: List[str] = []
+    if follow_ups > 0:
+        request = interviewer.messages + [
+            {"role": "user", "content": FOLLOW_UP_REQUEST.format(n=follow_ups)}
+        ]
+        structured = is_structured(technique)
+        text = interviewer.ai.get_chat_completion(request, temperature, use_cache=False,
+                                                  session_id=interviewer.session_id,
+                                                  stop=(END_MARK,) if structured else None)
+        if structured:
+            # The system prompt asks for [REASONING]/[QUESTION] sections;
+            # only the question section holds the follow-ups
+            text = split_structured(text)[1]
+        questions = parse_follow_ups(text, follow_ups)
+
+    return make_record(job_role, skills, difficulty, technique, opening, questions,
+                       interviewer.ai.model)
+
+
+def run(combos: List[Combination], out: str, checkpoint: str, workers: int,
+        follow_ups: int, temperature: float) -> Dict[str, int]:
+    """
+    Generates every combination not yet in the checkpoint, `workers` at a time.
+    Results are written by this thread only, as each one completes.
+    """
+    done = load_checkpoint(checkpoint)
+    todo = [c for c in combos if settings_key(*c) not in done]
+    print(f"{len(combos)} combinations, {len(combos) - len(todo)} already done, {len(todo)} to go")
+
+    store = open_store(out)
+    stats = {"generated": 0, "failed": 0, "skipped": len(combos) - len(todo)}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool, \
+                open(checkpoint, "a", encoding="utf-8") as ckpt:
+            futures = {pool.submit(generate_one, c, follow_ups, temperature): c for c in todo}
+            for future in as_completed(futures):
+                combo = futures[future]
+                try:
+                    record = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"  failed {combo}: {e}")
+                    continue
+                store.add(record)
+                # Only checkpoint once the record is safely stored
+                ckpt.write(record["key"] + "\n")
+                ckpt.flush()
+                stats["generated"] += 1
+                print(f"  [{stats['generated']}/{len(todo)}] {combo}")
+    finally:
+        store.close()
+    return stats
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Pre-generate interview questions")
+    parser.add_argument("--roles", nargs="+", required=True)
+    parser.add_argument("--skills", nargs="+", required=True)
+    parser.add_argument("--difficulties", nargs="+", default=list(DIFFICULTY_INSTRUCTIONS))
+    parser.add_argument("--techniques", nargs="+", default=available_techniques())
+    parser.add_argument("--out", default="question_bank.jsonl",
+                        help=".jsonl file, or .db/.sqlite for SQLite")
+    parser.add_argument("--checkpoint", default=None,
+                        help="defaults to <out>.checkpoint")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--follow-ups", type=int, default=3)
+    parser.add_argument("--temperature", type=float, default=0.7)
+    parser.add_argument("--model", default=None)
+    parser.add_argument("--base-url", default=None,
+                        help="OpenAI-compatible endpoint, e.g. a local fake server")
+    args = parser.parse_args(argv)
+    configure_logging()
+
+    # Must be set before the shared client is created
+    if args.base_url:
+        Config.OPENAI_BASE_URL = args.base_url
+    if args.model:
+        Config.MODEL_NAME = args.model
+
+    combos = list(itertools.product(args.roles, args.skills, args.difficulties, args.techniques))
+    stats = run(combos, args.out, args.checkpoint or args.out + ".checkpoint",
+                max(1, args.workers), args.follow_ups, args.temperature)
+    print(f"Done: {stats}")
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,95 @@
+# Process-wide registry of pooled OpenAI clients.
+# Every session borrows the same client so HTTP connections (and their TLS
+# handshakes) are reused instead of being rebuilt per session or reset.
+# openai and httpx are imported when the first client is built (see
+# app.warmup, which does that in the background at startup).
+import asyncio
+import atexit
+import threading
+import weakref
+
+from app.config import Config
+
+_lock = threading.Lock()
+_client = None
+# Async clients are tied to the event loop they were created on
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def _limits() -> "httpx.Limits":
+    """Connection pool limits from config"""
+    import httpx
+
+    return httpx.Limits(
+        max_connections=Config.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=Config.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=Config.OPENAI_KEEPALIVE_EXPIRY,
+    )
+
+
+def _timeout() -> "httpx.Timeout":
+    """Request timeouts from config"""
+    import httpx
+
+    return httpx.Timeout(Config.OPENAI_TIMEOUT, connect=Config.OPENAI_CONNECT_TIMEOUT)
+
+
+def get_client() -> "OpenAI":
+    """
+    Returns the shared, keep-alive pooled OpenAI client.
+    Created on first use, then reused for the life of the process.
+    """
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                Config.validate()
+                from openai import DefaultHttpxClient, OpenAI
+
+                _client = OpenAI(
+                    api_key=Config.OPENAI_API_KEY,
+                    base_url=Config.OPENAI_BASE_URL,
+                    timeout=_timeout(),
+                    max_retries=Config.OPENAI_MAX_RETRIES,
+                    http_client=DefaultHttpxClient(limits=_limits(), timeout=_timeout()),
+                )
+    return _client
+
+
+def get_async_client() -> "AsyncOpenAI":
+    """
+    Returns the shared AsyncOpenAI client for the running event loop.
+    Must be called from inside a coroutine.
+    """
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None:
+            Config.validate()
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            client = AsyncOpenAI(
+                api_key=Config.OPENAI_API_KEY,
+                base_url=Config.OPENAI_BASE_URL,
+                timeout=_timeout(),
+                max_retries=Config.OPENAI_MAX_RETRIES,
+                http_client=DefaultAsyncHttpxClient(limits=_limits(), timeout=_timeout()),
+            )
+            _async_clients[loop] = client
+    return client
+
+
+def close_clients():
+    """
+    Closes the shared sync client and its connections (registered to run
+    at exit). AIClient looks the client up on every request, so a later
+    request gets a freshly built one.
+    """
+    global _client
+    with _lock:
+        if _client is not None:
+            _client.close()
+            _client = None
+
+
+atexit.register(close_clients)
@@ -1,10 +1,78 @@
-# Loads .env variables
-
+# Application settings, read from the environment (and .env) on first use.
+#
+# Nothing happens at import time: .env is loaded and each setting is parsed
+# the first time it is accessed, so importing app modules stays cheap and
+# does not need streamlit or an API key.
 import os
-from dotenv import load_dotenv
+import sys
+import threading
+
+_env_lock = threading.Lock()
+_env_loaded = False
+
+# Tokenizer data shipped with (or seeded into) the deployment, see app.warmup
+_BUNDLED_TIKTOKEN_CACHE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tiktoken_cache"
+)
+
+
+def load_env():
+    """Loads the .env file into os.environ (once per process)"""
+    global _env_loaded
+    if _env_loaded:
+        return
+    with _env_lock:
+        if not _env_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _env_loaded = True
+
+
+def _flag(value: str) -> bool:
+    return value == "1"
+
+
+class _Env:
+    """
+    A setting read from the environment the first time it is accessed.
+    The parsed value then replaces the descriptor on the class, so later
+    reads are plain attribute lookups and assignments (e.g. from a CLI
+    flag) simply override it.
+    """
+
+    def __init__(self, cast=str, default: str = None):
+        self.cast = cast
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        load_env()
+        raw = os.getenv(self.name) or self.default
+        value = None if raw is None else self.cast(raw)
+        setattr(owner, self.name, value)
+        return value
+
+
+class _ApiKey:
+    """OPENAI_API_KEY: Streamlit secrets first (when running under Streamlit), then .env"""
+
+    def __get__(self, instance, owner):
+        load_env()
+        key = None
+        # Only consult secrets if the app already imported streamlit
+        st = sys.modules.get("streamlit")
+        if st is not None:
+            try:
+                key = st.secrets.get("OPENAI_API_KEY")
+            except Exception:
+                key = None
+        key = key or os.getenv("OPENAI_API_KEY")
+        if key:
+            setattr(owner, "OPENAI_API_KEY", key)
+        return key
 
-# load .env file when this module is imported
-load_dotenv()
 
 class Config:
     """
@@ -13,26 +81,163 @@ class Config:
     """
 
     # Get API key - try Streamlit secrets first, fall back to .env
-    try:
-        import streamlit as st
-        OPENAI_API_KEY = st.secrets.get("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
-    except:
-        OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+    OPENAI_API_KEY = _ApiKey()
 
     # Set model
 
     MODEL_NAME = "gpt-4.1-mini"
 
+    # Per-turn model routing (see app.models.ModelRouter). When enabled,
+    # MODEL_NAME is the standard model, short Easy/Zero-shot answers go to
+    # the small model and Hard / multi-step techniques to the large one.
+    ROUTER_ENABLED = _Env(_flag, "0")
+    ROUTER_SMALL_MODEL = _Env(str, "gpt-4.1-nano")
+    ROUTER_LARGE_MODEL = _Env(str, "gpt-4.1")
+    # p95 seconds until the reply starts; slower models are stepped down
+    ROUTER_LATENCY_TARGET = _Env(float, "6")
+    # Conversations longer than this never go to the small model
+    ROUTER_LONG_CONTEXT_TOKENS = _Env(int, "3000")
+    ROUTER_SHORT_INPUT_WORDS = _Env(int, "12")
+
+    # Connection settings for the shared OpenAI client (one pool per process).
+    # OPENAI_BASE_URL lets us point at a local OpenAI-compatible server.
+    OPENAI_BASE_URL = _Env()
+    OPENAI_TIMEOUT = _Env(float, "60")
+    OPENAI_CONNECT_TIMEOUT = _Env(float, "5")
+    # Retries are done by app.scheduler (with backoff and fair queueing),
+    # so the SDK's own retries are off by default
+    OPENAI_MAX_RETRIES = _Env(int, "0")
+    OPENAI_MAX_CONNECTIONS = _Env(int, "100")
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS = _Env(int, "20")
+    OPENAI_KEEPALIVE_EXPIRY = _Env(float, "30")
+
+    # Conversation history sent per request is trimmed to this many tokens.
+    # Older turns are replaced by a rolling summary ("summary") or a
+    # truncation marker ("marker").
+    CONTEXT_TOKEN_BUDGET = _Env(int, "6000")
+    CONTEXT_KEEP_RECENT_TURNS = _Env(int, "4")
+    CONTEXT_SUMMARY_MODE = _Env(str, "summary")
+
+    # Output length governor (app.length_governor): max_tokens per technique
+    # and difficulty, sized from observed replies times the headroom; a
+    # cut-off reply is continued up to LENGTH_GOVERNOR_CONTINUATIONS times.
+    # A LENGTH_GOVERNOR_HOLDOUT share of turns runs unbounded as a baseline.
+    LENGTH_GOVERNOR_ENABLED = _Env(_flag, "1")
+    LENGTH_GOVERNOR_HEADROOM = _Env(float, "1.5")
+    LENGTH_GOVERNOR_HOLDOUT = _Env(float, "0.05")
+    LENGTH_GOVERNOR_CONTINUATIONS = _Env(int, "1")
+
+    # Response cache for identical requests (LRU + TTL in memory, optional
+    # SQLite file so entries survive restarts)
+    RESPONSE_CACHE_ENABLED = _Env(_flag, "1")
+    RESPONSE_CACHE_MAX_ENTRIES = _Env(int, "1024")
+    RESPONSE_CACHE_TTL = _Env(float, "3600")
+    RESPONSE_CACHE_PATH = _Env()
+
+    # Process-wide rate limits and retry policy for OpenAI calls
+    RATE_LIMIT_RPM = _Env(int, "500")
+    RATE_LIMIT_TPM = _Env(int, "200000")
+    # Output tokens assumed per request until the real usage is known
+    RATE_LIMIT_OUTPUT_ESTIMATE = _Env(int, "400")
+    QUEUE_MAX_WAIT = _Env(float, "30")
+    RETRY_MAX_ATTEMPTS = _Env(int, "4")
+    RETRY_BASE_DELAY = _Env(float, "0.5")
+    RETRY_MAX_DELAY = _Env(float, "20")
+
+    # Hedged requests (app.resilience): a request still running after its
+    # model's recent HEDGE_PERCENTILE latency (at least HEDGE_MIN_DELAY
+    # seconds, once HEDGE_MIN_SAMPLES were seen) is sent again and the first
+    # reply wins. At most HEDGE_MAX_RATE of requests are hedged.
+    HEDGE_ENABLED = _Env(_flag, "1")
+    HEDGE_PERCENTILE = _Env(float, "0.95")
+    HEDGE_MIN_DELAY = _Env(float, "0.5")
+    HEDGE_MIN_SAMPLES = _Env(int, "20")
+    HEDGE_MAX_RATE = _Env(float, "0.1")
+    # Circuit breaker per model: BREAKER_FAILURE_THRESHOLD failures in a row
+    # take a model out for BREAKER_RESET_SECONDS, then one request probes it.
+    # Meanwhile its requests go to FALLBACK_MODELS (comma-separated, in order).
+    BREAKER_FAILURE_THRESHOLD = _Env(int, "5")
+    BREAKER_RESET_SECONDS = _Env(float, "30")
+    FALLBACK_MODELS = _Env()
+
+    # Pre-generated opening questions (see app.batch_generate); the first
+    # turn is served from here when role/skills match closely enough
+    QUESTION_BANK_PATH = _Env()
+    QUESTION_BANK_MIN_SCORE = _Env(float, "0.75")
+
+    # Fetch the opening question in the background as soon as new settings
+    # are applied (see app.prefetch), instead of on the user's first message
+    OPENING_PREFETCH_ENABLED = _Env(_flag, "1")
+
+    # Work done after each turn, off the response path (app.jobs): answer
+    # scoring on POST_TURN_WORKERS threads; token accounting and cost
+    # ledger updates on their own ACCOUNTING_WORKERS threads
+    POST_TURN_WORKERS = _Env(int, "2")
+    ACCOUNTING_WORKERS = _Env(int, "1")
+    POST_TURN_QUEUE_SIZE = _Env(int, "256")
+    POST_TURN_MAX_ATTEMPTS = _Env(int, "3")
+    # Score each answer for accuracy, depth and relevance (app.evaluation).
+    # Off by default: it is an extra request per turn, billed to the user
+    EVALUATION_ENABLED = _Env(_flag, "0")
+    EVALUATION_MODEL = _Env(str, "gpt-4.1-nano")
+
+    # Usage ledger shared by all processes (app.usage_ledger): a SQLite file
+    # (empty: this process only), flushed every USAGE_FLUSH_INTERVAL seconds.
+    # Daily spending caps in USD for everyone together and per user (0: no
+    # cap); the user is taken from the USAGE_USER_HEADER request header
+    # (without it, each Streamlit browser session counts as its own user
+    # and API requests as "anonymous", so per-user caps need the header).
+    USAGE_LEDGER_PATH = _Env()
+    USAGE_FLUSH_INTERVAL = _Env(float, "5")
+    USAGE_BUDGET_USD = _Env(float, "0")
+    USAGE_USER_BUDGET_USD = _Env(float, "0")
+    USAGE_USER_HEADER = _Env(str, "X-Forwarded-User")
+
+    # Where interview sessions live: "session_state" (per browser tab, lost
+    # on restart), or a persistent store: "memory", "sqlite" or "log"
+    SESSION_STORE = _Env(str, "session_state")
+    SESSION_STORE_PATH = _Env()
+    SESSION_MAX_IN_MEMORY = _Env(int, "1000")
+    SESSION_MAX_IDLE_SECONDS = _Env(float, "1800")
+
+    # Headless HTTP API (app.api_server)
+    API_HOST = _Env(str, "127.0.0.1")
+    API_PORT = _Env(int, "8080")
+    API_MAX_BODY_BYTES = _Env(int, "65536")
+    # Idle keep-alive connections are closed after this many seconds
+    API_KEEPALIVE_TIMEOUT = _Env(float, "30")
+
+    # Logging: LOG_FORMAT is "text" or "json" (one object per line).
+    # Per-turn events are logged for a sample of turns only.
+    LOG_LEVEL = _Env(str, "INFO")
+    LOG_FORMAT = _Env(str, "text")
+    LOG_SAMPLE_RATE = _Env(float, "1.0")
+
+    # Timing spans and counters (see app.telemetry); off by default.
+    # Exposed over HTTP on METRICS_HOST:TELEMETRY_PORT (/metrics,
+    # /metrics.json; local only by default, the data includes spend) and/or
+    # written to TELEMETRY_EXPORT_PATH (.json for JSON, else Prometheus text)
+    TELEMETRY_ENABLED = _Env(_flag, "0")
+    METRICS_HOST = _Env(str, "127.0.0.1")
+    TELEMETRY_PORT = _Env(int, "0")
+    TELEMETRY_EXPORT_PATH = _Env()
+    TELEMETRY_EXPORT_INTERVAL = _Env(float, "15")
+
+    # Tokenizer files (tiktoken's TIKTOKEN_CACHE_DIR). Defaults to the
+    # tiktoken_cache/ folder next to app/, seeded with
+    # `python -m app.warmup --seed`, so no download is needed at runtime.
+    TIKTOKEN_CACHE_DIR = _Env(str, _BUNDLED_TIKTOKEN_CACHE)
+    # Load tokenizers and the API client in the background at startup
+    WARMUP_ENABLED = _Env(_flag, "1")
+
     @classmethod
     def validate(cls):
         '''
-        Checks essential config is present
+        Checks essential config is present.
+        Called when the API client is first created (not at import).
         '''
         if not cls.OPENAI_API_KEY:
             raise ValueError(
                 "ERROR: OPENAI_API_KEY not found"
                 "Make sure .env file is there and has the key!"
             )
-
-Config.validate()
-    
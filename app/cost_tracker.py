@@ -1,5 +1,69 @@
 # Counting tokens and calculating costs for OpenAI API usage
-import tiktoken
+import logging
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, List
+
+from app.config import Config
+from app.models import available_models, get_model
+
+logger = logging.getLogger(__name__)
+
+# Chat-format overhead per message and for priming the reply
+# (see OpenAI's "How to count tokens" cookbook)
+TOKENS_PER_MESSAGE = 3
+TOKENS_PER_NAME = 1
+REPLY_PRIMING_TOKENS = 3
+
+
+class ApproximateEncoding:
+    """
+    Stand-in used when tokenizer data can't be loaded (no network and no
+    local cache): about 4 characters per token, good enough for budgets.
+    """
+
+    name = "approximate"
+
+    def encode(self, text: str):
+        # A range has the right len() without allocating a token list
+        return range((len(text) + 3) // 4)
+
+    def encode_batch(self, texts: List[str]):
+        return [self.encode(t) for t in texts]
+
+
+@lru_cache(maxsize=None)
+def get_encoding(model: str = "gpt-4o-mini"):
+    """
+    Returns the (cached) tiktoken encoding for a model.
+    Loading an encoding is expensive, so it is done once per model, ideally
+    at startup (app.warmup) from the local cache in Config.TIKTOKEN_CACHE_DIR.
+    """
+    # tiktoken is only imported (and its data read) when first needed
+    os.environ.setdefault("TIKTOKEN_CACHE_DIR", Config.TIKTOKEN_CACHE_DIR)
+    import tiktoken
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            # Fallback for unknown models
+            return tiktoken.get_encoding("cl100k_base")
+    except Exception as e:
+        logger.warning("Could not load tokenizer for %s (%s: %s); counting tokens "
+                       "approximately. Seed the cache with `python -m app.warmup --seed`.",
+                       model, e.__class__.__name__, e)
+        return ApproximateEncoding()
+
+
+def has_tokenizer(model: str = "gpt-4o-mini") -> bool:
+    """True if exact token counts are available for the model"""
+    return not isinstance(get_encoding(model), ApproximateEncoding)
+
 
 def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
     """
@@ -12,42 +76,254 @@ def count_tokens(text: str, model: str = "gpt-4o-mini") -> int:
     Returns:
         Number of tokens
     """
-    try:
-        encoding = tiktoken.encoding_for_model(model)
-        return len(encoding.encode(text))
-    except KeyError:
-        # Fallback for unknown models
-        encoding = tiktoken.get_encoding("cl100k_base")
-        return len(encoding.encode(text))
+    return len(get_encoding(model).encode(text))
+
+
+def count_tokens_batch(texts: List[str], model: str = "gpt-4o-mini") -> List[int]:
+    """
+    Count tokens for many texts in one call (tiktoken encodes them in parallel).
+
+    Args:
+        texts: Texts to count tokens for
+        model: OpenAI model name
+
+    Returns:
+        Number of tokens for each text, in the same order
+    """
+    return [len(tokens) for tokens in get_encoding(model).encode_batch(texts)]
+
+
+# Per-message counts memoized by message identity. The content string is
+# kept too, so a message whose content was replaced is counted again.
+_MESSAGE_MEMO_SIZE = 10_000
+_message_memo = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def count_message_tokens(message: Dict[str, str], model: str = "gpt-4o-mini") -> int:
+    """
+    Count tokens for one chat message including the chat-format overhead.
+    Repeated calls for the same message object are answered from a memo.
+
+    Args:
+        message: Message dictionary (e.g. {"role": "user", "content": ...})
+        model: OpenAI model name
+
+    Returns:
+        Number of tokens the message adds to a request
+    """
+    key = (id(message), model)
+    with _memo_lock:
+        entry = _message_memo.get(key)
+        if entry is not None and entry[0] is message and entry[1] is message["content"]:
+            _message_memo.move_to_end(key)
+            return entry[2]
+
+    tokens = TOKENS_PER_MESSAGE + count_tokens(message["content"], model)
+    if message.get("name"):
+        tokens += TOKENS_PER_NAME + count_tokens(message["name"], model)
 
+    with _memo_lock:
+        _message_memo[key] = (message, message["content"], tokens)
+        if len(_message_memo) > _MESSAGE_MEMO_SIZE:
+            _message_memo.popitem(last=False)
+    return tokens
 
-def calculate_cost(input_tokens: int, output_tokens: int, model: str = "gpt-4o-mini") -> float:
+
+def count_prompt_tokens(messages: List[Dict[str, str]], model: str = "gpt-4o-mini") -> int:
+    """
+    Count the input tokens for a whole chat request (all messages plus
+    the reply priming), as billed by the API.
+    """
+    return sum(count_message_tokens(m, model) for m in messages) + REPLY_PRIMING_TOKENS
+
+
+class HistoryTokenCounter:
+    """
+    Running token total for an append-only message history.
+    Each update only tokenizes messages added since the previous one.
+    """
+
+    __slots__ = ("model", "_messages", "sizes", "total")
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.model = model
+        self._messages = []
+        self.sizes = []
+        self.total = 0
+
+    def update(self, messages: List[Dict[str, str]]) -> int:
+        """
+        Brings the counts up to date with `messages` and returns the total.
+        If the history was replaced or trimmed, it is recounted from scratch.
+        """
+        n = len(self._messages)
+        if len(messages) < n or (n and (messages[0] is not self._messages[0]
+                                        or messages[n - 1] is not self._messages[-1])):
+            self._messages, self.sizes, self.total = [], [], 0
+            n = 0
+
+        for message in messages[n:]:
+            size = count_message_tokens(message, self.model)
+            self._messages.append(message)
+            self.sizes.append(size)
+            self.total += size
+        return self.total
+
+    @property
+    def prompt_tokens(self) -> int:
+        """Input tokens if the whole history were sent as one request"""
+        return self.total + REPLY_PRIMING_TOKENS
+
+
+@dataclass
+class TurnUsage:
+    """Token usage of one request/response"""
+    input_tokens: int
+    output_tokens: int
+    model: str
+    # "api" when taken from response.usage, "estimate" when counted locally
+    source: str
+    # Part of input_tokens served from the provider's prompt cache (cheaper)
+    cached_input_tokens: int = 0
+
+    @property
+    def cost(self) -> float:
+        """USD cost of the turn at this model's prices"""
+        if self.source == "cache":
+            return 0.0
+        return calculate_cost(self.input_tokens, self.output_tokens, self.model,
+                              self.cached_input_tokens)
+
+
+class TokenAccountant:
+    """Works out the token usage of each turn for cost tracking"""
+
+    __slots__ = ("model",)
+
+    def __init__(self, model: str = "gpt-4o-mini"):
+        self.model = model
+
+    def measure_turn(self, context: List[Dict[str, str]], reply: str,
+                     usage=None, cached: bool = False, model: str = None) -> TurnUsage:
+        """
+        Returns the usage for a turn.
+
+        Args:
+            context: Messages that were actually sent
+            reply: The AI's reply text
+            usage: `response.usage` from the API, if available (preferred)
+            cached: True if the reply came from the response cache
+            model: Model that answered, if the router picked another one
+
+        Returns:
+            TurnUsage for the turn
+        """
+        model = model or self.model
+        if cached:
+            return TurnUsage(0, 0, model, "cache")
+        if usage is not None and getattr(usage, "prompt_tokens", None) is not None:
+            details = getattr(usage, "prompt_tokens_details", None)
+            return TurnUsage(usage.prompt_tokens, usage.completion_tokens, model, "api",
+                             getattr(details, "cached_tokens", None) or 0)
+
+        return TurnUsage(
+            count_prompt_tokens(context, model),
+            count_tokens(reply, model),
+            model,
+            "estimate",
+        )
+
+    def measure_turn_async(self, context: List[Dict[str, str]], reply: str,
+                           usage=None, cached: bool = False,
+                           model: str = None, key=None) -> "Future[TurnUsage]":
+        """
+        Same as measure_turn but runs in the background, on the accounting
+        job pipeline (app.jobs). `key` (e.g. (session, turn, "usage"))
+        makes a repeated call for the same turn return the same Future.
+        """
+        from app.jobs import get_accounting_pipeline
+        return get_accounting_pipeline().submit(
+            key if key is not None else (object(), "usage"),
+            self.measure_turn, list(context), reply, usage, cached, model
+        )
+
+
+class CostLedger:
+    """
+    Running totals of token usage and cost, per model. Thread-safe, so
+    post-turn jobs can add to it while the UI reads it.
+    Each turn is recorded under a key and counted once, however often it
+    is recorded (e.g. by a retried job).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._seen = set()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._seen = set()
+            self.turns = 0
+            self.input_tokens = 0
+            self.output_tokens = 0
+            self.cost = 0.0
+            # model -> {"cost", "input_tokens", "output_tokens", "turns"}
+            self.by_model: Dict[str, Dict[str, float]] = {}
+
+    def record(self, key, usage: TurnUsage) -> bool:
+        """Adds a turn's usage; False if `key` was already recorded"""
+        cost = usage.cost
+        with self._lock:
+            if key in self._seen:
+                return False
+            self._seen.add(key)
+            self.turns += 1
+            self.input_tokens += usage.input_tokens
+            self.output_tokens += usage.output_tokens
+            self.cost += cost
+            used = self.by_model.setdefault(
+                usage.model, {"cost": 0.0, "input_tokens": 0, "output_tokens": 0, "turns": 0}
+            )
+            used["cost"] += cost
+            used["input_tokens"] += usage.input_tokens
+            used["output_tokens"] += usage.output_tokens
+            used["turns"] += 1
+            return True
+
+    def record_when_done(self, key, future: "Future[TurnUsage]"):
+        """Records the usage once a (background) measurement finishes"""
+        def done(f):
+            if not f.cancelled() and f.exception() is None:
+                self.record(key, f.result())
+        future.add_done_callback(done)
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return {"turns": self.turns, "input_tokens": self.input_tokens,
+                    "output_tokens": self.output_tokens, "cost": self.cost,
+                    "by_model": {m: dict(v) for m, v in self.by_model.items()}}
+
+
+def calculate_cost(input_tokens: int, output_tokens: int, model: str = None,
+                   cached_input_tokens: int = 0) -> float:
     """
     Calculate API cost based on token usage.
     
-    Pricing as of December 2024.
+    Prices come from the model registry (app.models); dated snapshot names
+    resolve to their base model, unknown models use Config.MODEL_NAME prices.
     
     Args:
         input_tokens: Number of input tokens
         output_tokens: Number of output tokens
-        model: OpenAI model name
+        model: OpenAI model name (defaults to Config.MODEL_NAME)
+        cached_input_tokens: Input tokens served from the prompt cache
         
     Returns:
         Total cost in USD
     """
-    pricing = {
-        "gpt-4o-mini": {"input": 0.150, "output": 0.600},
-        "gpt-4o": {"input": 2.50, "output": 10.00},
-        "gpt-4-turbo": {"input": 10.00, "output": 30.00},
-        "gpt-4": {"input": 30.00, "output": 60.00},
-    }
-    
-    rates = pricing.get(model, pricing["gpt-4o-mini"])
-    
-    input_cost = (input_tokens / 1_000_000) * rates["input"]
-    output_cost = (output_tokens / 1_000_000) * rates["output"]
-    
-    return input_cost + output_cost
+    return get_model(model).cost(input_tokens, output_tokens, cached_input_tokens)
 
 
 def format_cost(cost: float) -> str:
@@ -65,8 +341,13 @@ def format_cost(cost: float) -> str:
     return f"${cost:.2f}"
 
 
+def pricing_info(model: str) -> Dict[str, str]:
+    """Human-readable prices of a model (for the UI)"""
+    info = get_model(model)
+    return {"input": f"${info.input_price:.3f}/1M tokens",
+            "output": f"${info.output_price:.3f}/1M tokens",
+            "cached_input": f"${info.cached_input_price:.3f}/1M tokens"}
+
+
 # Pricing reference (for documentation)
-PRICING_INFO = {
-    "gpt-4o-mini": {"input": "$0.150/1M tokens", "output": "$0.600/1M tokens"},
-    "gpt-4o": {"input": "$2.50/1M tokens", "output": "$10.00/1M tokens"},
-}
+PRICING_INFO = {name: pricing_info(name) for name in available_models()}
@@ -0,0 +1,162 @@
+# Conversation history as a persistent (immutable) linked list.
+#
+# Each message is a node pointing at the one before it, so two histories
+# that share a prefix share its nodes: forking a conversation, however
+# long, is O(1) in time and memory, and a branch is just its last node.
+# Token counts are cached on the nodes, so a prefix shared by several
+# branches is only counted once.
+import itertools
+from collections.abc import Sequence
+from typing import Iterable, List, Optional, Tuple
+
+from app.cost_tracker import REPLY_PRIMING_TOKENS, count_message_tokens
+from app.messages import Message, MessageLike, as_message
+
+# Unique id per node for the life of the process (see Turn.serial)
+_serials = itertools.count(1)
+
+
+class Turn:
+    """One message in a history, linked to the message before it"""
+
+    __slots__ = ("message", "parent", "depth", "_serial", "_count")
+
+    def __init__(self, message: Message, parent: Optional["Turn"] = None):
+        self.message = message
+        self.parent = parent
+        # Messages up to and including this one
+        self.depth = parent.depth + 1 if parent is not None else 1
+        self._serial = 0
+        # (model, tokens of this message, tokens up to and including it)
+        self._count: Optional[Tuple[str, int, int]] = None
+
+    @property
+    def serial(self) -> int:
+        """
+        Tells apart messages at the same position on different branches
+        (e.g. as a job key); never reused, unlike id(). Assigned on first use.
+        """
+        if not self._serial:
+            self._serial = next(_serials)
+        return self._serial
+
+    def tokens(self, model: str) -> Tuple[int, int]:
+        """(this message's tokens, tokens of the history up to it), cached"""
+        count = self._count
+        if count is not None and count[0] == model:
+            return count[1], count[2]
+        # Walk back to the nearest counted node, then count forwards; no
+        # recursion, so long histories are fine
+        pending = []
+        node = self
+        while node is not None and (node._count is None or node._count[0] != model):
+            pending.append(node)
+            node = node.parent
+        total = node._count[2] if node is not None else 0
+        for node in reversed(pending):
+            size = count_message_tokens(node.message, model)
+            total += size
+            node._count = (model, size, total)
+        return self._count[1], self._count[2]
+
+    def __repr__(self) -> str:
+        return f"Turn({self.depth}, {self.message!r})"
+
+
+class History(Sequence):
+    """
+    An immutable list of messages: one branch of a conversation.
+
+    Reads like a list (len, indexing, slicing, iteration, `+ [...]`), but
+    append(), extend() and truncate() return a new History that shares
+    every unchanged node with this one.
+    """
+
+    __slots__ = ("head", "_items")
+
+    def __init__(self, head: Optional[Turn] = None):
+        self.head = head
+        # The messages as a tuple, built on first use (the history never changes)
+        self._items: Optional[Tuple[Message, ...]] = None
+
+    @classmethod
+    def of(cls, messages: Iterable[MessageLike]) -> "History":
+        return cls().extend(messages)
+
+    def _list(self) -> Tuple[Message, ...]:
+        items = self._items
+        if items is None:
+            items = self._items = tuple(node.message for node in self.nodes())
+        return items
+
+    def nodes(self) -> List[Turn]:
+        """The nodes, oldest first"""
+        nodes = []
+        node = self.head
+        while node is not None:
+            nodes.append(node)
+            node = node.parent
+        nodes.reverse()
+        return nodes
+
+    def __len__(self) -> int:
+        return self.head.depth if self.head is not None else 0
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return list(self._list()[index])
+        if index == -1 and self.head is not None:
+            # The most common read, without building the tuple
+            return self.head.message
+        return self._list()[index]
+
+    def __iter__(self):
+        return iter(self._list())
+
+    def __add__(self, other) -> List[Message]:
+        return list(self._list()) + list(other)
+
+    def __repr__(self) -> str:
+        return f"History({len(self)} messages)"
+
+    # ---------- new versions ----------
+
+    def append(self, message: MessageLike) -> "History":
+        return History(Turn(as_message(message), self.head))
+
+    def extend(self, messages: Iterable[MessageLike]) -> "History":
+        head = self.head
+        for message in messages:
+            head = Turn(as_message(message), head)
+        return History(head)
+
+    def truncate(self, length: int) -> "History":
+        """The first `length` messages (shares all their nodes)"""
+        if length < 0 or length > len(self):
+            raise IndexError(f"Cannot cut a history of {len(self)} messages to {length}")
+        node = self.head
+        while node is not None and node.depth > length:
+            node = node.parent
+        return History(node)
+
+    def common_length(self, other: "History") -> int:
+        """Number of leading messages this history shares (by node) with `other`"""
+        a, b = self.head, other.head
+        while a is not None and b is not None and a is not b:
+            if a.depth >= b.depth:
+                a = a.parent
+            else:
+                b = b.parent
+        return a.depth if a is not None and a is b else 0
+
+    # ---------- token counts ----------
+
+    def token_sizes(self, model: str) -> List[int]:
+        """Tokens per message (chat overhead included), cached on the nodes"""
+        return [node.tokens(model)[0] for node in self.nodes()]
+
+    def prompt_tokens(self, model: str) -> int:
+        """Input tokens if the whole history were sent as one request"""
+        if self.head is None:
+            return REPLY_PRIMING_TOKENS
+        return self.head.tokens(model)[1] + REPLY_PRIMING_TOKENS
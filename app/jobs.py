@@ -0,0 +1,225 @@
+# Background work that follows a turn: token accounting, cost ledger
+# updates and answer scoring. None of it is needed to show the reply, so it
+# runs on small bounded worker pools instead of on the response path.
+#
+# - Two pipelines: accounting (whose result API replies wait for) has its
+#   own queue and workers, so it never sits behind slow scoring requests.
+# - Bounded: a queue holds at most POST_TURN_QUEUE_SIZE jobs. When it is
+#   full, optional jobs (scoring) are shed, and required ones (accounting)
+#   wait briefly, then run in the caller's thread. On an event loop they
+#   never wait: they go to the loop's default executor instead.
+# - Idempotent: every job has a key such as (session, turn, "usage").
+#   Submitting a key again returns the same Future, and a job is retried
+#   under its key, so a result is never counted twice.
+import asyncio
+import logging
+import queue
+import random
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from app.config import Config
+from app.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Keys of finished jobs remembered for de-duplication
+_RECENT_KEYS = 10000
+
+
+class JobShedError(Exception):
+    """An optional job was dropped because the queue was full"""
+
+
+class JobPipeline:
+    """
+    Bounded queue plus worker threads with per-key de-duplication and
+    retries. Thread-safe.
+
+    Args:
+        workers: Worker threads
+        max_queue: Jobs waiting at most; beyond that backpressure applies
+        max_attempts: Tries per job (errors are retried with backoff)
+        base_delay: First retry delay in seconds (doubled per attempt)
+        put_timeout: How long a required job waits for queue space before
+            running in the submitting thread
+        name: Prefix of the worker thread names
+    """
+
+    def __init__(self, workers: int = 2, max_queue: int = 256, max_attempts: int = 3,
+                 base_delay: float = 0.5, put_timeout: float = 1.0, name: str = "post-turn"):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.put_timeout = put_timeout
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._futures: "OrderedDict[Hashable, Future]" = OrderedDict()
+        self._counters: Dict[str, int] = {"submitted": 0, "deduplicated": 0, "shed": 0,
+                                          "inline": 0, "retries": 0, "failed": 0,
+                                          "completed": 0}
+        self._threads = [
+            threading.Thread(target=self._work, name=f"{name}-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _count(self, name: str, kind: str = None):
+        with self._lock:
+            self._counters[name] += 1
+        telemetry.inc("post_turn_jobs_total", event=name, kind=kind or "")
+
+    def submit(self, key: Hashable, fn: Callable[..., Any], *args,
+               sheddable: bool = False, **kwargs) -> Future:
+        """
+        Queues fn(*args, **kwargs) under `key`.
+
+        Args:
+            key: Identifies the job; a key that is queued, running or
+                recently finished is not run again
+            fn: The job; it must be safe to repeat (it may be retried)
+            sheddable: Drop the job if the queue is full (its Future then
+                fails with JobShedError) instead of applying backpressure
+
+        Returns:
+            Future with the job's result
+        """
+        with self._lock:
+            existing = self._futures.get(key)
+            if existing is not None:
+                self._counters["deduplicated"] += 1
+                return existing
+            future = Future()
+            self._futures[key] = future
+            while len(self._futures) > _RECENT_KEYS:
+                oldest, done = next(iter(self._futures.items()))
+                if not done.done():
+                    break
+                del self._futures[oldest]
+        kind = _kind(key)
+        self._count("submitted", kind)
+
+        job = (key, future, fn, args, kwargs)
+        loop = _running_loop()
+        try:
+            if sheddable or loop is not None:
+                self._queue.put_nowait(job)
+            else:
+                self._queue.put(job, timeout=self.put_timeout)
+        except queue.Full:
+            if sheddable:
+                self._count("shed", kind)
+                self._forget(key)
+                future.set_exception(JobShedError(f"Queue full, dropped job {key!r}"))
+            elif loop is not None:
+                # Never block (or do the work on) an event loop
+                self._count("inline", kind)
+                loop.run_in_executor(None, self._run, job)
+            else:
+                # Backpressure: the producer does the work itself
+                self._count("inline", kind)
+                self._run(job)
+        return future
+
+    def _forget(self, key: Hashable):
+        with self._lock:
+            self._futures.pop(key, None)
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            try:
+                self._run(job)
+            finally:
+                self._queue.task_done()
+
+    def _run(self, job):
+        key, future, fn, args, kwargs = job
+        if not future.set_running_or_notify_cancel():
+            self._forget(key)
+            return
+        kind = _kind(key)
+        for attempt in range(self.max_attempts):
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts:
+                    self._count("failed", kind)
+                    logger.warning("Post-turn job %r failed after %d attempts: %s",
+                                   key, attempt + 1, e)
+                    # Allow a later submit of the same key to try again
+                    self._forget(key)
+                    future.set_exception(e)
+                    return
+                self._count("retries", kind)
+                delay = self.base_delay * (2 ** attempt) * (0.5 + random.random() / 2)
+                logger.debug("Post-turn job %r failed (%s), retrying in %.1fs", key, e, delay)
+                time.sleep(delay)
+            else:
+                self._count("completed", kind)
+                future.set_result(result)
+                return
+
+    def join(self, timeout: Optional[float] = None) -> bool:
+        """Waits until the queue is empty and idle; False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self._queue.unfinished_tasks:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.01)
+        return True
+
+    def metrics(self) -> Dict[str, float]:
+        with self._lock:
+            stats = dict(self._counters)
+        stats["queue_depth"] = self._queue.qsize()
+        return stats
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _kind(key: Hashable) -> str:
+    """Job kind for metrics: the last element of a tuple key"""
+    return str(key[-1]) if isinstance(key, tuple) and key else "job"
+
+
+_pipeline_lock = threading.Lock()
+_pipeline = None
+_accounting = None
+
+
+def get_post_turn_pipeline() -> JobPipeline:
+    """Returns the process-wide pipeline for scoring and other optional work"""
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = JobPipeline(
+                    workers=Config.POST_TURN_WORKERS,
+                    max_queue=Config.POST_TURN_QUEUE_SIZE,
+                    max_attempts=Config.POST_TURN_MAX_ATTEMPTS,
+                )
+    return _pipeline
+
+
+def get_accounting_pipeline() -> JobPipeline:
+    """Returns the process-wide pipeline for token accounting"""
+    global _accounting
+    if _accounting is None:
+        with _pipeline_lock:
+            if _accounting is None:
+                _accounting = JobPipeline(
+                    workers=Config.ACCOUNTING_WORKERS,
+                    max_queue=Config.POST_TURN_QUEUE_SIZE,
+                    max_attempts=Config.POST_TURN_MAX_ATTEMPTS,
+                    name="accounting",
+                )
+    return _accounting
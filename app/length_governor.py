@@ -0,0 +1,318 @@
+# Output length governor: bounds how much the model writes per turn.
+#
+# - Budget: max_tokens per technique and difficulty, adapted to the reply
+#   lengths actually observed (a high percentile plus headroom), never
+#   above a fixed ceiling.
+# - Structure: structured techniques (Chain-of-Thought) reply in
+#   [REASONING]/[QUESTION] sections with [END] as a stop sequence; only
+#   the question is shown and kept in history.
+# - Continuation: a reply cut off by max_tokens is continued (or, if it was
+#   cut off while still reasoning, asked for its question) instead of
+#   ending mid-sentence.
+# - Savings: a small holdout share of turns runs without max_tokens, so
+#   report() can compare output tokens and latency with and without it.
+import random
+import threading
+from collections import deque
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Deque, Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.messages import ASSISTANT, USER, Message
+from app.prompts import END_MARK, QUESTION_MARK, REASONING_MARK, is_structured
+
+# Ceiling on output tokens per difficulty, scaled per technique
+BASE_BUDGETS = {"Easy": 250, "Medium": 350, "Hard": 500}
+TECHNIQUE_FACTORS = {"Chain-of-Thought": 1.5, "Least-to-Most": 1.2}
+
+CONTINUE_REQUEST = ("Your last reply was cut off. Continue exactly where it stopped, "
+                    "without repeating anything.")
+QUESTION_REQUEST = (f"Your last reply was cut off while reasoning. Skip the rest of the "
+                    f"reasoning and write only the {QUESTION_MARK} section now.")
+
+
+@dataclass(frozen=True)
+class OutputPlan:
+    """How one turn's output is bounded"""
+    max_tokens: Optional[int]
+    stop: Optional[Tuple[str, ...]]
+    structured: bool
+    # Turn runs without max_tokens, as the baseline for the savings report
+    holdout: bool = False
+
+
+def merge_usage(a, b):
+    """Adds up the usage of a reply and its continuation"""
+    if a is None or b is None:
+        return a or b
+    details_a = getattr(a, "prompt_tokens_details", None)
+    details_b = getattr(b, "prompt_tokens_details", None)
+    cached = (getattr(details_a, "cached_tokens", None) or 0) + \
+        (getattr(details_b, "cached_tokens", None) or 0)
+    return SimpleNamespace(
+        prompt_tokens=(a.prompt_tokens or 0) + (b.prompt_tokens or 0),
+        completion_tokens=(a.completion_tokens or 0) + (b.completion_tokens or 0),
+        total_tokens=(a.total_tokens or 0) + (b.total_tokens or 0),
+        prompt_tokens_details=SimpleNamespace(cached_tokens=cached),
+    )
+
+
+def split_structured(text: str) -> Tuple[str, str]:
+    """
+    Splits a structured reply into (reasoning, question). A reply without
+    the question marker is taken as all question.
+    """
+    text = text.split(END_MARK, 1)[0]
+    if QUESTION_MARK not in text:
+        return "", text.replace(REASONING_MARK, "").strip()
+    reasoning, question = text.split(QUESTION_MARK, 1)
+    return reasoning.replace(REASONING_MARK, "").strip(), question.strip()
+
+
+def trim_to_sentence(text: str) -> str:
+    """Drops a trailing unfinished sentence (after the last . ? or !)"""
+    end = max(text.rfind(p) for p in ".?!")
+    return text[:end + 1] if end > len(text) // 2 else text
+
+
+class GovernedReply:
+    """
+    Assembles one governed reply from one or more requests.
+
+    Feed it the raw text as it arrives (feed() returns the part to show),
+    then call next_request() after each request: it returns the messages
+    to append for a continuation, or None when the reply is complete.
+    """
+
+    def __init__(self, plan: OutputPlan, max_continuations: int = 1):
+        self.plan = plan
+        self.max_continuations = max_continuations
+        self.continuations = 0
+        self.usage = None
+        self.truncated = False
+        self._text = ""
+        self._shown = 0
+        self._started = False
+        # Structured replies are held back until the question starts
+        self._in_question = not plan.structured
+
+    @property
+    def raw_text(self) -> str:
+        return self._text
+
+    @property
+    def max_tokens(self) -> Optional[int]:
+        """max_tokens for the next request (continuations get half)"""
+        if self.plan.max_tokens is None or not self.continuations:
+            return self.plan.max_tokens
+        return max(64, self.plan.max_tokens // 2)
+
+    def feed(self, delta: str) -> str:
+        """Adds raw text; returns the newly visible part (may be empty)"""
+        self._text += delta
+        if not self._in_question:
+            # The marker may arrive split over several deltas
+            index = self._text.find(QUESTION_MARK)
+            if index < 0:
+                return ""
+            self._in_question = True
+            self._shown = index + len(QUESTION_MARK)
+        visible = self._text[self._shown:]
+        self._shown = len(self._text)
+        if not self._started:
+            visible = visible.lstrip()
+            self._started = bool(visible)
+        return visible
+
+    def next_request(self, result) -> Optional[List[Message]]:
+        """
+        Call after each request with its ChatResult. Returns the messages to
+        add to the context for a continuation, or None if done.
+        """
+        self.usage = merge_usage(self.usage, result.usage)
+        if result.finish_reason != "length":
+            return None
+        self.truncated = True
+        if self.continuations >= self.max_continuations:
+            return None
+        self.continuations += 1
+        request = CONTINUE_REQUEST if self._in_question else QUESTION_REQUEST
+        return [Message(ASSISTANT, self._text), Message(USER, request)]
+
+    def finish(self) -> str:
+        """
+        Returns any text still to show: for a structured reply that never
+        reached its question, the reply without the markers; for a reply
+        that is still cut off, nothing more (see final_text).
+        """
+        if self._in_question:
+            return ""
+        self._in_question = True
+        self._shown = len(self._text)
+        return split_structured(self._text)[1]
+
+    def final_text(self, trim: bool = True) -> Tuple[str, str]:
+        """
+        (reasoning, text for the candidate and the history). A reply still
+        cut off after its continuations loses its unfinished last sentence,
+        unless `trim` is off (when it was already streamed to the user).
+        """
+        if self.plan.structured:
+            reasoning, question = split_structured(self._text)
+        else:
+            reasoning, question = "", self._text.strip()
+        if trim and self.truncated and self.continuations >= self.max_continuations:
+            question = trim_to_sentence(question)
+        return reasoning, question
+
+
+class _Samples:
+    __slots__ = ("tokens", "latency", "turns", "truncated", "continuations", "dropped")
+
+    def __init__(self, window: int):
+        self.tokens: Deque[int] = deque(maxlen=window)
+        self.latency: Deque[float] = deque(maxlen=window)
+        self.turns = 0
+        self.truncated = 0
+        self.continuations = 0
+        self.dropped = 0
+
+
+class LengthGovernor:
+    """
+    Plans output bounds per (technique, difficulty) and learns from the
+    replies. Thread-safe.
+
+    Args:
+        enabled: When off, plan() only sets the structure stop sequence
+        headroom: max_tokens = observed percentile * headroom
+        percentile: Which observed reply length to size the budget on
+        min_tokens: Lowest budget ever set
+        min_samples: Replies observed before the budget adapts
+        holdout_rate: Share of turns run without max_tokens (baseline)
+        max_continuations: Continuations after a cut-off reply
+    """
+
+    def __init__(self, enabled: bool = None, headroom: float = None, percentile: float = 0.9,
+                 min_tokens: int = 64, min_samples: int = 20, window: int = 200,
+                 holdout_rate: float = None, max_continuations: int = None):
+        self.enabled = Config.LENGTH_GOVERNOR_ENABLED if enabled is None else enabled
+        self.headroom = headroom or Config.LENGTH_GOVERNOR_HEADROOM
+        self.percentile = percentile
+        self.min_tokens = min_tokens
+        self.min_samples = min_samples
+        self.window = window
+        self.holdout_rate = (Config.LENGTH_GOVERNOR_HOLDOUT if holdout_rate is None
+                             else holdout_rate)
+        self.max_continuations = (Config.LENGTH_GOVERNOR_CONTINUATIONS if max_continuations is None
+                                  else max_continuations)
+        self._lock = threading.Lock()
+        # (technique, difficulty) -> reply lengths of governed turns
+        self._lengths: Dict[Tuple[str, str], Deque[int]] = {}
+        # (technique, "governed" | "holdout") -> samples for the report
+        self._stats: Dict[Tuple[str, str], _Samples] = {}
+
+    def ceiling(self, technique: str, difficulty: str) -> int:
+        base = BASE_BUDGETS.get(difficulty, BASE_BUDGETS["Medium"])
+        return int(base * TECHNIQUE_FACTORS.get(technique, 1.0))
+
+    def budget(self, technique: str, difficulty: str) -> int:
+        """Current max_tokens for a technique and difficulty"""
+        ceiling = self.ceiling(technique, difficulty)
+        with self._lock:
+            lengths = sorted(self._lengths.get((technique, difficulty), ()))
+        if len(lengths) < self.min_samples:
+            return ceiling
+        observed = lengths[min(len(lengths) - 1, int(self.percentile * len(lengths)))]
+        return max(self.min_tokens, min(ceiling, int(observed * self.headroom)))
+
+    def plan(self, technique: str, difficulty: str) -> OutputPlan:
+        structured = is_structured(technique)
+        stop = (END_MARK,) if structured else None
+        if not self.enabled:
+            return OutputPlan(None, stop, structured)
+        if random.random() < self.holdout_rate:
+            return OutputPlan(None, stop, structured, holdout=True)
+        return OutputPlan(self.budget(technique, difficulty), stop, structured)
+
+    def start(self, technique: str, difficulty: str) -> GovernedReply:
+        """Plans a turn and returns the GovernedReply that assembles it"""
+        return GovernedReply(self.plan(technique, difficulty), self.max_continuations)
+
+    def record(self, technique: str, difficulty: str, reply: GovernedReply,
+               seconds: float, dropped_tokens: int = 0):
+        """
+        Adds a finished turn.
+
+        Args:
+            reply: The assembled reply (its usage has the output tokens)
+            seconds: Time the whole reply took, continuations included
+            dropped_tokens: Reasoning tokens left out of the history
+        """
+        usage = reply.usage
+        tokens = getattr(usage, "completion_tokens", None) if usage is not None else None
+        if tokens is None:
+            # Served from cache or no usage reported: nothing to learn
+            return
+        group = "holdout" if reply.plan.holdout else "governed"
+        # A cut-off reply needed at least the budget it hit, so it counts as
+        # that much: a budget set too low is pushed back up by its own
+        # cut-offs, instead of only ever learning from replies that fit it
+        needed = max(tokens, reply.plan.max_tokens or 0) if reply.truncated else tokens
+        with self._lock:
+            self._lengths.setdefault(
+                (technique, difficulty), deque(maxlen=self.window)
+            ).append(needed)
+            stats = self._stats.get((technique, group))
+            if stats is None:
+                stats = self._stats[(technique, group)] = _Samples(self.window)
+            stats.turns += 1
+            stats.tokens.append(tokens)
+            stats.latency.append(seconds)
+            stats.truncated += reply.truncated
+            stats.continuations += reply.continuations
+            stats.dropped += dropped_tokens
+
+    def report(self) -> Dict[str, Dict[str, float]]:
+        """
+        Per technique: output tokens and latency of governed turns against
+        the holdout turns, the savings between them, cut-offs and
+        continuations, and reasoning tokens kept out of the history
+        """
+        report = {}
+        with self._lock:
+            techniques = dict.fromkeys(t for t, _ in self._stats)
+            for technique in techniques:
+                row = {}
+                for group in ("governed", "holdout"):
+                    stats = self._stats.get((technique, group))
+                    if stats is None or not stats.turns:
+                        continue
+                    row[f"{group}_turns"] = stats.turns
+                    row[f"{group}_output_tokens"] = sum(stats.tokens) / len(stats.tokens)
+                    row[f"{group}_latency_s"] = sum(stats.latency) / len(stats.latency)
+                    if group == "governed":
+                        row["truncated"] = stats.truncated
+                        row["continuations"] = stats.continuations
+                        row["reasoning_tokens_dropped"] = stats.dropped
+                if "governed_turns" in row and "holdout_turns" in row:
+                    row["output_tokens_saved_per_turn"] = (row["holdout_output_tokens"]
+                                                           - row["governed_output_tokens"])
+                    row["latency_saved_s"] = row["holdout_latency_s"] - row["governed_latency_s"]
+                report[technique] = row
+        return report
+
+
+_governor_lock = threading.Lock()
+_governor = None
+
+
+def get_length_governor() -> LengthGovernor:
+    """Returns the process-wide governor built from Config"""
+    global _governor
+    if _governor is None:
+        with _governor_lock:
+            if _governor is None:
+                _governor = LengthGovernor()
+    return _governor
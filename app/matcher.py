@@ -0,0 +1,184 @@
+# Blocklist matching for user input.
+# All phrases are compiled into one Aho-Corasick automaton, so a message is
+# scanned in a single pass no matter how many phrases there are.
+import logging
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Common character substitutions used to dodge filters ("j41lbr34k")
+LEETSPEAK = str.maketrans({
+    "0": "o", "1": "i", "3": "e", "4": "a", "5": "s", "7": "t", "8": "b",
+    "@": "a", "$": "s",
+})
+
+_SEPARATORS = re.compile(r"[\W_]+")
+# Candidate words for leetspeak folding
+_TOKENS = re.compile(r"[\w@$]+")
+
+
+def _unleet(match: "re.Match") -> str:
+    # Only words that have letters are folded: "j41lbr34k" is leetspeak,
+    # "3.11" or "$5" are not
+    token = match.group(0)
+    return token.translate(LEETSPEAK) if any(c.isalpha() for c in token) else token
+
+
+def normalize(text: str) -> str:
+    """
+    Normalizes text before matching: Unicode compatibility forms (fullwidth,
+    ligatures), case, accents, leetspeak inside words, and punctuation /
+    whitespace runs collapsed to a single space. Phrases and input go
+    through the same steps.
+    """
+    if not text.isascii():
+        text = unicodedata.normalize("NFKC", text)
+        # Drop accents: "ïgnöre" -> "ignore"
+        text = "".join(c for c in unicodedata.normalize("NFKD", text)
+                       if not unicodedata.combining(c))
+    text = _TOKENS.sub(_unleet, text.casefold())
+    return _SEPARATORS.sub(" ", text).strip()
+
+
+@dataclass(frozen=True)
+class Match:
+    """A blocklist rule that fired"""
+    rule: str      # the phrase as written in the rule set
+    start: int     # position in the normalized text
+    end: int
+
+
+class PhraseMatcher:
+    """Aho-Corasick automaton over a fixed set of phrases"""
+
+    def __init__(self, phrases: Iterable[str]):
+        # Each node: transitions, failure link, rules ending here
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[tuple]] = [[]]  # (rule, normalized length)
+        self.rules: List[str] = []
+
+        for phrase in phrases:
+            key = normalize(phrase)
+            if not key:
+                continue
+            self.rules.append(phrase)
+            node = 0
+            for c in key:
+                nxt = self._goto[node].get(c)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[node][c] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                node = nxt
+            self._out[node].append((phrase, len(key)))
+        self._build_failure_links()
+
+    def _build_failure_links(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, nxt in self._goto[node].items():
+                queue.append(nxt)
+                fail = self._fail[node]
+                while fail and c not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(c, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                # Inherit matches that end at the failure state
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def _scan(self, text: str, first_only: bool) -> List[Match]:
+        goto, fail, out = self._goto, self._fail, self._out
+        matches = []
+        node = 0
+        for i, c in enumerate(normalize(text)):
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            if out[node]:
+                for rule, length in out[node]:
+                    matches.append(Match(rule, i + 1 - length, i + 1))
+                    if first_only:
+                        return matches
+        return matches
+
+    def find(self, text: str) -> Optional[Match]:
+        """Returns the first rule that matches, or None"""
+        matches = self._scan(text, first_only=True)
+        return matches[0] if matches else None
+
+    def find_all(self, text: str) -> List[Match]:
+        """Returns every rule occurrence in the text"""
+        return self._scan(text, first_only=False)
+
+
+def load_phrases(path: str) -> List[str]:
+    """Reads a rule file: one phrase per line, '#' starts a comment"""
+    phrases = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                phrases.append(line)
+    return phrases
+
+
+class ReloadingMatcher:
+    """
+    A PhraseMatcher built from a rule file that is recompiled when the file
+    changes. The file's mtime is checked at most every `check_interval`
+    seconds; the new automaton is swapped in atomically.
+    """
+
+    def __init__(self, path: str, fallback: Iterable[str] = (), check_interval: float = 2.0):
+        self.path = path
+        self.check_interval = check_interval
+        self._fallback = list(fallback)
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._checked_at = 0.0
+        self._matcher = PhraseMatcher(self._fallback)
+        self.reload()
+
+    def reload(self) -> bool:
+        """Recompiles if the file changed. Returns True if it was reloaded."""
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            return False
+        if mtime == self._mtime:
+            return False
+        try:
+            matcher = PhraseMatcher(load_phrases(self.path))
+        except (OSError, UnicodeDecodeError) as e:
+            logger.warning("Could not load rules from %s: %s", self.path, e)
+            return False
+        with self._lock:
+            self._matcher = matcher
+            self._mtime = mtime
+        logger.info("Loaded %d input rules from %s", len(matcher.rules), self.path)
+        return True
+
+    @property
+    def matcher(self) -> PhraseMatcher:
+        now = time.monotonic()
+        if now - self._checked_at >= self.check_interval:
+            self._checked_at = now
+            self.reload()
+        return self._matcher
+
+    def find(self, text: str) -> Optional[Match]:
+        return self.matcher.find(text)
+
+    def find_all(self, text: str) -> List[Match]:
+        return self.matcher.find_all(text)
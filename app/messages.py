@@ -0,0 +1,75 @@
+# Compact message records for conversation history.
+#
+# A plain dict per message costs ~200+ bytes before its content; Message is
+# a slotted record with interned role strings. It still supports
+# message["role"] / message["content"] so code written for dicts keeps
+# working, and API-shaped dicts are only built at send time (to_api).
+import sys
+from typing import Dict, Iterable, List, Union
+
+SYSTEM = sys.intern("system")
+USER = sys.intern("user")
+ASSISTANT = sys.intern("assistant")
+
+
+class Message:
+    """One chat message: role (interned) and content"""
+
+    __slots__ = ("role", "content")
+
+    def __init__(self, role: str, content: str):
+        self.role = sys.intern(role)
+        self.content = content
+
+    # Read-only mapping interface, so existing dict-style code works
+    def __getitem__(self, key: str) -> str:
+        if key == "role":
+            return self.role
+        if key == "content":
+            return self.content
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return ("role", "content")
+
+    def to_dict(self) -> Dict[str, str]:
+        return {"role": self.role, "content": self.content}
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Message):
+            return self.role == other.role and self.content == other.content
+        if isinstance(other, dict):
+            return other == self.to_dict()
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"Message({self.role!r}, {self.content[:40]!r})"
+
+
+MessageLike = Union[Message, Dict[str, str]]
+
+
+def as_message(message: MessageLike) -> Message:
+    """Converts a dict (e.g. loaded from storage) to a Message"""
+    if isinstance(message, Message):
+        return message
+    return Message(message["role"], message["content"])
+
+
+def to_api(messages: Iterable[MessageLike]) -> List[Dict[str, str]]:
+    """Builds the list of dicts the OpenAI API expects"""
+    return [m.to_dict() if isinstance(m, Message) else m for m in messages]
+
+
+def intern_prompt(text: str) -> str:
+    """
+    Returns the shared copy of a system prompt, so sessions with identical
+    settings hold one string instead of one copy each.
+    """
+    return sys.intern(text)
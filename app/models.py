@@ -0,0 +1,282 @@
+# Model registry (pricing, context size, observed latency) and the per-turn
+# model router
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Cheapest to most capable; the router moves along this scale
+TIERS = ("small", "standard", "large")
+
+
+@dataclass(frozen=True)
+class ModelInfo:
+    """What we know about a model. Prices are USD per 1M tokens."""
+    name: str
+    input_price: float
+    output_price: float
+    # Price of prompt tokens served from the provider's prompt cache
+    cached_input_price: float
+    context_window: int
+    tier: str = "standard"
+
+    def cost(self, input_tokens: int, output_tokens: int, cached_input_tokens: int = 0) -> float:
+        """USD cost of one request; cached_input_tokens is part of input_tokens"""
+        cached = min(cached_input_tokens, input_tokens)
+        return ((input_tokens - cached) * self.input_price
+                + cached * self.cached_input_price
+                + output_tokens * self.output_price) / 1_000_000
+
+
+class LatencyStats:
+    """
+    Rolling latency of one model: an exponentially weighted average plus
+    the recent samples for percentiles. Thread-safe.
+    """
+
+    def __init__(self, window: int = 200, alpha: float = 0.2):
+        self._lock = threading.Lock()
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._alpha = alpha
+        self.ewma: Optional[float] = None
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.ewma = seconds if self.ewma is None else (
+                self._alpha * seconds + (1 - self._alpha) * self.ewma
+            )
+
+    @property
+    def samples(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def snapshot(self) -> Dict[str, float]:
+        return {"samples": self.samples, "ewma_s": self.ewma or 0.0,
+                "p50_s": self.percentile(0.5) or 0.0, "p95_s": self.percentile(0.95) or 0.0}
+
+
+_registry: Dict[str, ModelInfo] = {}
+_latency: Dict[str, LatencyStats] = {}
+_registry_lock = threading.Lock()
+
+
+def register_model(info: ModelInfo, replace: bool = False) -> ModelInfo:
+    """
+    Adds a model to the registry.
+
+    Args:
+        info: Pricing and limits of the model
+        replace: Allow overwriting an existing entry (e.g. new prices)
+
+    Returns:
+        The registered ModelInfo
+    """
+    if info.tier not in TIERS:
+        raise ValueError(f"Unknown tier '{info.tier}', expected one of {TIERS}")
+    with _registry_lock:
+        if info.name in _registry and not replace:
+            raise ValueError(f"Model '{info.name}' is already registered")
+        _registry[info.name] = info
+        _latency.setdefault(info.name, LatencyStats())
+        return info
+
+
+def find_model(name: str) -> Optional[ModelInfo]:
+    """
+    Looks up a model by name. Dated snapshots ("gpt-4.1-mini-2025-04-14")
+    resolve to their base entry. Returns None for unknown models.
+    """
+    info = _registry.get(name)
+    if info is not None or not name:
+        return info
+    # Longest registered name that the snapshot name starts with
+    matches = [n for n in _registry if name.startswith(n + "-")]
+    return _registry[max(matches, key=len)] if matches else None
+
+
+_warned_unknown = set()
+
+
+def get_model(name: str = None) -> ModelInfo:
+    """Like find_model, but falls back to Config.MODEL_NAME for unknown models"""
+    name = name or Config.MODEL_NAME
+    info = find_model(name)
+    if info is not None:
+        return info
+    if name not in _warned_unknown:
+        _warned_unknown.add(name)
+        logger.warning("No pricing for model '%s', using %s prices", name, Config.MODEL_NAME)
+    return find_model(Config.MODEL_NAME) or _registry["gpt-4o-mini"]
+
+
+def available_models() -> List[str]:
+    """Registered model names, in registration order"""
+    return list(_registry)
+
+
+def record_latency(model: str, seconds: float):
+    """
+    Adds an observation of how long `model` took until the reply started
+    showing (time to first token when streaming, else the whole request)
+    """
+    info = find_model(model)
+    key = info.name if info is not None else model
+    with _registry_lock:
+        stats = _latency.get(key)
+        if stats is None:
+            stats = _latency[key] = LatencyStats()
+    stats.record(seconds)
+
+
+def latency_stats(model: str) -> LatencyStats:
+    info = find_model(model)
+    with _registry_lock:
+        return _latency.setdefault(info.name if info else model, LatencyStats())
+
+
+def latency_report() -> Dict[str, Dict[str, float]]:
+    """Per-model latency snapshot, for models that have been used"""
+    with _registry_lock:
+        items = list(_latency.items())
+    return {name: stats.snapshot() for name, stats in items if stats.samples}
+
+
+# Prices as of mid 2025 (https://openai.com/api/pricing)
+register_model(ModelInfo("gpt-4.1", 2.00, 8.00, 0.50, 1_047_576, "large"))
+register_model(ModelInfo("gpt-4.1-mini", 0.40, 1.60, 0.10, 1_047_576, "standard"))
+register_model(ModelInfo("gpt-4.1-nano", 0.10, 0.40, 0.025, 1_047_576, "small"))
+register_model(ModelInfo("gpt-4o", 2.50, 10.00, 1.25, 128_000, "large"))
+register_model(ModelInfo("gpt-4o-mini", 0.150, 0.600, 0.075, 128_000, "standard"))
+register_model(ModelInfo("gpt-4-turbo", 10.00, 30.00, 10.00, 128_000, "large"))
+register_model(ModelInfo("gpt-4", 30.00, 60.00, 30.00, 8_192, "large"))
+
+
+# ---------- routing ----------
+
+@dataclass
+class RouteDecision:
+    """Model picked for a turn and why (for logs and the UI)"""
+    model: str
+    reason: str
+
+
+class ModelRouter:
+    """
+    Picks the model for each turn.
+
+    - Hard difficulty and multi-step techniques (Chain-of-Thought,
+      Least-to-Most) get the large model.
+    - Short answers in Easy / Zero-shot interviews (acknowledgements like
+      "ok, ready") get the small model.
+    - Everything else gets the standard model (Config.MODEL_NAME).
+    - Long conversations are never sent to the small model, and a model
+      whose context window is too small is skipped.
+    - If a model's recent p95 latency is over the latency target, the next
+      cheaper model is used instead while it is within the target.
+
+    When disabled, every turn uses the standard model.
+    """
+
+    LARGE_TECHNIQUES = frozenset({"Chain-of-Thought", "Least-to-Most"})
+
+    def __init__(self, enabled: bool = None, small: str = None, standard: str = None,
+                 large: str = None, latency_target: float = None,
+                 long_context_tokens: int = None, short_input_words: int = None,
+                 min_latency_samples: int = 20):
+        self.enabled = Config.ROUTER_ENABLED if enabled is None else enabled
+        self.models = {
+            "small": small or Config.ROUTER_SMALL_MODEL,
+            "standard": standard or Config.MODEL_NAME,
+            "large": large or Config.ROUTER_LARGE_MODEL,
+        }
+        self.latency_target = latency_target or Config.ROUTER_LATENCY_TARGET
+        self.long_context_tokens = long_context_tokens or Config.ROUTER_LONG_CONTEXT_TOKENS
+        self.short_input_words = short_input_words or Config.ROUTER_SHORT_INPUT_WORDS
+        self.min_latency_samples = min_latency_samples
+        self._lock = threading.Lock()
+        self._counts: Dict[str, int] = {}
+
+    def _fits(self, tier: str, context_tokens: int) -> bool:
+        info = get_model(self.models[tier])
+        return context_tokens + Config.RATE_LIMIT_OUTPUT_ESTIMATE <= info.context_window
+
+    def _too_slow(self, tier: str) -> bool:
+        stats = latency_stats(self.models[tier])
+        if stats.samples < self.min_latency_samples:
+            return False
+        return stats.percentile(0.95) > self.latency_target
+
+    def choose(self, technique: str, difficulty: str, context_tokens: int,
+               user_words: Optional[int] = None) -> RouteDecision:
+        """
+        Args:
+            technique: The interview's prompt technique
+            difficulty: "Easy", "Medium" or "Hard"
+            context_tokens: Size of the history to be sent
+            user_words: Length of the candidate's latest answer (None for
+                the opening question)
+
+        Returns:
+            RouteDecision with the model name and the reason
+        """
+        if not self.enabled:
+            return RouteDecision(self.models["standard"], "default")
+
+        if difficulty == "Hard" or technique in self.LARGE_TECHNIQUES:
+            tier, reason = "large", "complex"
+        elif (difficulty == "Easy" and technique == "Zero-shot"
+              and user_words is not None and user_words <= self.short_input_words):
+            tier, reason = "small", "short answer"
+        else:
+            tier, reason = "standard", "default"
+
+        floor = 0
+        if context_tokens > self.long_context_tokens:
+            floor = TIERS.index("standard")
+            if TIERS.index(tier) < floor:
+                tier, reason = "standard", "long conversation"
+
+        index = TIERS.index(tier)
+        if index > floor and self._too_slow(tier) and not self._too_slow(TIERS[index - 1]):
+            tier, reason = TIERS[index - 1], "latency"
+
+        # Step up until the context fits
+        while not self._fits(tier, context_tokens) and tier != TIERS[-1]:
+            tier, reason = TIERS[TIERS.index(tier) + 1], "context size"
+
+        decision = RouteDecision(self.models[tier], reason)
+        with self._lock:
+            self._counts[decision.model] = self._counts.get(decision.model, 0) + 1
+        return decision
+
+    def stats(self) -> Dict[str, int]:
+        """How many turns were routed to each model"""
+        with self._lock:
+            return dict(self._counts)
+
+
+_router_lock = threading.Lock()
+_router = None
+
+
+def get_router() -> ModelRouter:
+    """Returns the process-wide router built from Config"""
+    global _router
+    if _router is None:
+        with _router_lock:
+            if _router is None:
+                _router = ModelRouter()
+    return _router
@@ -0,0 +1,182 @@
+# Speculative prefetch of the opening question.
+# As soon as new interview settings are applied, a background worker builds
+# the Interviewer and asks for the first question (question bank first, then
+# the live model, streamed into a buffer). The UI replays the buffer and
+# follows the stream, then claims the interviewer into session storage.
+# A prefetch for settings the user has since changed is cancelled.
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional
+
+from app.interviewer import InterviewerFactory
+from app.question_bank import QuestionBankIndex, get_question_bank
+from app.telemetry import telemetry
+from app.usage_ledger import ANONYMOUS, get_usage_ledger
+
+logger = logging.getLogger(__name__)
+
+# Opening questions are one short request each; a few workers are plenty
+_prefetch_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="opening-prefetch")
+
+
+class OpeningPrefetch:
+    """
+    One speculative opening question, being fetched in the background.
+
+    Thread-safe: the worker appends to the buffer while any number of
+    readers follow it with stream(). Nothing is written to session storage
+    until the caller claim()s the result, so a cancelled or failed prefetch
+    leaves no trace.
+    """
+
+    __slots__ = ("settings", "temperature", "use_cache", "user_id", "interviewer", "source",
+                 "error", "_parts", "_cond", "_done", "_cancelled")
+
+    def __init__(self, settings: Dict[str, str], temperature: float = 0.7,
+                 use_cache: bool = True, user_id: str = ANONYMOUS):
+        self.settings = dict(settings)
+        self.temperature = temperature
+        self.use_cache = use_cache
+        # Whose budget the live request counts against (app.usage_ledger)
+        self.user_id = user_id
+        self.interviewer = None
+        # "bank" or "live" once the question is known
+        self.source = None
+        self.error: Optional[BaseException] = None
+        self._parts: List[str] = []
+        self._cond = threading.Condition()
+        self._done = False
+        self._cancelled = False
+
+    @classmethod
+    def start(cls, settings: Dict[str, str], temperature: float = 0.7, use_cache: bool = True,
+              question_bank: Optional[QuestionBankIndex] = None,
+              user_id: str = ANONYMOUS) -> "OpeningPrefetch":
+        """
+        Starts fetching the opening question for `settings` in the background.
+
+        Args:
+            settings: job_role, skills, difficulty and technique
+            temperature: OpenAI temperature for the live request
+            use_cache: Allow serving the opening from the question bank or
+                the response cache
+            question_bank: Bank to try first (default: the configured one)
+            user_id: Whose usage budget a live request counts against; over
+                budget, the prefetch fails (and claim() returns None)
+
+        Returns:
+            The running prefetch
+        """
+        prefetch = cls(settings, temperature, use_cache, user_id)
+        telemetry.inc("opening_prefetch_total", event="started")
+        _prefetch_executor.submit(prefetch._run, question_bank)
+        return prefetch
+
+    def _push(self, delta: str):
+        with self._cond:
+            self._parts.append(delta)
+            self._cond.notify_all()
+
+    def _run(self, question_bank: Optional[QuestionBankIndex]):
+        try:
+            interviewer = InterviewerFactory.create(**self.settings)
+            interviewer.user_id = self.user_id
+            bank = question_bank if question_bank is not None else get_question_bank()
+            # Asked for a varied opening: not the bank's stored one
+            record = bank.lookup(**self.settings) if bank and self.use_cache else None
+            if record is not None:
+                interviewer.seed_opening(record["opening"])
+                self._push(record["opening"])
+                self.source = "bank"
+            else:
+                get_usage_ledger().check_budget(self.user_id)
+                stream = interviewer.open_stream(self.temperature, self.use_cache)
+                try:
+                    for delta in stream:
+                        if self._cancelled:
+                            break
+                        self._push(delta)
+                finally:
+                    stream.close()
+                self.source = "live"
+            if not self._cancelled and self._parts:
+                self.interviewer = interviewer
+        except Exception as e:
+            self.error = e
+            telemetry.inc("opening_prefetch_total", event="failed")
+            logger.warning("Opening question prefetch failed: %s", e)
+        finally:
+            with self._cond:
+                self._done = True
+                self._cond.notify_all()
+
+    @property
+    def done(self) -> bool:
+        return self._done
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @property
+    def text(self) -> str:
+        """The opening question so far"""
+        with self._cond:
+            return "".join(self._parts)
+
+    def matches(self, settings: Dict[str, str]) -> bool:
+        """Whether this prefetch is for `settings`"""
+        return self.settings == dict(settings)
+
+    def cancel(self):
+        """Stops the prefetch; its result will not be used"""
+        with self._cond:
+            if self._cancelled:
+                return
+            self._cancelled = True
+            self._cond.notify_all()
+        telemetry.inc("opening_prefetch_total", event="cancelled")
+
+    def stream(self) -> Iterator[str]:
+        """
+        Yields the opening question from the start: whatever is buffered
+        right away, then the rest as it arrives. Ends when the prefetch is
+        done or cancelled.
+        """
+        sent = 0
+        while True:
+            with self._cond:
+                while sent == len(self._parts) and not (self._done or self._cancelled):
+                    self._cond.wait()
+                pending = self._parts[sent:]
+                finished = self._done or self._cancelled
+            for delta in pending:
+                yield delta
+            sent += len(pending)
+            if finished and sent == len(self._parts):
+                return
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Blocks until the prefetch is done; False on timeout"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._done, timeout)
+
+    def claim(self, storage: Dict[str, Any], storage_key: str = "interviewer") -> Optional[str]:
+        """
+        Waits for the prefetch and, if it succeeded, stores its interviewer
+        (opening question included) as the session's interviewer.
+
+        Returns:
+            The opening question, or None if the prefetch was cancelled or
+            failed (the caller then falls back to a plain greeting)
+        """
+        if self._cancelled:
+            return None
+        self.wait()
+        if self._cancelled or self.interviewer is None:
+            return None
+        storage[storage_key] = self.interviewer
+        InterviewerFactory.save(storage, storage_key)
+        telemetry.inc("opening_prefetch_total", event="used", source=self.source)
+        return self.text
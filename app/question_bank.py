@@ -0,0 +1,236 @@
+# Storage and lookup for pre-generated interview questions
+# (written by app.batch_generate, served by InterviewerFactory.open_interview)
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, FrozenSet, Iterable, Iterator, List, Optional, Set, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def settings_key(job_role: str, skills: str, difficulty: str, technique: str) -> str:
+    """Exact key for one settings combination"""
+    return json.dumps([job_role, skills, difficulty, technique], ensure_ascii=False,
+                      separators=(",", ":"))
+
+
+class JsonlQuestionStore:
+    """One compact JSON record per line; later records win on load"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def add(self, record: Dict):
+        line = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    def load(self) -> Iterator[Dict]:
+        if not os.path.exists(self.path):
+            return iter(())
+        records = {}
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    record = json.loads(line)
+                    records[record["key"]] = record
+        return iter(records.values())
+
+    def close(self):
+        pass
+
+
+class SQLiteQuestionStore:
+    """SQLite table keyed by settings; re-adding a key replaces it"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS questions (key TEXT PRIMARY KEY, record TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+    def add(self, record: Dict):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO questions (key, record) VALUES (?, ?)",
+                (record["key"], json.dumps(record, ensure_ascii=False, separators=(",", ":"))),
+            )
+            self._conn.commit()
+
+    def load(self) -> Iterator[Dict]:
+        with self._lock:
+            rows = self._conn.execute("SELECT record FROM questions").fetchall()
+        return (json.loads(row[0]) for row in rows)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def open_store(path: str):
+    """Picks the store type from the file extension (.db/.sqlite -> SQLite)"""
+    if path.endswith((".db", ".sqlite", ".sqlite3")):
+        return SQLiteQuestionStore(path)
+    return JsonlQuestionStore(path)
+
+
+def make_record(job_role: str, skills: str, difficulty: str, technique: str,
+                opening: str, follow_ups: List[str], model: str) -> Dict:
+    """The stored shape of one generated combination"""
+    return {
+        "key": settings_key(job_role, skills, difficulty, technique),
+        "job_role": job_role,
+        "skills": skills,
+        "difficulty": difficulty,
+        "technique": technique,
+        "opening": opening,
+        "follow_ups": follow_ups,
+        "model": model,
+    }
+
+
+# Words that don't help tell two roles/skill lists apart
+_STOPWORDS = {"a", "an", "and", "at", "for", "in", "of", "on", "the", "to", "with", "&"}
+
+
+def normalize_tokens(text: str) -> FrozenSet[str]:
+    """'Python Backend Engineer @ Google' -> {'python', 'backend', 'engineer', 'google'}"""
+    tokens = re.split(r"[^0-9a-z+#]+", text.casefold())
+    return frozenset(t for t in tokens if t and t not in _STOPWORDS)
+
+
+def similarity(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    """
+    Mix of overlap coefficient and Jaccard: "python backend" vs
+    "python backend engineer" scores high, unrelated roles score 0.
+    """
+    if not a and not b:
+        return 1.0
+    if not a or not b:
+        return 0.0
+    common = len(a & b)
+    return 0.5 * common / min(len(a), len(b)) + 0.5 * common / len(a | b)
+
+
+class QuestionBankIndex:
+    """
+    In-memory index over generated questions.
+
+    Lookup is exact on the settings first, then on normalized tokens, then
+    fuzzy on role and skills (difficulty and technique must match).
+    """
+
+    def __init__(self, records: Iterable[Dict], min_score: float = 0.75):
+        self.min_score = min_score
+        self._exact: Dict[str, Dict] = {}
+        self._normalized: Dict[Tuple, Dict] = {}
+        # (difficulty, technique) -> token -> indexes into self._entries
+        self._postings: Dict[Tuple[str, str], Dict[str, Set[int]]] = {}
+        self._entries: List[Tuple[FrozenSet[str], FrozenSet[str], Dict]] = []
+        self._lock = threading.Lock()
+        self._stats = {"exact_hits": 0, "fuzzy_hits": 0, "misses": 0}
+
+        for record in records:
+            self.add(record)
+
+    def add(self, record: Dict):
+        """Indexes one record (as produced by make_record)"""
+        role_tokens = normalize_tokens(record["job_role"])
+        skill_tokens = normalize_tokens(record["skills"])
+        bucket = (record["difficulty"], record["technique"])
+
+        self._exact[record["key"]] = record
+        self._normalized[(role_tokens, skill_tokens) + bucket] = record
+        index = len(self._entries)
+        self._entries.append((role_tokens, skill_tokens, record))
+        postings = self._postings.setdefault(bucket, {})
+        for token in role_tokens | skill_tokens:
+            postings.setdefault(token, set()).add(index)
+
+    def __len__(self) -> int:
+        return len(self._exact)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def lookup(self, job_role: str, skills: str, difficulty: str,
+               technique: str) -> Optional[Dict]:
+        """
+        Finds the best stored record for these settings.
+
+        Returns:
+            The record (with "opening" and "follow_ups"), or None on a miss
+        """
+        record = self._exact.get(settings_key(job_role, skills, difficulty, technique))
+        role_tokens = normalize_tokens(job_role)
+        skill_tokens = normalize_tokens(skills)
+        if record is None:
+            record = self._normalized.get((role_tokens, skill_tokens, difficulty, technique))
+        if record is not None:
+            self._count("exact_hits")
+            return record
+
+        postings = self._postings.get((difficulty, technique), {})
+        candidates = set()
+        for token in role_tokens | skill_tokens:
+            candidates |= postings.get(token, set())
+
+        best, best_score = None, 0.0
+        for index in candidates:
+            entry_role, entry_skills, entry = self._entries[index]
+            role_score = similarity(role_tokens, entry_role)
+            skill_score = similarity(skill_tokens, entry_skills)
+            if role_score < self.min_score or skill_score < self.min_score:
+                continue
+            score = role_score + skill_score
+            if score > best_score:
+                best, best_score = entry, score
+
+        self._count("fuzzy_hits" if best is not None else "misses")
+        return best
+
+    def stats(self) -> Dict[str, float]:
+        """Hit counters and hit rate"""
+        with self._lock:
+            stats = dict(self._stats)
+        lookups = stats["exact_hits"] + stats["fuzzy_hits"] + stats["misses"]
+        stats["lookups"] = lookups
+        stats["hit_rate"] = (lookups - stats["misses"]) / lookups if lookups else 0.0
+        return stats
+
+
+_bank_lock = threading.Lock()
+_bank = None
+_bank_loaded = False
+
+
+def get_question_bank() -> Optional[QuestionBankIndex]:
+    """
+    Returns the process-wide index loaded from Config.QUESTION_BANK_PATH,
+    or None when no bank is configured.
+    """
+    global _bank, _bank_loaded
+    if not _bank_loaded:
+        with _bank_lock:
+            if not _bank_loaded:
+                from app.config import Config
+                path = Config.QUESTION_BANK_PATH
+                if path and os.path.exists(path):
+                    store = open_store(path)
+                    try:
+                        _bank = QuestionBankIndex(store.load(), Config.QUESTION_BANK_MIN_SCORE)
+                    finally:
+                        store.close()
+                    logger.info("Loaded %d pre-generated openings from %s", len(_bank), path)
+                _bank_loaded = True
+    return _bank
@@ -0,0 +1,541 @@
+# Keeps model requests going when a model is slow or failing (used by
+# app.ai_client around each request it sends).
+#
+# - Hedging: a request still running after its model's recent p95 latency
+#   is sent a second time and whichever reply comes first is used. At most
+#   HEDGE_MAX_RATE of requests are hedged, so a slow model does not get
+#   twice the load, and a hedge is only sent if the caller admits it (the
+#   scheduler has room for it right now). The losing copy is left to
+#   finish and handed to the caller's discard (its tokens are billed).
+# - Circuit breaker per model: after BREAKER_FAILURE_THRESHOLD failures in a
+#   row the model is skipped for BREAKER_RESET_SECONDS; then one probe
+#   request is let through (half-open) and its outcome closes or reopens it.
+# - Failover: a request whose model fails (after the scheduler's retries)
+#   or whose breaker is open goes to the next of FALLBACK_MODELS.
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.config import Config
+from app.models import LatencyStats
+from app.scheduler import is_retryable
+from app.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+# Breaker states as numbers, for metrics
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+# Hedge credit that can be saved up while no hedges are needed
+_MAX_HEDGE_CREDIT = 10.0
+
+
+class CircuitOpenError(Exception):
+    """Raised when a model's breaker is open and no other model is left to try"""
+
+    def __init__(self, model: str, retry_in: float):
+        super().__init__(f"{model} is unavailable (circuit open, retry in {retry_in:.0f}s)")
+        self.model = model
+        self.retry_in = retry_in
+
+
+def is_model_failure(error: Exception) -> bool:
+    """
+    Errors that count against a model's breaker and move a request on to a
+    backup model: 429s, 5xx, timeouts and connection errors (what the
+    scheduler retries), and an open breaker. A bad request would fail on
+    any model, so it does neither.
+    """
+    return isinstance(error, CircuitOpenError) or is_retryable(error)
+
+
+def parse_models(value: str) -> List[str]:
+    """Reads a comma-separated list of model names"""
+    return [name.strip() for name in (value or "").split(",") if name.strip()]
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker for one model. Thread-safe.
+
+    Args:
+        model: The model it guards (for logs and metrics)
+        failure_threshold: Failures in a row that open it
+        reset_seconds: How long it stays open before a probe is let through
+    """
+
+    def __init__(self, model: str, failure_threshold: int, reset_seconds: float):
+        self.model = model
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self._lock = threading.Lock()
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        # A half-open breaker lets one request through at a time
+        self._probing = False
+        self.trips = 0
+        self.rejected = 0
+
+    def retry_in(self) -> float:
+        """Seconds until a probe will be let through (0 if not open)"""
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.opened_at + self.reset_seconds - time.monotonic())
+
+    def is_open(self) -> bool:
+        """
+        True (and counted as a rejection) if a request would be turned away
+        now. Unlike allow(), never makes the caller the probe.
+        """
+        with self._lock:
+            if self.state == OPEN:
+                turned_away = time.monotonic() - self.opened_at < self.reset_seconds
+            else:
+                turned_away = self.state == HALF_OPEN and self._probing
+            self.rejected += turned_away
+            return turned_away
+
+    def allow(self) -> bool:
+        """Asks to send one request; when half-open, the caller becomes the probe"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.reset_seconds:
+                    self.rejected += 1
+                    return False
+                self.state = HALF_OPEN
+                self._probing = False
+                logger.info("Circuit for %s half-open, probing", self.model)
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._probing = False
+            if self.state != CLOSED:
+                self.state = CLOSED
+                logger.info("Circuit for %s closed", self.model)
+                telemetry.inc("openai_breaker_closes_total", model=self.model)
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == HALF_OPEN or (self.state == CLOSED
+                                           and self.failures >= self.failure_threshold):
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+                self.trips += 1
+                logger.warning("Circuit for %s open after %d failures, retrying in %gs",
+                               self.model, self.failures, self.reset_seconds)
+                telemetry.inc("openai_breaker_trips_total", model=self.model)
+
+    def release(self):
+        """Ends a request that said nothing about the model (e.g. a bad request)"""
+        with self._lock:
+            self._probing = False
+
+
+class Resilience:
+    """
+    Hedging, circuit breakers and failover for model requests. Thread-safe.
+
+    Args:
+        hedge_enabled: Send a duplicate of requests slower than the deadline
+        hedge_percentile: Observed latency the deadline is set at
+        hedge_min_delay: Shortest deadline ever used (seconds)
+        hedge_min_samples: Requests observed per model before hedging starts
+        hedge_max_rate: Largest share of requests that get a hedge
+        failure_threshold: Failures in a row that open a model's breaker
+        reset_seconds: How long a breaker stays open before probing
+        fallback_models: Backup models, tried in order
+        max_workers: Threads for hedges of synchronous requests
+    """
+
+    def __init__(self, hedge_enabled: bool = None, hedge_percentile: float = None,
+                 hedge_min_delay: float = None, hedge_min_samples: int = None,
+                 hedge_max_rate: float = None, failure_threshold: int = None,
+                 reset_seconds: float = None, fallback_models: List[str] = None,
+                 max_workers: int = 64):
+        self.hedge_enabled = Config.HEDGE_ENABLED if hedge_enabled is None else hedge_enabled
+        self.hedge_percentile = hedge_percentile or Config.HEDGE_PERCENTILE
+        self.hedge_min_delay = (Config.HEDGE_MIN_DELAY if hedge_min_delay is None
+                                else hedge_min_delay)
+        self.hedge_min_samples = (Config.HEDGE_MIN_SAMPLES if hedge_min_samples is None
+                                  else hedge_min_samples)
+        self.hedge_max_rate = (Config.HEDGE_MAX_RATE if hedge_max_rate is None
+                               else hedge_max_rate)
+        self.failure_threshold = failure_threshold or Config.BREAKER_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds or Config.BREAKER_RESET_SECONDS
+        self.fallback_models = (parse_models(Config.FALLBACK_MODELS) if fallback_models is None
+                                else list(fallback_models))
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        # (model, "complete" | "stream") -> latency of single attempts
+        self._latency: Dict[Tuple[str, str], LatencyStats] = {}
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._credit = 1.0
+        # Discards of losing async hedges still running
+        self._discarding = set()
+        self._counts = {"requests": 0, "hedges": 0, "hedge_wins": 0,
+                        "hedges_skipped": 0, "failovers": 0}
+
+    # ---------- state ----------
+
+    def breaker(self, model: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(model)
+            if breaker is None:
+                breaker = self._breakers[model] = CircuitBreaker(
+                    model, self.failure_threshold, self.reset_seconds)
+            return breaker
+
+    def _stats(self, model: str, kind: str) -> LatencyStats:
+        with self._lock:
+            stats = self._latency.get((model, kind))
+            if stats is None:
+                stats = self._latency[(model, kind)] = LatencyStats()
+            return stats
+
+    def _count(self, name: str):
+        with self._lock:
+            self._counts[name] += 1
+
+    def hedge_delay(self, model: str, kind: str) -> Optional[float]:
+        """Seconds after which a request to `model` gets a hedge (None: never)"""
+        if not self.hedge_enabled:
+            return None
+        stats = self._stats(model, kind)
+        if stats.samples < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, stats.percentile(self.hedge_percentile))
+
+    def _may_hedge(self, admit: Callable[[], bool] = None) -> bool:
+        """
+        Each request earns hedge_max_rate of a hedge; a hedge spends one,
+        if `admit` lets it through
+        """
+        with self._lock:
+            if self._credit < 1:
+                self._counts["hedges_skipped"] += 1
+                return False
+            self._credit -= 1
+        # Outside the lock: admit() takes the scheduler's lock
+        admitted = admit is None or admit()
+        with self._lock:
+            if not admitted:
+                self._credit += 1
+                self._counts["hedges_skipped"] += 1
+                return False
+            self._counts["hedges"] += 1
+            return True
+
+    def _earn(self):
+        with self._lock:
+            self._counts["requests"] += 1
+            self._credit = min(_MAX_HEDGE_CREDIT, self._credit + self.hedge_max_rate)
+
+    def _executor(self) -> ThreadPoolExecutor:
+        if self._pool is None:
+            with self._lock:
+                if self._pool is None:
+                    self._pool = ThreadPoolExecutor(self.max_workers, thread_name_prefix="hedge")
+        return self._pool
+
+    def _timed(self, model: str, kind: str, fn: Callable[[], Any]) -> Callable[[], Any]:
+        """fn, recording how long each successful attempt took (hedges included)"""
+        stats = self._stats(model, kind)
+
+        def timed():
+            started = time.perf_counter()
+            value = fn()
+            stats.record(time.perf_counter() - started)
+            return value
+        return timed
+
+    def _atimed(self, model: str, kind: str, fn: Callable[[], Awaitable[Any]]):
+        stats = self._stats(model, kind)
+
+        async def timed():
+            started = time.perf_counter()
+            value = await fn()
+            stats.record(time.perf_counter() - started)
+            return value
+        return timed
+
+    def _admit(self, model: str) -> CircuitBreaker:
+        breaker = self.breaker(model)
+        if not breaker.allow():
+            raise CircuitOpenError(model, breaker.retry_in())
+        return breaker
+
+    def _settle(self, breaker: CircuitBreaker, error: Optional[Exception]):
+        if error is None:
+            breaker.record_success()
+        elif is_model_failure(error):
+            breaker.record_failure()
+        else:
+            breaker.release()
+
+    # ---------- one request ----------
+
+    def call(self, model: str, kind: str, fn: Callable[[], Any],
+             discard: Callable[[Any], None] = None,
+             admit: Callable[[], bool] = None) -> Any:
+        """
+        Runs one attempt of a request through the model's breaker, hedging
+        it if it runs past the deadline.
+
+        Args:
+            model: The model the request goes to
+            kind: "complete" or "stream" (they are timed separately)
+            fn: Sends the request and returns the response
+            discard: Called with a losing hedge's response (e.g. to close a
+                stream and record its usage)
+            admit: Called before a hedge is sent; False skips the hedge
+                (e.g. AdmissionScheduler.try_acquire)
+
+        Returns:
+            The first response to arrive
+
+        Raises:
+            CircuitOpenError: if the model's breaker turned the request away
+        """
+        breaker = self._admit(model)
+        # A probe is sent once; hedging only happens while the model is healthy
+        delay = self.hedge_delay(model, kind) if breaker.state == CLOSED else None
+        self._earn()
+        fn = self._timed(model, kind, fn)
+        try:
+            value = fn() if delay is None else self._hedged(model, delay, fn, discard, admit)
+        except Exception as e:
+            self._settle(breaker, e)
+            raise
+        self._settle(breaker, None)
+        return value
+
+    def _hedged(self, model: str, delay: float, fn, discard, admit):
+        # The request runs on a thread of its own, so requests are never
+        # queued behind each other's hedges; the deadline starts when it
+        # is actually sent. Only hedges go to the (bounded) pool.
+        started = threading.Event()
+
+        def send():
+            started.set()
+            return fn()
+        primary = _start_thread(send)
+        started.wait()
+        try:
+            return primary.result(timeout=delay)
+        except FutureTimeoutError:
+            pass
+        if not self._may_hedge(admit):
+            return primary.result()
+        logger.debug("Hedging a request to %s after %.2fs", model, delay)
+        telemetry.inc("openai_hedges_total", model=model)
+        hedge = self._executor().submit(fn)
+        futures = (primary, hedge)
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winners = [f for f in futures if f in done and f.exception() is None]
+            if winners:
+                winner = winners[0]
+                if winner is hedge:
+                    self._count("hedge_wins")
+                    telemetry.inc("openai_hedge_wins_total", model=model)
+                # The loser cannot be cancelled mid-request; its reply is dropped
+                for loser in winners[1:] + list(pending):
+                    loser.add_done_callback(lambda f: _discard(f, discard))
+                return winner.result()
+        # Both failed: report the original request's error
+        return primary.result()
+
+    async def acall(self, model: str, kind: str, fn: Callable[[], Awaitable[Any]],
+                    discard: Callable[[Any], Awaitable[None]] = None,
+                    admit: Callable[[], bool] = None) -> Any:
+        """Async version of call(); fn and discard are coroutine functions"""
+        breaker = self._admit(model)
+        delay = self.hedge_delay(model, kind) if breaker.state == CLOSED else None
+        self._earn()
+        fn = self._atimed(model, kind, fn)
+        try:
+            value = await (fn() if delay is None
+                           else self._ahedged(model, delay, fn, discard, admit))
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            self._settle(breaker, e)
+            raise
+        self._settle(breaker, None)
+        return value
+
+    async def _ahedged(self, model: str, delay: float, fn, discard, admit):
+        primary = asyncio.ensure_future(fn())
+        tasks = [primary]
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done or not self._may_hedge(admit):
+                return await primary
+            logger.debug("Hedging a request to %s after %.2fs", model, delay)
+            telemetry.inc("openai_hedges_total", model=model)
+            hedge = asyncio.ensure_future(fn())
+            tasks.append(hedge)
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                winners = [t for t in tasks if t in done and t.exception() is None]
+                if winners:
+                    winner = winners[0]
+                    if winner is hedge:
+                        self._count("hedge_wins")
+                        telemetry.inc("openai_hedge_wins_total", model=model)
+                    # Like in _hedged, the loser finishes and is discarded
+                    for loser in tasks:
+                        if loser is not winner:
+                            loser.add_done_callback(lambda t: self._adiscard(t, discard))
+                    tasks = []
+                    return winner.result()
+            return primary.result()
+        finally:
+            # Both are cancelled if the caller gave up before a reply came
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+    def _adiscard(self, task: "asyncio.Task", discard):
+        if discard is None or task.cancelled() or task.exception() is not None:
+            return
+        job = asyncio.ensure_future(_acall_discard(discard, task.result()))
+        self._discarding.add(job)
+        job.add_done_callback(self._discarding.discard)
+
+    # ---------- failover ----------
+
+    def candidates(self, model: str) -> List[str]:
+        """The model, then its backups in order"""
+        return [model] + [m for m in self.fallback_models if m != model]
+
+    def _skip(self, model: str) -> Optional[CircuitOpenError]:
+        """The error to fail over with if `model`'s breaker is open, else None"""
+        breaker = self.breaker(model)
+        if not breaker.is_open():
+            return None
+        return CircuitOpenError(model, breaker.retry_in())
+
+    def _failed_over(self, model: str, backup: str, error: Exception):
+        self._count("failovers")
+        telemetry.inc("openai_failovers_total", model=model, backup=backup,
+                      error=error.__class__.__name__)
+        logger.warning("Request to %s failed (%s), failing over to %s",
+                       model, error.__class__.__name__, backup)
+
+    def failover(self, model: str, attempt: Callable[[str], Any]) -> Any:
+        """
+        Runs attempt(model), moving on to the next backup model while the
+        attempt fails with a model failure (see is_model_failure).
+
+        Returns:
+            What the first successful attempt returned
+        """
+        models = self.candidates(model)
+        for i, candidate in enumerate(models):
+            try:
+                error = self._skip(candidate)
+                if error is not None:
+                    raise error
+                return attempt(candidate)
+            except Exception as e:
+                if i + 1 == len(models) or not is_model_failure(e):
+                    raise
+                self._failed_over(candidate, models[i + 1], e)
+
+    async def afailover(self, model: str, attempt: Callable[[str], Awaitable[Any]]) -> Any:
+        """Async version of failover()"""
+        models = self.candidates(model)
+        for i, candidate in enumerate(models):
+            try:
+                error = self._skip(candidate)
+                if error is not None:
+                    raise error
+                return await attempt(candidate)
+            except Exception as e:
+                if i + 1 == len(models) or not is_model_failure(e):
+                    raise
+                self._failed_over(candidate, models[i + 1], e)
+
+    # ---------- reporting ----------
+
+    def metrics(self) -> Dict[str, float]:
+        """Hedge and failover counters, plus state, trips and deadline per model"""
+        with self._lock:
+            metrics = dict(self._counts)
+            breakers = list(self._breakers.values())
+            kinds = list(self._latency)
+        metrics["trips"] = 0
+        for breaker in breakers:
+            metrics["trips"] += breaker.trips
+            metrics[f"{breaker.model}.state"] = STATE_VALUES[breaker.state]
+            metrics[f"{breaker.model}.trips"] = breaker.trips
+            metrics[f"{breaker.model}.rejected"] = breaker.rejected
+        for model, kind in kinds:
+            delay = self.hedge_delay(model, kind)
+            if delay is not None:
+                metrics[f"{model}.{kind}_hedge_delay_s"] = delay
+        return metrics
+
+
+async def _acall_discard(discard, value):
+    try:
+        await discard(value)
+    except Exception as e:
+        logger.debug("Could not discard a hedged response: %s", e)
+
+
+def _start_thread(fn: Callable[[], Any]) -> Future:
+    """Runs fn on a new daemon thread; returns the Future of its result"""
+    future = Future()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+    threading.Thread(target=run, name="request", daemon=True).start()
+    return future
+
+
+def _discard(future, discard):
+    if discard is not None and not future.cancelled() and future.exception() is None:
+        try:
+            discard(future.result())
+        except Exception as e:
+            logger.debug("Could not discard a hedged response: %s", e)
+
+
+_resilience_lock = threading.Lock()
+_resilience = None
+
+
+def get_resilience() -> Resilience:
+    """Returns the process-wide Resilience built from Config"""
+    global _resilience
+    if _resilience is None:
+        with _resilience_lock:
+            if _resilience is None:
+                _resilience = Resilience()
+    return _resilience
@@ -0,0 +1,226 @@
+# Caches AI responses for identical requests (e.g. interview openings)
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import Config
+
+# wrap_user_input() puts a fresh UUID around every user message; it has to
+# be normalized away or identical inputs would never share a cache entry
+_USER_INPUT_ID = re.compile(r'<USER_INPUT id="[^"]*">')
+_WHITESPACE = re.compile(r"\s+")
+
+
+def make_cache_key(messages: List[Dict[str, str]], model: str, temperature: float,
+                   options: Dict[str, Any] = None) -> str:
+    """
+    Builds a stable hash for a chat request.
+
+    Args:
+        messages: Message dictionaries that will be sent
+        model: OpenAI model name
+        temperature: Sampling temperature
+        options: Other request parameters that change the reply
+            (e.g. max_tokens, stop); None leaves the key as before
+
+    Returns:
+        Hex digest identifying the request
+    """
+    normalized = []
+    for message in messages:
+        content = _USER_INPUT_ID.sub('<USER_INPUT id="">', message["content"])
+        content = _WHITESPACE.sub(" ", content).strip()
+        normalized.append([message["role"], content])
+    key = [model, round(float(temperature), 3), normalized]
+    if options:
+        key.append(sorted((k, v) for k, v in options.items() if v is not None))
+    payload = json.dumps(key, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCacheBackend:
+    """Optional SQLite store so cached responses survive restarts"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or row[1] < time.time():
+            return None
+        return row[0]
+
+    def set(self, key: str, value: str, expires_at: float):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, value, expires_at),
+            )
+            self._conn.commit()
+
+
+class _Flight:
+    """An upstream call in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ResponseCache:
+    """
+    In-memory LRU + TTL cache for response texts, with an optional disk
+    backend and single-flight coalescing: concurrent callers asking for the
+    same key while it is being computed wait for that one upstream call.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600,
+                 disk: Optional[DiskCacheBackend] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.disk = disk
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, expires_at)
+        self._inflight = {}
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0,
+                       "expirations": 0, "coalesced": 0, "disk_hits": 0}
+
+    def _lookup(self, key: str) -> Optional[str]:
+        """Memory then disk lookup. Caller must hold the lock."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry[1] >= time.time():
+                self._entries.move_to_end(key)
+                return entry[0]
+            del self._entries[key]
+            self._stats["expirations"] += 1
+
+        if self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self._stats["disk_hits"] += 1
+                self._store(key, value, write_disk=False)
+                return value
+        return None
+
+    def _store(self, key: str, value: str, write_disk: bool = True):
+        """Caller must hold the lock."""
+        expires_at = time.time() + self.ttl_seconds
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+        if write_disk and self.disk is not None:
+            self.disk.set(key, value, expires_at)
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached value or None"""
+        with self._lock:
+            value = self._lookup(key)
+            self._stats["hits" if value is not None else "misses"] += 1
+            return value
+
+    def set(self, key: str, value: str):
+        """Stores a value"""
+        with self._lock:
+            self._store(key, value)
+
+    def get_or_compute(self, key: str, compute: Callable[[], str],
+                       should_store: Callable[[str], bool] = None) -> Tuple[str, bool]:
+        """
+        Returns the cached value for `key`, or runs `compute` once and caches
+        its result (unless should_store(result) is False, e.g. for a reply
+        that was cut off). Callers that arrive while `compute` is running
+        share it.
+
+        Returns:
+            (value, from_cache): from_cache is False only for the caller
+            that actually made the upstream call
+        """
+        with self._lock:
+            value = self._lookup(key)
+            if value is not None:
+                self._stats["hits"] += 1
+                return value, True
+
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self._stats["misses"] += 1
+            else:
+                self._stats["coalesced"] += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value, True
+
+        try:
+            flight.value = compute()
+            if should_store is None or should_store(flight.value):
+                with self._lock:
+                    self._store(key, flight.value)
+            return flight.value, False
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.done.set()
+
+    def stats(self) -> Dict[str, float]:
+        """Hit/miss/eviction counters plus current size and hit rate"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"] + stats["coalesced"]
+        stats["hit_rate"] = (stats["hits"] + stats["coalesced"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        """Drops all in-memory entries (the disk store is left alone)"""
+        with self._lock:
+            self._entries.clear()
+
+
+_cache_lock = threading.Lock()
+_response_cache = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Returns the process-wide response cache built from Config"""
+    global _response_cache
+    if _response_cache is None:
+        with _cache_lock:
+            if _response_cache is None:
+                disk = None
+                if Config.RESPONSE_CACHE_PATH:
+                    disk = DiskCacheBackend(Config.RESPONSE_CACHE_PATH)
+                _response_cache = ResponseCache(
+                    max_entries=Config.RESPONSE_CACHE_MAX_ENTRIES,
+                    ttl_seconds=Config.RESPONSE_CACHE_TTL,
+                    disk=disk,
+                )
+    return _response_cache
@@ -0,0 +1,334 @@
+# Process-wide admission control for OpenAI calls.
+#
+# - Token buckets enforce requests-per-minute and tokens-per-minute budgets.
+# - Waiting requests are queued per session and admitted round-robin, so one
+#   busy session cannot starve the others; waits are bounded by max_wait.
+#   Threads and coroutines share the queues; a coroutine waits on an
+#   asyncio.Event on its own loop, never on a thread.
+# - 429 / 5xx / connection errors are retried with jittered exponential
+#   backoff, honouring the server's Retry-After header.
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, Optional
+
+from app.config import Config
+from app.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+
+class QueueTimeoutError(Exception):
+    """Raised when a request waited longer than max_wait for admission"""
+
+
+class TokenBucket:
+    """Classic token bucket. Not thread-safe; AdmissionScheduler locks it."""
+
+    def __init__(self, capacity: float, per_second: float):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.level = capacity
+        self._updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.per_second)
+        self._updated = now
+
+    def time_until(self, amount: float) -> float:
+        """Seconds until `amount` can be taken (0 if available now)"""
+        self._refill()
+        # A request bigger than the bucket only has to wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.per_second
+
+    def consume(self, amount: float):
+        """Takes tokens; the level may go negative after a correction"""
+        self._refill()
+        self.level -= amount
+
+
+class _Ticket:
+    __slots__ = ("tokens", "enqueued_at", "ready", "loop")
+
+    def __init__(self, tokens: int, ready: asyncio.Event = None,
+                 loop: asyncio.AbstractEventLoop = None):
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        # Set (on its loop) when an async waiter should look again
+        self.ready = ready
+        self.loop = loop
+
+    def wake(self):
+        if self.ready is None:
+            return
+        try:
+            self.loop.call_soon_threadsafe(self.ready.set)
+        except RuntimeError:
+            # The loop is closed; its waiter is gone
+            pass
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Reads Retry-After (seconds) or retry-after-ms from an API error"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """429s, 5xx responses, timeouts and connection errors are retried"""
+    import openai
+
+    if isinstance(error, (openai.RateLimitError, openai.APIConnectionError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500
+    return False
+
+
+class AdmissionScheduler:
+    """Rate limiter, fair per-session queue and retry policy in one place"""
+
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int,
+                 max_wait: float = 30.0, max_attempts: int = 4,
+                 base_delay: float = 0.5, max_delay: float = 20.0):
+        self.max_wait = max_wait
+        # At least one attempt: 0 would skip the request and return None
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+        self._requests = TokenBucket(requests_per_minute, requests_per_minute / 60)
+        self._tokens = TokenBucket(tokens_per_minute, tokens_per_minute / 60)
+
+        self._cond = threading.Condition()
+        # session id -> waiting tickets; order of keys is the round-robin order
+        self._queues: "OrderedDict[Any, deque]" = OrderedDict()
+
+        self._waits = deque(maxlen=1000)
+        self._counters = {"admitted": 0, "timed_out": 0, "retries": 0, "throttled": 0}
+
+    # ---------- admission ----------
+
+    def _head(self) -> Optional[_Ticket]:
+        for queue in self._queues.values():
+            return queue[0]
+        return None
+
+    def _remove(self, session_id, ticket: _Ticket, served: bool):
+        queue = self._queues[session_id]
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[session_id]
+        elif served:
+            # Give the other sessions a turn before this one goes again
+            self._queues.move_to_end(session_id)
+
+    def _notify(self):
+        """Caller holds the lock. Wakes the waiters after the queue changed."""
+        self._cond.notify_all()
+        # Only the head can be admitted; other async waiters wake on their
+        # own timeouts or when they become the head
+        head = self._head()
+        if head is not None:
+            head.wake()
+
+    def _try_admit(self, session_id, ticket: _Ticket) -> Optional[float]:
+        """
+        Caller holds the lock. Admits `ticket` if it is its turn and the
+        budget allows (returns None); else returns how long to wait.
+
+        Raises:
+            QueueTimeoutError: if the ticket waited max_wait seconds
+        """
+        wait = None
+        if self._head() is ticket:
+            wait = max(self._requests.time_until(1), self._tokens.time_until(ticket.tokens))
+            if wait == 0:
+                self._requests.consume(1)
+                self._tokens.consume(ticket.tokens)
+                self._remove(session_id, ticket, served=True)
+                self._counters["admitted"] += 1
+                waited = time.monotonic() - ticket.enqueued_at
+                self._waits.append(waited)
+                telemetry.observe("queue", waited)
+                self._notify()
+                return None
+
+        remaining = ticket.enqueued_at + self.max_wait - time.monotonic()
+        if remaining <= 0:
+            self._remove(session_id, ticket, served=False)
+            self._counters["timed_out"] += 1
+            telemetry.inc("queue_timeouts_total")
+            self._notify()
+            raise QueueTimeoutError(
+                f"Request waited more than {self.max_wait:g}s for an OpenAI slot"
+            )
+        return min(wait, remaining) if wait is not None else remaining
+
+    def acquire(self, session_id, tokens: int):
+        """
+        Blocks until the request may be sent.
+
+        Args:
+            session_id: Fairness key (one queue per session)
+            tokens: Estimated tokens for the request (input + output)
+
+        Raises:
+            QueueTimeoutError: if not admitted within max_wait seconds
+        """
+        ticket = _Ticket(tokens)
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            while True:
+                wait = self._try_admit(session_id, ticket)
+                if wait is None:
+                    return
+                self._cond.wait(wait)
+
+    async def aacquire(self, session_id, tokens: int):
+        """
+        asyncio version of acquire(): waits on the event loop, without a
+        thread. A waiter that is cancelled leaves the queue unadmitted.
+        """
+        ticket = _Ticket(tokens, asyncio.Event(), asyncio.get_running_loop())
+        with self._cond:
+            self._queues.setdefault(session_id, deque()).append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_admit(session_id, ticket)
+                    if wait is None:
+                        return
+                    ticket.ready.clear()
+                try:
+                    await asyncio.wait_for(ticket.ready.wait(), wait)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            with self._cond:
+                queue = self._queues.get(session_id)
+                if queue is not None and ticket in queue:
+                    self._remove(session_id, ticket, served=False)
+                    self._notify()
+            raise
+
+    def try_acquire(self, tokens: int) -> bool:
+        """
+        Admits one extra request (e.g. a hedge) only if it can go right
+        now: budget is available and nobody is waiting. Never blocks.
+        """
+        with self._cond:
+            if self._queues or self._requests.time_until(1) or self._tokens.time_until(tokens):
+                return False
+            self._requests.consume(1)
+            self._tokens.consume(tokens)
+            self._counters["admitted"] += 1
+            return True
+
+    def adjust(self, estimated_tokens: int, actual_tokens: int):
+        """Corrects the token budget once real usage is known"""
+        with self._cond:
+            self._tokens.consume(actual_tokens - estimated_tokens)
+
+    # ---------- retries ----------
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter: random point in [0, base * 2^attempt]
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _on_retry(self, error: Exception):
+        import openai
+
+        with self._cond:
+            self._counters["retries"] += 1
+            if isinstance(error, openai.RateLimitError):
+                self._counters["throttled"] += 1
+        telemetry.inc("openai_retries_total", error=error.__class__.__name__)
+
+    def call(self, session_id, tokens: int, fn: Callable[[], Any]) -> Any:
+        """
+        Admits and runs fn(), retrying retryable API errors.
+        Every attempt goes back through admission.
+        """
+        for attempt in range(self.max_attempts):
+            self.acquire(session_id, tokens)
+            try:
+                return fn()
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                self._on_retry(e)
+                logger.info("OpenAI call failed (%s), retrying in %.1fs", e.__class__.__name__, delay)
+                time.sleep(delay)
+
+    async def acall(self, session_id, tokens: int, fn: Callable[[], Any]) -> Any:
+        """asyncio version of call(); fn returns an awaitable"""
+        for attempt in range(self.max_attempts):
+            await self.aacquire(session_id, tokens)
+            try:
+                return await fn()
+            except Exception as e:
+                if attempt + 1 >= self.max_attempts or not is_retryable(e):
+                    raise
+                delay = self._backoff(attempt, e)
+                self._on_retry(e)
+                logger.info("OpenAI call failed (%s), retrying in %.1fs", e.__class__.__name__, delay)
+                await asyncio.sleep(delay)
+
+    # ---------- metrics ----------
+
+    def metrics(self) -> Dict[str, float]:
+        """Queue depth, wait times and retry counters"""
+        with self._cond:
+            waits = sorted(self._waits)
+            stats = dict(self._counters)
+            stats["queue_depth"] = sum(len(q) for q in self._queues.values())
+            stats["waiting_sessions"] = len(self._queues)
+            stats["request_budget"] = self._requests.level
+            stats["token_budget"] = self._tokens.level
+        stats["wait_avg_s"] = sum(waits) / len(waits) if waits else 0.0
+        stats["wait_p95_s"] = waits[int(0.95 * (len(waits) - 1))] if waits else 0.0
+        stats["wait_max_s"] = waits[-1] if waits else 0.0
+        return stats
+
+
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+
+def get_scheduler() -> AdmissionScheduler:
+    """Returns the process-wide scheduler built from Config"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                _scheduler = AdmissionScheduler(
+                    requests_per_minute=Config.RATE_LIMIT_RPM,
+                    tokens_per_minute=Config.RATE_LIMIT_TPM,
+                    max_wait=Config.QUEUE_MAX_WAIT,
+                    max_attempts=Config.RETRY_MAX_ATTEMPTS,
+                    base_delay=Config.RETRY_BASE_DELAY,
+                    max_delay=Config.RETRY_MAX_DELAY,
+                )
+    return _scheduler
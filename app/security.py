@@ -1,5 +1,59 @@
 """Security utilities for input validation and sanitization"""
+import logging
+import os
+import re
+import threading
 import uuid
+from typing import Optional
+
+from app.config import load_env
+from app.matcher import Match, PhraseMatcher, ReloadingMatcher
+from app.telemetry import telemetry
+
+logger = logging.getLogger(__name__)
+
+MAX_LENGTH = 1200
+
+# Built-in blocklist, used unless FORBIDDEN_PHRASES_FILE points to a rule
+# file (one phrase per line), which is then hot-reloaded when it changes
+FORBIDDEN_PHRASES = [
+    "ignore previous instructions", "disregard all prior messages",
+    "you are no longer", "forget you are",
+    "bypass your restrictions", "break your programming",
+    "act as a different AI", "malicious", "harmful",
+    "illegal", "unethical", "pretend to be", "jailbreak",
+    "pretend", "imagine", "disregard", "bypass",
+    "override", "disable", "break", "you are now",
+    "you are", "forget"
+]
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    """The blocklist matcher, compiled on first use (see app.warmup)"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                load_env()
+                rules_file = os.getenv("FORBIDDEN_PHRASES_FILE")
+                if rules_file:
+                    _matcher = ReloadingMatcher(rules_file, fallback=FORBIDDEN_PHRASES)
+                else:
+                    _matcher = PhraseMatcher(FORBIDDEN_PHRASES)
+    return _matcher
+
+
+def find_forbidden_phrase(text: str) -> Optional[Match]:
+    """
+    Scans text against the blocklist in a single pass.
+
+    Returns:
+        The rule that fired, or None if the text is clean
+    """
+    return get_matcher().find(text)
 
 
 def validate_input(text: str) -> tuple[bool, str]:
@@ -12,25 +66,16 @@ def validate_input(text: str) -> tuple[bool, str]:
     Returns:
         (is_valid, error_message): Tuple with validation result
     """
-    MAX_LENGTH = 1200
     if len(text) > MAX_LENGTH:
+        telemetry.inc("inputs_blocked_total", reason="length")
         return (False, f"Input too long! Max {MAX_LENGTH} characters. You used {len(text)}.")
-    
-    forbidden_phrases = [
-        "ignore previous instructions", "disregard all prior messages",
-        "you are no longer", "forget you are",
-        "bypass your restrictions", "break your programming",
-        "act as a different AI", "malicious", "harmful",
-        "illegal", "unethical", "pretend to be", "jailbreak",
-        "pretend", "imagine", "disregard", "bypass",
-        "override", "disable", "break", "you are now",
-        "you are", "forget"
-    ]
-
-    text_lower = text.lower()
-    for phrase in forbidden_phrases:
-        if phrase in text_lower:
-            return (False, "Input contains forbidden phrases. Please revise your input.")
+
+    with telemetry.span("validation"):
+        match = find_forbidden_phrase(text)
+    if match is not None:
+        telemetry.inc("inputs_blocked_total", reason="phrase")
+        logger.info("Input blocked by rule '%s'", match.rule)
+        return (False, "Input contains forbidden phrases. Please revise your input.")
         
     return True, ""
 
@@ -51,3 +96,15 @@ def wrap_user_input(user_text: str) -> str:
     return f"""<USER_INPUT id="{boundary}">
 {user_text}
 </USER_INPUT>"""
+
+
+_WRAPPED = re.compile(r'^<USER_INPUT id="[^"]*">\n(.*)\n</USER_INPUT>$', re.DOTALL)
+
+
+def unwrap_user_input(text: str) -> str:
+    """
+    Reverses wrap_user_input (e.g. to show a stored transcript).
+    Text that isn't wrapped is returned unchanged.
+    """
+    match = _WRAPPED.match(text)
+    return match.group(1) if match else text
@@ -0,0 +1,592 @@
+# Persistent, pluggable storage for interview sessions.
+#
+# Backends only ever see plain data: the interviewer settings and the list
+# of messages (without the system prompt, which is rebuilt from settings).
+# Each turn appends the new messages instead of rewriting the history; only
+# switching to another branch (app.history) cuts the stored history back to
+# the part the branches share. Only the current branch is stored.
+#
+# SessionStorage is a dict-like object that InterviewerFactory can use in
+# place of st.session_state: keys are session ids, values are Interviewers.
+# It keeps a bounded number of live Interviewers in memory, loads others
+# lazily from the backend, and evicts idle ones.
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.config import Config
+from app.history import History
+from app.interviewer import Interviewer
+
+logger = logging.getLogger(__name__)
+
+Record = Tuple[Dict[str, str], List[Dict[str, str]]]
+
+
+class SessionBackend(ABC):
+    """
+    Interface for session backends. truncate(), exists() and close() have
+    working defaults; the rest must be implemented.
+    """
+
+    @abstractmethod
+    def create(self, session_id: str, settings: Dict[str, str]):
+        """Starts a session (replacing any existing one with that id)"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def append(self, session_id: str, messages: List[Dict[str, str]]):
+        """Adds messages to the end of a session's history"""
+        raise NotImplementedError
+
+    @abstractmethod
+    def load(self, session_id: str) -> Optional[Record]:
+        """Returns (settings, messages) or None if unknown"""
+        raise NotImplementedError
+
+    def truncate(self, session_id: str, length: int):
+        """Keeps only the first `length` messages of a session"""
+        record = self.load(session_id)
+        if record is None:
+            return
+        settings, messages = record
+        self.create(session_id, settings)
+        self.append(session_id, messages[:length])
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Removes a session (no error if unknown)"""
+        raise NotImplementedError
+
+    def exists(self, session_id: str) -> bool:
+        return self.load(session_id) is not None
+
+    @abstractmethod
+    def session_ids(self) -> List[str]:
+        """Ids of all stored sessions"""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class InMemoryBackend(SessionBackend):
+    """Keeps everything in a dict (lost on restart); useful for tests"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions: Dict[str, Record] = {}
+
+    def create(self, session_id, settings):
+        with self._lock:
+            self._sessions[session_id] = (dict(settings), [])
+
+    def append(self, session_id, messages):
+        with self._lock:
+            self._sessions[session_id][1].extend(dict(m) for m in messages)
+
+    def load(self, session_id):
+        with self._lock:
+            record = self._sessions.get(session_id)
+            if record is None:
+                return None
+            return dict(record[0]), [dict(m) for m in record[1]]
+
+    def truncate(self, session_id, length):
+        with self._lock:
+            record = self._sessions.get(session_id)
+            if record is not None:
+                del record[1][length:]
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def exists(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def session_ids(self):
+        with self._lock:
+            return list(self._sessions)
+
+
+class SQLiteBackend(SessionBackend):
+    """SQLite in WAL mode: one row per session, one row per message"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "  id TEXT PRIMARY KEY, settings TEXT NOT NULL, updated_at REAL NOT NULL);"
+            "CREATE TABLE IF NOT EXISTS messages ("
+            "  session_id TEXT NOT NULL, seq INTEGER NOT NULL, role TEXT NOT NULL,"
+            "  content TEXT NOT NULL, PRIMARY KEY (session_id, seq));"
+        )
+        self._conn.commit()
+
+    def create(self, session_id, settings):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, settings, updated_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(settings), time.time()),
+            )
+
+    def append(self, session_id, messages):
+        if not messages:
+            return
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT COALESCE(MAX(seq), -1) FROM messages WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            start = row[0] + 1
+            self._conn.executemany(
+                "INSERT INTO messages (session_id, seq, role, content) VALUES (?, ?, ?, ?)",
+                [(session_id, start + i, m["role"], m["content"]) for i, m in enumerate(messages)],
+            )
+            self._conn.execute("UPDATE sessions SET updated_at = ? WHERE id = ?",
+                               (time.time(), session_id))
+
+    def load(self, session_id):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT settings FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            rows = self._conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY seq",
+                (session_id,),
+            ).fetchall()
+        return json.loads(row[0]), [{"role": r, "content": c} for r, c in rows]
+
+    def truncate(self, session_id, length):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ? AND seq >= ?",
+                               (session_id, length))
+
+    def delete(self, session_id):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def exists(self, session_id):
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone() is not None
+
+    def session_ids(self):
+        with self._lock:
+            return [r[0] for r in self._conn.execute("SELECT id FROM sessions")]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class AppendOnlyLogBackend(SessionBackend):
+    """
+    A single JSON-lines event log ("create", "append", "truncate", "delete"
+    events). Only byte offsets are kept in memory; a session's events are
+    read back from the file when it is loaded.
+
+    Events that no longer matter (sessions recreated or deleted) are dead
+    bytes; once they outweigh the live ones (and compact_min_bytes), the log
+    is rewritten with one "create" and one "append" per session.
+    """
+
+    def __init__(self, path: str, compact_min_bytes: int = 1 << 20):
+        self.path = path
+        self.compact_min_bytes = compact_min_bytes
+        self._lock = threading.Lock()
+        # session id -> offsets of its events since the last "create"
+        self._offsets: Dict[str, List[int]] = {}
+        # session id -> bytes of those events; and bytes of dead events
+        self._sizes: Dict[str, int] = {}
+        self._dead = 0
+        self._file = open(path, "a+b")
+        self._rebuild_index()
+
+    def _rebuild_index(self):
+        self._offsets.clear()
+        self._sizes.clear()
+        self._dead = 0
+        self._file.seek(0)
+        offset = 0
+        for line in self._file:
+            if not line.endswith(b"\n"):
+                # A torn write at the end of the log after a crash
+                break
+            try:
+                event = json.loads(line)
+            except ValueError:
+                break
+            self._index(event, offset, len(line))
+            offset += len(line)
+        torn = os.path.getsize(self.path) - offset
+        if torn:
+            # Cut the torn tail off, or the next event would be appended to
+            # it and lost (with everything after it) on the next restart
+            logger.warning("Session log %s: dropping %d torn bytes at the end",
+                           self.path, torn)
+            self._file.truncate(offset)
+            self._file.flush()
+
+    def _index(self, event: Dict, offset: int, size: int):
+        sid = event["sid"]
+        if event["type"] == "create":
+            self._dead += self._sizes.get(sid, 0)
+            self._offsets[sid] = [offset]
+            self._sizes[sid] = size
+        elif event["type"] == "delete":
+            self._dead += self._sizes.pop(sid, 0) + size
+            self._offsets.pop(sid, None)
+        elif sid in self._offsets:
+            self._offsets[sid].append(offset)
+            self._sizes[sid] += size
+        else:
+            self._dead += size
+
+    def _write(self, event: Dict) -> int:
+        """Caller must hold the lock. Returns the event's offset."""
+        self._file.seek(0, os.SEEK_END)
+        offset = self._file.tell()
+        line = json.dumps(event, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+        self._file.write(line)
+        self._file.flush()
+        self._index(event, offset, len(line))
+        return offset
+
+    def _read(self, session_id: str) -> Optional[Record]:
+        """Caller must hold the lock"""
+        offsets = self._offsets.get(session_id)
+        if not offsets:
+            return None
+        settings, messages = {}, []
+        for offset in offsets:
+            self._file.seek(offset)
+            event = json.loads(self._file.readline())
+            if event["type"] == "create":
+                settings = event["settings"]
+            elif event["type"] == "truncate":
+                del messages[event["length"]:]
+            else:
+                messages.extend(event["messages"])
+        return settings, messages
+
+    def _maybe_compact(self):
+        """Caller must hold the lock"""
+        if self._dead > max(self.compact_min_bytes, sum(self._sizes.values())):
+            self._compact()
+
+    def _compact(self):
+        """Caller must hold the lock. Rewrites the log with live sessions only."""
+        before = os.path.getsize(self.path)
+        tmp_path = self.path + ".compact"
+        with open(tmp_path, "wb") as out:
+            for sid in list(self._offsets):
+                settings, messages = self._read(sid)
+                events = [{"type": "create", "sid": sid, "settings": settings}]
+                if messages:
+                    events.append({"type": "append", "sid": sid, "messages": messages})
+                for event in events:
+                    out.write(json.dumps(event, ensure_ascii=False,
+                                         separators=(",", ":")).encode() + b"\n")
+            out.flush()
+            os.fsync(out.fileno())
+        self._file.close()
+        os.replace(tmp_path, self.path)
+        self._file = open(self.path, "a+b")
+        self._rebuild_index()
+        logger.info("Compacted session log %s: %d -> %d bytes",
+                    self.path, before, os.path.getsize(self.path))
+
+    def compact(self):
+        """Rewrites the log now, dropping dead events"""
+        with self._lock:
+            self._compact()
+
+    def create(self, session_id, settings):
+        with self._lock:
+            self._write({"type": "create", "sid": session_id, "settings": settings})
+            self._maybe_compact()
+
+    def append(self, session_id, messages):
+        if not messages:
+            return
+        with self._lock:
+            if session_id not in self._offsets:
+                return
+            self._write({"type": "append", "sid": session_id,
+                         "messages": [{"role": m["role"], "content": m["content"]}
+                                      for m in messages]})
+
+    def load(self, session_id):
+        with self._lock:
+            return self._read(session_id)
+
+    def truncate(self, session_id, length):
+        # One small event instead of writing the session out again
+        with self._lock:
+            if session_id in self._offsets:
+                self._write({"type": "truncate", "sid": session_id, "length": length})
+
+    def delete(self, session_id):
+        with self._lock:
+            if session_id in self._offsets:
+                self._write({"type": "delete", "sid": session_id})
+                self._maybe_compact()
+
+    def exists(self, session_id):
+        with self._lock:
+            return session_id in self._offsets
+
+    def session_ids(self):
+        with self._lock:
+            return list(self._offsets)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class SessionStorage(MutableMapping):
+    """
+    Dict-like session store for InterviewerFactory / answer_turn.
+
+    - storage[session_id] returns the live Interviewer, loading it from the
+      backend on first access.
+    - storage[session_id] = interviewer registers a new session;
+      storage[session_id] = None (InterviewerFactory.reset) deletes it.
+    - persist(session_id) appends the messages added since the last call
+      (after a branch switch, it first cuts back to the shared part).
+    - At most `max_in_memory` Interviewers stay live; the least recently
+      used are dropped from memory (their history is already in the backend).
+      Sessions held with hold() (a turn is running) are never dropped.
+    - peek(session_id) returns the Interviewer only if it is live, without
+      loading it or counting as use (for pollers such as a metrics panel).
+    """
+
+    def __init__(self, backend: SessionBackend, max_in_memory: int = 1000,
+                 max_idle_seconds: float = 1800):
+        self.backend = backend
+        self.max_in_memory = max_in_memory
+        self.max_idle_seconds = max_idle_seconds
+        self._lock = threading.RLock()
+        self._live: "OrderedDict[str, object]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        # Session id -> the history as last stored
+        self._persisted: Dict[str, History] = {}
+        # Session id -> turns running on it (see hold()); own lock, so the
+        # event loop never waits for backend I/O to take or release a hold
+        self._holds: Dict[str, int] = {}
+        self._holds_lock = threading.Lock()
+
+    def _touch(self, session_id: str):
+        self._live.move_to_end(session_id)
+        self._last_used[session_id] = time.monotonic()
+
+    def _drop_live(self, session_id: str):
+        self._live.pop(session_id, None)
+        self._last_used.pop(session_id, None)
+        self._persisted.pop(session_id, None)
+
+    def _held(self, session_id: str) -> bool:
+        with self._holds_lock:
+            return session_id in self._holds
+
+    def _enforce_cap(self):
+        # Oldest first; held sessions stay even if that leaves us over the cap
+        for session_id in list(self._live):
+            if len(self._live) <= self.max_in_memory:
+                break
+            if not self._held(session_id):
+                self.persist(session_id)
+                self._drop_live(session_id)
+
+    @contextmanager
+    def hold(self, session_id: str):
+        """
+        Keeps a session in memory while a turn runs on it, so the turn is not
+        written from (or lost with) an Interviewer that was evicted meanwhile
+        """
+        with self._holds_lock:
+            self._holds[session_id] = self._holds.get(session_id, 0) + 1
+        try:
+            yield
+        finally:
+            with self._holds_lock:
+                if self._holds[session_id] == 1:
+                    del self._holds[session_id]
+                else:
+                    self._holds[session_id] -= 1
+
+    def __getitem__(self, session_id: str):
+        with self._lock:
+            interviewer = self._live.get(session_id)
+            if interviewer is not None:
+                self._touch(session_id)
+                return interviewer
+
+            record = self.backend.load(session_id)
+            if record is None:
+                raise KeyError(session_id)
+            settings, messages = record
+            interviewer = Interviewer.from_record(session_id, settings, messages)
+            self._live[session_id] = interviewer
+            self._persisted[session_id] = interviewer.history
+            self._touch(session_id)
+            self._enforce_cap()
+            return interviewer
+
+    def peek(self, session_id: str):
+        """The live Interviewer, or None; never loads it or marks it as used"""
+        with self._lock:
+            return self._live.get(session_id)
+
+    def __setitem__(self, session_id: str, interviewer):
+        with self._lock:
+            if interviewer is None:
+                self.__delitem__(session_id)
+                return
+            # The storage key is the session's identity from now on
+            interviewer.session_id = session_id
+            self.backend.create(session_id, interviewer.get_settings())
+            self._live[session_id] = interviewer
+            # Index 0 is the system prompt, which is rebuilt from settings
+            self._persisted[session_id] = interviewer.history.truncate(1)
+            self.persist(session_id)
+            self._touch(session_id)
+            self._enforce_cap()
+
+    def __delitem__(self, session_id: str):
+        with self._lock:
+            self._drop_live(session_id)
+            self.backend.delete(session_id)
+
+    def __contains__(self, session_id) -> bool:
+        with self._lock:
+            return session_id in self._live or self.backend.exists(session_id)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.backend.session_ids())
+
+    def __len__(self) -> int:
+        return len(self.backend.session_ids())
+
+    def persist(self, session_id: str, interviewer=None):
+        """
+        Appends messages added since the last persist (one write per turn).
+
+        Args:
+            session_id: The session
+            interviewer: The Interviewer the turn ran on. Only needed if it
+                may no longer be the live one (it then becomes live again,
+                as the latest version of the session).
+        """
+        with self._lock:
+            live = self._live.get(session_id)
+            interviewer = interviewer or live
+            if interviewer is None:
+                return
+            history = interviewer.history
+            if interviewer is live:
+                stored = self._persisted.get(session_id)
+                start = stored.common_length(history) if stored is not None else 1
+                cut = stored is not None and start < len(stored)
+            else:
+                start, cut = self._stored_prefix(session_id, history)
+                if start is None:
+                    # Deleted meanwhile: not brought back
+                    return
+            if cut:
+                # Another branch is current: drop what it doesn't share
+                # (stored messages start after the system prompt)
+                self.backend.truncate(session_id, max(start, 1) - 1)
+            new_messages = history[max(start, 1):]
+            if new_messages:
+                self.backend.append(session_id, new_messages)
+            self._persisted[session_id] = history
+            if interviewer is not live:
+                self._live[session_id] = interviewer
+                self._touch(session_id)
+                self._enforce_cap()
+
+    def _stored_prefix(self, session_id: str, history: History) -> Tuple[Optional[int], bool]:
+        """
+        (messages of `history` already in the backend, system prompt
+        included; whether the backend has more after them), compared by
+        content. (None, False) if the session is not in the backend.
+        """
+        record = self.backend.load(session_id)
+        if record is None:
+            return None, False
+        stored = record[1]
+        start = 1
+        for message, saved in zip(history[1:], stored):
+            if message.role != saved["role"] or message.content != saved["content"]:
+                break
+            start += 1
+        return start, start - 1 < len(stored)
+
+    def evict_idle(self) -> int:
+        """Drops sessions idle longer than max_idle_seconds from memory"""
+        cutoff = time.monotonic() - self.max_idle_seconds
+        with self._lock:
+            idle = [sid for sid, used in self._last_used.items()
+                    if used < cutoff and not self._held(sid)]
+            for sid in idle:
+                self.persist(sid)
+                self._drop_live(sid)
+        return len(idle)
+
+    def live_count(self) -> int:
+        with self._lock:
+            return len(self._live)
+
+
+def make_backend(kind: str, path: str = None) -> SessionBackend:
+    """Builds a backend by name: "memory", "sqlite" or "log" """
+    if kind == "memory":
+        return InMemoryBackend()
+    if kind == "sqlite":
+        return SQLiteBackend(path or "sessions.db")
+    if kind == "log":
+        return AppendOnlyLogBackend(path or "sessions.log")
+    raise ValueError(f"Unknown session store '{kind}'")
+
+
+_storage_lock = threading.Lock()
+_storage = None
+
+
+def get_session_storage() -> Optional[SessionStorage]:
+    """
+    Returns the process-wide SessionStorage from Config, or None when
+    sessions are kept in st.session_state (Config.SESSION_STORE).
+    """
+    global _storage
+    if Config.SESSION_STORE == "session_state":
+        return None
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = SessionStorage(
+                    make_backend(Config.SESSION_STORE, Config.SESSION_STORE_PATH),
+                    max_in_memory=Config.SESSION_MAX_IN_MEMORY,
+                    max_idle_seconds=Config.SESSION_MAX_IDLE_SECONDS,
+                )
+    return _storage
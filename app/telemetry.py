@@ -0,0 +1,432 @@
+# Timing spans, counters and structured logging for the request path
+import atexit
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config import Config
+
+logger = logging.getLogger(__name__)
+
+# Histogram buckets in seconds (validation/tokenization are sub-millisecond,
+# upstream calls take seconds)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, object]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_]")
+
+
+def _metric_name(name: str) -> str:
+    """A valid Prometheus metric name (e.g. model names contain '-' and '.')"""
+    return _INVALID_NAME_CHARS.sub("_", name)
+
+
+class Histogram:
+    """Cumulative bucket counts plus sum and count, Prometheus-style"""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.sum += value
+        self.count += 1
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+
+    def cumulative(self) -> List[int]:
+        total, out = 0, []
+        for c in self.counts:
+            total += c
+            out.append(total)
+        return out
+
+
+class _Span:
+    __slots__ = ("telemetry", "name", "labels", "start")
+
+    def __init__(self, telemetry: "Telemetry", name: str, labels: Dict[str, object]):
+        self.telemetry = telemetry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.telemetry.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        if exc_type is not None:
+            self.telemetry.inc("span_errors_total", span=self.name, error=exc_type.__name__)
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class Telemetry:
+    """
+    In-process metrics registry.
+
+    - span(name, **labels): times a block into the "span_seconds" histogram
+    - observe(name, seconds, **labels): records a duration measured elsewhere
+      (e.g. time-to-first-token)
+    - inc(name, value, **labels): adds to a counter (tokens, cost, errors)
+
+    When disabled every call returns immediately (span() hands back a shared
+    no-op context manager), so instrumentation can stay on the hot path.
+    """
+
+    def __init__(self, enabled: Optional[bool] = None, buckets=DEFAULT_BUCKETS):
+        # None: read Config.TELEMETRY_ENABLED on first use
+        self._enabled = enabled
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = {}
+        self._histograms: Dict[Labels, Histogram] = {}
+        # name -> callable returning {gauge name: value}, read at export time
+        self._collectors: Dict[str, Callable[[], Dict[str, float]]] = {}
+        # collector -> label its "<value>.<metric>" keys are split into
+        self._collector_labels: Dict[str, str] = {}
+
+    @property
+    def enabled(self) -> bool:
+        enabled = self._enabled
+        if enabled is None:
+            enabled = self._enabled = bool(Config.TELEMETRY_ENABLED)
+        return enabled
+
+    @enabled.setter
+    def enabled(self, value: bool):
+        self._enabled = value
+
+    def span(self, name: str, **labels):
+        if not self.enabled:
+            return _NOOP_SPAN
+        return _Span(self, name, labels)
+
+    def observe(self, name: str, seconds: float, **labels):
+        if not self.enabled:
+            return
+        key = _labels(dict(labels, span=name))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = (name, _labels(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def register_collector(self, name: str, collect: Callable[[], Dict[str, float]],
+                           label: str = None):
+        """
+        Adds gauges (e.g. scheduler queue depth) read at export time.
+        With `label`, keys like "gpt-4.1-mini.state" are exported as the
+        gauge "state" with that label (e.g. model="gpt-4.1-mini").
+        """
+        self._collectors[name] = collect
+        if label:
+            self._collector_labels[name] = label
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    # ---------- exposition ----------
+
+    def _gauges(self) -> Dict[str, Dict[str, float]]:
+        gauges = {}
+        for name, collect in list(self._collectors.items()):
+            try:
+                values = collect()
+            except Exception as e:
+                logger.debug("collector %s failed: %s", name, e)
+                continue
+            gauges[name] = {k: v for k, v in values.items() if isinstance(v, (int, float))}
+        return gauges
+
+    def snapshot(self) -> Dict:
+        """All metrics as plain JSON-serialisable data"""
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in self._counters.items()]
+            spans = [{"labels": dict(labels), "count": h.count, "sum": h.sum,
+                      "avg": h.sum / h.count if h.count else 0.0,
+                      "buckets": dict(zip(map(str, h.buckets), h.cumulative()))}
+                     for labels, h in self._histograms.items()]
+        return {"time": time.time(), "counters": counters, "spans": spans,
+                "gauges": self._gauges()}
+
+    def render_prometheus(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        def fmt(labels: Labels, extra: Labels = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+        lines = []
+        with self._lock:
+            by_name: Dict[str, List[Tuple[Labels, float]]] = {}
+            for (name, labels), value in self._counters.items():
+                by_name.setdefault(name, []).append((labels, value))
+            for name in sorted(by_name):
+                lines.append(f"# TYPE interviewer_{name} counter")
+                for labels, value in by_name[name]:
+                    lines.append(f"interviewer_{name}{fmt(labels)} {value:g}")
+
+            if self._histograms:
+                lines.append("# TYPE interviewer_span_seconds histogram")
+            for labels, h in self._histograms.items():
+                for bound, count in zip(h.buckets, h.cumulative()):
+                    lines.append(f"interviewer_span_seconds_bucket{fmt(labels, (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"interviewer_span_seconds_bucket{fmt(labels, (('le', '+Inf'),))} {h.count}")
+                lines.append(f"interviewer_span_seconds_sum{fmt(labels)} {h.sum:.6f}")
+                lines.append(f"interviewer_span_seconds_count{fmt(labels)} {h.count}")
+
+        gauges: Dict[str, List[Tuple[Labels, float]]] = {}
+        for group, values in self._gauges().items():
+            label = self._collector_labels.get(group)
+            for key, value in values.items():
+                labels = ()
+                if label and "." in key:
+                    owner, key = key.rsplit(".", 1)
+                    labels = ((label, owner),)
+                name = _metric_name(f"interviewer_{group}_{key}")
+                gauges.setdefault(name, []).append((labels, value))
+        for name in sorted(gauges):
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in sorted(gauges[name]):
+                lines.append(f"{name}{fmt(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """Writes the metrics to a file (JSON if it ends in .json), atomically"""
+        if path.endswith(".json"):
+            data = json.dumps(self.snapshot(), indent=2)
+        else:
+            data = self.render_prometheus()
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+
+telemetry = Telemetry()
+
+
+# ---------- structured logging ----------
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including the fields passed to log_event"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        data.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            data["exc"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Plain log lines with log_event fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            line += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return line
+
+
+def configure_logging(level: str = None, fmt: str = None):
+    """Sets up the "app" loggers from Config (LOG_LEVEL, LOG_FORMAT); idempotent"""
+    root = logging.getLogger("app")
+    if getattr(root, "_configured", False):
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if (fmt or Config.LOG_FORMAT) == "json" else TextFormatter())
+    root.addHandler(handler)
+    root.setLevel((level or Config.LOG_LEVEL).upper())
+    root.propagate = False
+    root._configured = True
+
+
+def log_event(log: logging.Logger, event: str, level: int = logging.INFO,
+              sampled: bool = True, **fields):
+    """
+    Logs an event with structured fields.
+
+    Args:
+        log: The module's logger
+        event: Short event name, used as the message
+        level: Logging level
+        sampled: Only log a LOG_SAMPLE_RATE fraction of these events (for
+            per-turn events; leave False for warnings and errors)
+        **fields: Extra data (JSON fields or key=value in text logs)
+    """
+    if not log.isEnabledFor(level):
+        return
+    if sampled and Config.LOG_SAMPLE_RATE < 1.0 and random.random() >= Config.LOG_SAMPLE_RATE:
+        return
+    log.log(level, event, extra={"fields": fields})
+
+
+# ---------- exporters ----------
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, ctype = telemetry.render_prometheus(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            body, ctype = json.dumps(telemetry.snapshot()), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _register_default_collectors():
+    # Imported here: these modules themselves report to telemetry
+    def scheduler_metrics():
+        from app.scheduler import get_scheduler
+        return get_scheduler().metrics()
+
+    def cache_stats():
+        from app.response_cache import get_response_cache
+        return get_response_cache().stats()
+
+    def post_turn_metrics():
+        from app.jobs import get_post_turn_pipeline
+        return get_post_turn_pipeline().metrics()
+
+    def accounting_metrics():
+        from app.jobs import get_accounting_pipeline
+        return get_accounting_pipeline().metrics()
+
+    def length_governor_report():
+        from app.length_governor import get_length_governor
+        return {f"{technique}.{name}": value
+                for technique, row in get_length_governor().report().items()
+                for name, value in row.items()}
+
+    def usage_ledger_metrics():
+        from app.usage_ledger import get_usage_ledger
+        return get_usage_ledger().metrics()
+
+    def resilience_metrics():
+        from app.resilience import get_resilience
+        return get_resilience().metrics()
+
+    telemetry.register_collector("scheduler", scheduler_metrics)
+    telemetry.register_collector("response_cache", cache_stats)
+    telemetry.register_collector("post_turn", post_turn_metrics)
+    telemetry.register_collector("accounting", accounting_metrics)
+    telemetry.register_collector("length_governor", length_governor_report, label="technique")
+    telemetry.register_collector("usage_ledger", usage_ledger_metrics)
+    telemetry.register_collector("resilience", resilience_metrics, label="model")
+
+
+_exporters_lock = threading.Lock()
+_exporters_started = False
+
+
+def start_exporters(port: Optional[int] = None, path: Optional[str] = None,
+                    interval: Optional[float] = None,
+                    host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Starts the metrics endpoint and/or periodic file export configured in
+    Config (once per process). Does nothing when telemetry is disabled.
+
+    Returns:
+        The HTTP server if one was started, else None
+    """
+    global _exporters_started
+    if not telemetry.enabled:
+        return None
+    with _exporters_lock:
+        if _exporters_started:
+            return None
+        _exporters_started = True
+
+    _register_default_collectors()
+    port = Config.TELEMETRY_PORT if port is None else port
+    host = host or Config.METRICS_HOST
+    path = path or Config.TELEMETRY_EXPORT_PATH
+    interval = interval or Config.TELEMETRY_EXPORT_INTERVAL
+
+    server = None
+    if port:
+        server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+        logger.info("Serving metrics on %s:%d/metrics", host, server.server_address[1])
+
+    if path:
+        def export_loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    telemetry.export(path)
+                except OSError as e:
+                    logger.warning("Could not export metrics to %s: %s", path, e)
+
+        threading.Thread(target=export_loop, name="metrics-export", daemon=True).start()
+        atexit.register(telemetry.export, path)
+        logger.info("Exporting metrics to %s every %gs", path, interval)
+    return server
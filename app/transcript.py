@@ -0,0 +1,61 @@
+# Incremental transcript rendering for the UI.
+# Older messages are frozen into pre-rendered markdown pages once, so a
+# rerun only renders the recent turns live instead of the whole history.
+from typing import Dict, List
+
+ROLE_LABELS = {"assistant": "🤖 **Interviewer**", "user": "🧑 **You**"}
+
+
+def render_block(messages: List[Dict[str, str]]) -> str:
+    """Renders messages as one markdown block"""
+    return "\n\n---\n\n".join(
+        f"{ROLE_LABELS.get(m['role'], m['role'])}\n\n{m['content']}" for m in messages
+    )
+
+
+class TranscriptArchive:
+    """
+    Splits a transcript into frozen pages and a live tail.
+
+    Only complete pages of `page_size` messages are frozen, and only from
+    messages older than the last `keep_recent`; each page is rendered once.
+    The live tail (recent messages plus any partial page) is rendered by the
+    caller on every rerun.
+    """
+
+    __slots__ = ("page_size", "keep_recent", "pages", "_source", "_frozen")
+
+    def __init__(self, page_size: int = 20, keep_recent: int = 12):
+        self.page_size = page_size
+        self.keep_recent = keep_recent
+        self.pages: List[str] = []
+        self._source = None
+        self._frozen = 0
+
+    @property
+    def archived_count(self) -> int:
+        """Number of messages in frozen pages"""
+        return self._frozen
+
+    def sync(self, messages: List[Dict[str, str]]) -> int:
+        """
+        Freezes any newly complete pages.
+
+        Args:
+            messages: The transcript (appended to between calls)
+
+        Returns:
+            Index of the first message to render live
+        """
+        if messages is not self._source or len(messages) < self._frozen:
+            # A new or replaced transcript (e.g. after a reset)
+            self._source = messages
+            self.pages = []
+            self._frozen = 0
+
+        limit = len(messages) - self.keep_recent
+        while self._frozen + self.page_size <= limit:
+            page = messages[self._frozen:self._frozen + self.page_size]
+            self.pages.append(render_block(page))
+            self._frozen += self.page_size
+        return self._frozen
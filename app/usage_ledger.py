@@ -0,0 +1,417 @@
+# Usage ledger shared by every process (Streamlit replicas, API workers):
+# tokens and cost per hour, user, model and technique, for a global view of
+# spend and for budget caps.
+#
+# - Recording is lock-free: each thread adds to its own running totals, and
+#   only that thread ever writes to them.
+# - A background flusher writes what changed since the last flush to a
+#   SQLite (WAL) file every USAGE_FLUSH_INTERVAL seconds, as upserts that
+#   add to the stored rows, so any number of processes can share it. It
+#   then reads back today's totals per user.
+# - Budget checks compare those totals plus this process' unflushed usage
+#   with the daily caps, so they never touch the database.
+#
+#   python -m app.usage_ledger --by model technique --since 2026-10-01
+import argparse
+import atexit
+import logging
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from typing import Dict, List, Sequence, Tuple
+
+from app.config import Config
+from app.cost_tracker import TurnUsage, format_cost
+
+logger = logging.getLogger(__name__)
+
+# User of turns without a known user
+ANONYMOUS = "anonymous"
+# Spend no single user asked for, such as the losing copy of a hedged
+# request (app.resilience); it counts against the global cap only
+UNATTRIBUTED = "unattributed"
+
+# Counters per (hour, user, model, technique), in this order
+FIELDS = ("turns", "input_tokens", "cached_input_tokens", "output_tokens", "cost")
+_ZERO = (0, 0, 0, 0, 0.0)
+
+# Columns rollup() can group by
+GROUPS = {"hour": "hour", "day": "substr(hour, 1, 10)", "user": "user",
+          "model": "model", "technique": "technique"}
+
+
+def current_hour(now: float = None) -> str:
+    """Hour bucket in UTC, e.g. "2026-10-16T09" (its first 10 characters are the day)"""
+    return time.strftime("%Y-%m-%dT%H", time.gmtime(now))
+
+
+def seconds_until_tomorrow(now: float = None) -> int:
+    """Seconds until the daily budgets reset (midnight UTC)"""
+    now = time.time() if now is None else now
+    return int(86400 - now % 86400) + 1
+
+
+class BudgetExceededError(Exception):
+    """A daily spending cap is used up; no more turns until it resets"""
+
+    def __init__(self, scope: str, spent: float, limit: float):
+        super().__init__(f"Daily {scope} budget of {format_cost(limit)} used up "
+                         f"({format_cost(spent)} spent)")
+        self.scope = scope
+        self.spent = spent
+        self.limit = limit
+
+
+class UsageStore:
+    """SQLite in WAL mode: one row per hour, user, model and technique"""
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        # Other processes may hold the write lock briefly: wait for it
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS usage ("
+            "  hour TEXT NOT NULL, user TEXT NOT NULL, model TEXT NOT NULL,"
+            "  technique TEXT NOT NULL, turns INTEGER NOT NULL,"
+            "  input_tokens INTEGER NOT NULL, cached_input_tokens INTEGER NOT NULL,"
+            "  output_tokens INTEGER NOT NULL, cost REAL NOT NULL,"
+            "  PRIMARY KEY (hour, user, model, technique))"
+        )
+
+    def add(self, rows: List[Tuple]):
+        """Adds (hour, user, model, technique, *FIELDS) deltas in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO usage (hour, user, model, technique, turns, input_tokens,"
+                    "  cached_input_tokens, output_tokens, cost)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                    " ON CONFLICT (hour, user, model, technique) DO UPDATE SET"
+                    "  turns = turns + excluded.turns,"
+                    "  input_tokens = input_tokens + excluded.input_tokens,"
+                    "  cached_input_tokens = cached_input_tokens + excluded.cached_input_tokens,"
+                    "  output_tokens = output_tokens + excluded.output_tokens,"
+                    "  cost = cost + excluded.cost",
+                    rows,
+                )
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def spent_per_user(self, day: str) -> Dict[str, float]:
+        """Cost per user on a day ("YYYY-MM-DD")"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT user, SUM(cost) FROM usage WHERE hour >= ? AND hour < ? GROUP BY user",
+                (f"{day}T00", f"{day}T99"),
+            ).fetchall()
+        return dict(rows)
+
+    def rollup(self, by: Sequence[str], since: str = None, until: str = None,
+               user: str = None) -> List[Dict[str, object]]:
+        columns = [f"{GROUPS[name]} AS {name}" for name in by]
+        where, params = [], []
+        if since:
+            where.append("hour >= ?")
+            params.append(since)
+        if until:
+            where.append("hour < ?")
+            params.append(until)
+        if user is not None:
+            where.append("user = ?")
+            params.append(user)
+        sql = ("SELECT " + ", ".join(columns + [f"SUM({f}) AS {f}" for f in FIELDS])
+               + " FROM usage"
+               + (" WHERE " + " AND ".join(where) if where else "")
+               + (" GROUP BY " + ", ".join(by) + " ORDER BY " + ", ".join(by) if by else ""))
+        with self._lock:
+            cursor = self._conn.execute(sql, params)
+            names = [d[0] for d in cursor.description]
+            return [dict(zip(names, row)) for row in cursor.fetchall() if row[-1] is not None]
+
+
+class _Shard:
+    """One thread's running totals. Only the owning thread writes `rows`."""
+    __slots__ = ("thread", "hour", "rows", "flushed")
+
+    def __init__(self, thread: threading.Thread):
+        self.thread = thread
+        self.hour = ""
+        # (hour, user, model, technique) -> [FIELDS], cumulative
+        self.rows: Dict[Tuple[str, str, str, str], list] = {}
+        # Same keys -> totals as of the last successful flush (flusher only)
+        self.flushed: Dict[Tuple[str, str, str, str], tuple] = {}
+
+
+class _Totals:
+    """Today's spend in the store as of the last flush (replaced as a whole)"""
+    __slots__ = ("day", "total", "per_user")
+
+    def __init__(self, day: str = "", per_user: Dict[str, float] = None):
+        self.day = day
+        self.per_user = per_user or {}
+        self.total = sum(self.per_user.values())
+
+
+class UsageLedger:
+    """
+    Process-wide usage recording with periodic flushes to a shared store,
+    and daily budget caps. Thread-safe.
+
+    Args:
+        path: SQLite file shared by all processes (":memory:" keeps the
+            ledger to this process)
+        flush_interval: Seconds between flushes
+        budget_usd: Daily cap on everyone's spend together (0: none)
+        user_budget_usd: Daily cap per user (0: none)
+    """
+
+    def __init__(self, path: str = None, flush_interval: float = None,
+                 budget_usd: float = None, user_budget_usd: float = None):
+        self.path = path or Config.USAGE_LEDGER_PATH or ":memory:"
+        self.flush_interval = flush_interval or Config.USAGE_FLUSH_INTERVAL
+        self.budget_usd = Config.USAGE_BUDGET_USD if budget_usd is None else budget_usd
+        self.user_budget_usd = (Config.USAGE_USER_BUDGET_USD if user_budget_usd is None
+                                else user_budget_usd)
+        self.store = UsageStore(self.path)
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()
+        # Held while flushing; shards are only pruned under it
+        self._flush_lock = threading.Lock()
+        self._totals = _Totals()
+        self._counters = {"flushes": 0, "flush_errors": 0, "rows_written": 0}
+        self._flusher = None
+        self._started_lock = threading.Lock()
+
+    # ---------- recording (hot path, no locks) ----------
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._start()
+        return shard
+
+    def record(self, user: str, technique: str, usage: TurnUsage):
+        """Adds one turn's usage (costs nothing for a cached reply)"""
+        shard = self._shard()
+        hour = current_hour()
+        key = (hour, user or ANONYMOUS, usage.model, technique or "")
+        row = shard.rows.get(key)
+        if row is None:
+            row = shard.rows[key] = [0, 0, 0, 0, 0.0]
+        row[1] += usage.input_tokens
+        row[2] += usage.cached_input_tokens
+        row[3] += usage.output_tokens
+        row[4] += usage.cost
+        # Last, so a flush that sees the new turn also sees its tokens
+        row[0] += 1
+        if hour != shard.hour:
+            shard.hour = hour
+            self._prune(shard)
+
+    def record_when_done(self, user: str, technique: str, future: "Future[TurnUsage]"):
+        """Records a turn once its (background) measurement finishes"""
+        def done(f):
+            if not f.cancelled() and f.exception() is None:
+                self.record(user, technique, f.result())
+        future.add_done_callback(done)
+
+    # ---------- budgets ----------
+
+    def _pending(self, day: str, user: str) -> Tuple[float, float]:
+        """Cost recorded in this process but not flushed yet: (everyone, user)"""
+        total = mine = 0.0
+        for shard in list(self._shards):
+            flushed = shard.flushed
+            for key, row in list(shard.rows.items()):
+                if not key[0].startswith(day):
+                    continue
+                cost = row[4] - flushed.get(key, _ZERO)[4]
+                total += cost
+                if key[1] == user:
+                    mine += cost
+        return total, mine
+
+    def spent_today(self, user: str = ANONYMOUS) -> Tuple[float, float]:
+        """(Everyone's, this user's) spend today, as of the last flush plus local usage"""
+        self._start()
+        day = current_hour()[:10]
+        totals = self._totals
+        if totals.day != day:
+            totals = _Totals(day)
+        pending_total, pending_user = self._pending(day, user or ANONYMOUS)
+        return (totals.total + pending_total,
+                totals.per_user.get(user or ANONYMOUS, 0.0) + pending_user)
+
+    def check_budget(self, user: str = ANONYMOUS):
+        """
+        Raises BudgetExceededError if today's global or per-user cap is used
+        up. Answered from memory: no database access.
+        """
+        if not (self.budget_usd or self.user_budget_usd):
+            return
+        total, mine = self.spent_today(user)
+        if self.budget_usd and total >= self.budget_usd:
+            raise BudgetExceededError("global", total, self.budget_usd)
+        if self.user_budget_usd and mine >= self.user_budget_usd:
+            raise BudgetExceededError("user", mine, self.user_budget_usd)
+
+    # ---------- flushing ----------
+
+    def _start(self):
+        if self._flusher is not None:
+            return
+        with self._started_lock:
+            if self._flusher is None:
+                # Today's totals so far, before the first budget check
+                try:
+                    self.flush()
+                except Exception as e:
+                    logger.warning("Could not read usage from %s: %s", self.path, e)
+                self._flusher = threading.Thread(target=self._flush_loop,
+                                                 name="usage-flush", daemon=True)
+                self._flusher.start()
+                atexit.register(self.flush)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning("Could not flush usage to %s: %s", self.path, e)
+
+    def flush(self) -> int:
+        """
+        Writes usage recorded since the last flush to the store and reloads
+        today's totals. Returns the number of rows written.
+        """
+        with self._flush_lock:
+            pending = []
+            for shard in list(self._shards):
+                for key, row in list(shard.rows.items()):
+                    # One C-level copy: other threads can't interleave with it
+                    current = tuple(row)
+                    last = shard.flushed.get(key, _ZERO)
+                    if current != last:
+                        pending.append((shard, key, current, last))
+            try:
+                if pending:
+                    self.store.add([key + tuple(c - l for c, l in zip(current, last))
+                                    for _, key, current, last in pending])
+                day = current_hour()[:10]
+                totals = _Totals(day, self.store.spent_per_user(day))
+            except Exception:
+                self._counters["flush_errors"] += 1
+                raise
+            # Only now: if the write failed, the same deltas are retried.
+            # Totals first, so budget checks never miss the flushed usage.
+            self._totals = totals
+            for shard, key, current, _ in pending:
+                shard.flushed[key] = current
+            self._counters["flushes"] += 1
+            self._counters["rows_written"] += len(pending)
+            self._drop_finished_shards()
+        return len(pending)
+
+    def _prune(self, shard: _Shard):
+        """Forgets a shard's rows from past hours once they are flushed"""
+        # Never wait on a flush from the hot path: prune on a later hour change
+        if not self._flush_lock.acquire(blocking=False):
+            return
+        try:
+            for key, row in list(shard.rows.items()):
+                if key[0] != shard.hour and shard.flushed.get(key) == tuple(row):
+                    del shard.rows[key]
+                    del shard.flushed[key]
+        finally:
+            self._flush_lock.release()
+
+    def _drop_finished_shards(self):
+        """Forgets shards of threads that ended, once everything is flushed"""
+        with self._shards_lock:
+            self._shards = [
+                shard for shard in self._shards
+                if shard.thread.is_alive() or any(
+                    shard.flushed.get(key) != tuple(row) for key, row in shard.rows.items()
+                )
+            ]
+
+    # ---------- reporting ----------
+
+    def rollup(self, by: Sequence[str] = ("model",), since: str = None, until: str = None,
+               user: str = None) -> List[Dict[str, object]]:
+        """
+        Usage from all processes, summed per group.
+
+        Args:
+            by: Any of "hour", "day", "user", "model", "technique"
+            since, until: Hour or day bounds ("2026-10-16" or "2026-10-16T09");
+                `until` is exclusive
+            user: Only this user's usage
+
+        Returns:
+            One dict per group with the group columns and FIELDS
+        """
+        unknown = [name for name in by if name not in GROUPS]
+        if unknown:
+            raise ValueError(f"Cannot group usage by {', '.join(unknown)}")
+        self.flush()
+        return self.store.rollup(by, since, until, user)
+
+    def metrics(self) -> Dict[str, float]:
+        total, _ = self.spent_today()
+        stats = dict(self._counters)
+        stats["threads"] = len(self._shards)
+        stats["spent_today_usd"] = total
+        if self.budget_usd:
+            stats["budget_remaining_usd"] = max(0.0, self.budget_usd - total)
+        return stats
+
+
+_ledger_lock = threading.Lock()
+_ledger = None
+
+
+def get_usage_ledger() -> UsageLedger:
+    """Returns the process-wide ledger built from Config"""
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = UsageLedger()
+    return _ledger
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Show usage recorded in the usage ledger")
+    parser.add_argument("--path", default=None, help="default: USAGE_LEDGER_PATH")
+    parser.add_argument("--by", nargs="*", default=["day", "model"], choices=sorted(GROUPS))
+    parser.add_argument("--since", default=None, help="e.g. 2026-10-01 or 2026-10-16T09")
+    parser.add_argument("--until", default=None, help="exclusive")
+    parser.add_argument("--user", default=None)
+    args = parser.parse_args(argv)
+
+    path = args.path or Config.USAGE_LEDGER_PATH
+    if not path:
+        parser.error("no ledger file: pass --path or set USAGE_LEDGER_PATH")
+    rows = UsageStore(path).rollup(args.by, args.since, args.until, args.user)
+    for row in rows:
+        group = " ".join(str(row[name]) for name in args.by)
+        print(f"{group:48} {row['turns']:6} turns {row['input_tokens']:10,} in "
+              f"{row['output_tokens']:9,} out {format_cost(row['cost']):>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+# Startup warm-up: does the slow one-off work (importing openai, loading
+# tokenizer data, building the pooled client, compiling the blocklist) in
+# the background when the process starts, instead of during a user's turn.
+#
+#   # once, at build/deploy time (needs network): fill tiktoken_cache/
+#   python -m app.warmup --seed
+#   # check what a cold start costs on this machine
+#   python -m app.warmup --check
+import argparse
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, Iterable, Optional
+
+from app.config import Config, load_env
+
+logger = logging.getLogger(__name__)
+
+# Encodings used by the models in app.models (and the fallback)
+ENCODINGS = ("o200k_base", "cl100k_base")
+
+_lock = threading.Lock()
+_started = False
+_done = threading.Event()
+# step -> seconds it took (or the error), for logs and the startup benchmark
+timings: Dict[str, object] = {}
+
+
+def _step(name: str, fn):
+    start = time.perf_counter()
+    try:
+        fn()
+        timings[name] = time.perf_counter() - start
+    except Exception as e:
+        timings[name] = f"failed: {e.__class__.__name__}: {e}"
+        logger.warning("Warm-up step '%s' failed: %s", name, e)
+
+
+def _models() -> Iterable[str]:
+    names = [Config.MODEL_NAME]
+    if Config.ROUTER_ENABLED:
+        names += [Config.ROUTER_SMALL_MODEL, Config.ROUTER_LARGE_MODEL]
+    return dict.fromkeys(names)
+
+
+def run_warm_up(client: bool = True):
+    """Runs every warm-up step in the calling thread"""
+    from app.cost_tracker import count_tokens
+    from app.security import get_matcher
+
+    try:
+        _step("env", load_env)
+        for model in _models():
+            _step(f"tokenizer:{model}", lambda m=model: count_tokens("warm up", m))
+        _step("matcher", get_matcher)
+        if client:
+            from app.client_registry import get_client
+            # The SDK also loads its resource modules on first attribute access
+            _step("openai_client", lambda: get_client().chat.completions)
+        logger.info("Warm-up done: %s", {k: (f"{v:.3f}s" if isinstance(v, float) else v)
+                                          for k, v in timings.items()})
+    finally:
+        _done.set()
+
+
+def warm_up(background: bool = True, client: bool = True) -> Optional[threading.Thread]:
+    """
+    Starts the warm-up (once per process; later calls do nothing).
+
+    Args:
+        background: Run in a daemon thread (default) instead of blocking
+        client: Also build the shared OpenAI client (needs the API key)
+
+    Returns:
+        The warm-up thread, or None if it ran inline or had already started
+    """
+    global _started
+    with _lock:
+        if _started:
+            return None
+        _started = True
+    if not background:
+        run_warm_up(client)
+        return None
+    thread = threading.Thread(target=run_warm_up, args=(client,), name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def wait_until_warm(timeout: Optional[float] = None) -> bool:
+    """Blocks until the warm-up finished; False on timeout"""
+    return _done.wait(timeout)
+
+
+def seed_tiktoken_cache(directory: str = None, encodings: Iterable[str] = ENCODINGS) -> str:
+    """
+    Downloads tokenizer data into `directory` (default
+    Config.TIKTOKEN_CACHE_DIR) so later runs work offline.
+
+    Returns:
+        The cache directory
+    """
+    directory = directory or Config.TIKTOKEN_CACHE_DIR
+    os.makedirs(directory, exist_ok=True)
+    os.environ["TIKTOKEN_CACHE_DIR"] = directory
+    import tiktoken
+
+    for name in encodings:
+        start = time.perf_counter()
+        tiktoken.get_encoding(name)
+        print(f"  {name}: ready ({time.perf_counter() - start:.2f}s)")
+    return directory
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Warm-up and tokenizer cache tools")
+    parser.add_argument("--seed", nargs="?", const="", default=None, metavar="DIR",
+                        help="download tokenizer data into DIR (default: TIKTOKEN_CACHE_DIR)")
+    parser.add_argument("--check", action="store_true",
+                        help="run the warm-up now and print how long each step took")
+    args = parser.parse_args(argv)
+
+    if args.seed is not None:
+        directory = seed_tiktoken_cache(args.seed or None)
+        print(f"Tokenizer cache ready in {directory}")
+    if args.check:
+        start = time.perf_counter()
+        run_warm_up(client=bool(Config.OPENAI_API_KEY))
+        for step, took in timings.items():
+            print(f"  {step:28} {f'{took:.3f}s' if isinstance(took, float) else took}")
+        print(f"Warm-up took {time.perf_counter() - start:.3f}s")
+    if args.seed is None and not args.check:
+        parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+# End-to-end check of the headless API (app.api_server) against a local
+# fake OpenAI server: opens many sessions that then sit idle, and runs
+# concurrent streaming turns over plain HTTP from asyncio clients.
+#
+#   python -m benchmarks.bench_api_server --idle 2000 --concurrency 100 --turns 3
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+os.environ.setdefault("OPENAI_API_KEY", "load-test")
+
+from app.api_server import InterviewAPI  # noqa: E402
+from benchmarks.harness import percentile, save_results  # noqa: E402
+from benchmarks.load_replay import ANSWERS, current_rss_bytes  # noqa: E402
+from tools.fake_openai_server import FakeBehaviour, FakeOpenAIServer  # noqa: E402
+
+
+async def request(host: str, port: int, method: str, path: str,
+                  body: Dict = None) -> Tuple[int, bytes, float]:
+    """One request on a fresh connection; returns (status, body, seconds to first body byte)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    payload = json.dumps(body or {}).encode()
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n"
+                 f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+                 .encode() + payload)
+    started = time.perf_counter()
+    head = await reader.readuntil(b"\r\n\r\n")
+    first = await reader.read(1)
+    ttfb = time.perf_counter() - started
+    rest = await reader.read()
+    writer.close()
+    status = int(head.split(b" ", 2)[1])
+    return status, first + rest, ttfb
+
+
+async def run(args) -> Dict:
+    api = InterviewAPI()
+    ready = asyncio.Event()
+    server = asyncio.create_task(api.serve("127.0.0.1", 0, ready))
+    await ready.wait()
+    host, port = api.address
+
+    # Idle sessions: created without an opening question, never used again
+    rss_before = current_rss_bytes()
+    started = time.perf_counter()
+    for i in range(0, args.idle, 100):
+        await asyncio.gather(*(request(host, port, "POST", "/sessions",
+                                       {"job_role": "Backend Engineer", "open": False})
+                               for _ in range(min(100, args.idle - i))))
+    idle_s = time.perf_counter() - started
+    idle_bytes = (current_rss_bytes() - rss_before) / max(args.idle, 1)
+
+    latencies: List[float] = []
+    ttfbs: List[float] = []
+    errors: Dict[int, int] = {}
+
+    async def interview(index: int):
+        status, body, _ = await request(host, port, "POST", "/sessions",
+                                        {"job_role": "Backend Engineer", "skills": "SQL"})
+        if status != 201:
+            errors[status] = errors.get(status, 0) + 1
+            return
+        sid = json.loads(body)["session_id"]
+        for turn in range(args.turns):
+            answer = ANSWERS[(index + turn) % len(ANSWERS)]
+            started = time.perf_counter()
+            status, body, ttfb = await request(host, port, "POST", f"/sessions/{sid}/turns",
+                                               {"message": answer, "stream": True})
+            if status != 200 or b"event: done" not in body:
+                errors[status] = errors.get(status, 0) + 1
+                continue
+            latencies.append(time.perf_counter() - started)
+            ttfbs.append(ttfb)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(interview(i) for i in range(args.concurrency)))
+    wall = time.perf_counter() - started
+    server.cancel()
+
+    latencies.sort()
+    ttfbs.sort()
+    return {
+        "idle_sessions": args.idle,
+        "idle_create_s": idle_s,
+        "idle_rss_bytes_per_session": idle_bytes,
+        "live_sessions_in_memory": api.storage.live_count(),
+        "turns": len(latencies),
+        "errors": errors,
+        "turns_per_s": len(latencies) / wall if wall else 0.0,
+        "turn_p50_ms": percentile(latencies, 0.5) * 1000,
+        "turn_p95_ms": percentile(latencies, 0.95) * 1000,
+        "first_byte_p50_ms": percentile(ttfbs, 0.5) * 1000,
+        "first_byte_p95_ms": percentile(ttfbs, 0.95) * 1000,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load the async API against a fake model")
+    parser.add_argument("--idle", type=int, default=2000, help="idle sessions to create")
+    parser.add_argument("--concurrency", type=int, default=100, help="concurrent interviews")
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.3, help="fake model latency (s)")
+    parser.add_argument("--tokens-per-second", type=float, default=200)
+    parser.add_argument("--out", default=None, help="write JSON results here")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("CONTEXT_SUMMARY_MODE", "marker")
+    with FakeOpenAIServer(FakeBehaviour(latency=args.latency,
+                                        tokens_per_second=args.tokens_per_second)) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        results = asyncio.run(run(args))
+
+    for key, value in results.items():
+        print(f"{key:28} {value:.1f}" if isinstance(value, float) else f"{key:28} {value}")
+    if args.out:
+        save_results(args.out, {"api_server": results})
+        print(f"saved {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,155 @@
+# Micro-benchmarks for the per-turn work streamlit_app.py does:
+# validate_input, wrap_user_input, token counting, Interviewer construction,
+# message appending and building the context for a long history.
+# Runs fully offline (no API calls are made).
+#
+#   python -m benchmarks.bench_hot_path --out bench.json
+#   python -m benchmarks.bench_hot_path --baseline bench.json --threshold 0.2
+#
+# Exits with status 1 if any case's p50 regressed by more than --threshold.
+import argparse
+import contextlib
+import io
+import os
+import sys
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.ai_client import AIClient  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.context_window import ContextWindow  # noqa: E402
+from app.cost_tracker import HistoryTokenCounter, count_prompt_tokens, count_tokens, has_tokenizer  # noqa: E402
+from app.interviewer import Interviewer  # noqa: E402
+from app.messages import ASSISTANT, USER, Message  # noqa: E402
+from app.security import MAX_LENGTH, validate_input, wrap_user_input  # noqa: E402
+from benchmarks.harness import find_regressions, load_results, print_table, run_case, save_results  # noqa: E402
+
+ANSWER_WORDS = ("In my last role I designed a REST API with Django and PostgreSQL, "
+                "added caching with Redis and wrote integration tests for the billing flow. ")
+
+
+def text_of_length(n: int) -> str:
+    return (ANSWER_WORDS * (n // len(ANSWER_WORDS) + 1))[:n]
+
+
+def long_interviewer(ai, turns: int) -> Interviewer:
+    interviewer = Interviewer("Python Backend Engineer", "Django, REST, SQL", "Medium",
+                              "Zero-shot", ai=ai)
+    for t in range(turns):
+        interviewer.extend([Message(USER, wrap_user_input(text_of_length(600) + str(t))),
+                            Message(ASSISTANT, text_of_length(400) + str(t))])
+    return interviewer
+
+
+def tokenizer_available(model: str) -> str:
+    """Empty string if the real tokenizer loads without network, else the reason"""
+    if has_tokenizer(model):
+        return ""
+    return "tokenizer data not available offline (seed it with python -m app.warmup --seed)"
+
+
+def build_cases(turns: int):
+    ai = AIClient(client=object())
+    model = ai.model
+    short_text = text_of_length(80)
+    max_text = text_of_length(MAX_LENGTH)
+    wrapped_max = wrap_user_input(max_text)
+    reply = text_of_length(700)
+
+    cases = {
+        "validate_input[80]": lambda: validate_input(short_text),
+        f"validate_input[{MAX_LENGTH}]": lambda: validate_input(max_text),
+        f"wrap_user_input[{MAX_LENGTH}]": lambda: wrap_user_input(max_text),
+        "Interviewer()": lambda: Interviewer("Python Backend Engineer", "Django, REST, SQL",
+                                             "Medium", "Zero-shot", ai=ai),
+    }
+
+    appender = long_interviewer(ai, 0)
+
+    def append_turn():
+        appender.extend([Message(USER, wrapped_max), Message(ASSISTANT, reply)])
+        if len(appender.messages) > 2 * turns:
+            appender.history = appender.history.truncate(1)
+
+    cases["append_turn"] = append_turn
+
+    # Branching shares the history: no copy however long it is
+    forker = long_interviewer(ai, turns)
+
+    def fork():
+        forker.fork()
+        if len(forker.branches) > 100:
+            del forker.branches[1:]
+            forker.branch = 0
+
+    cases[f"fork[{turns} turns]"] = fork
+
+    skipped = tokenizer_available(model)
+    token_cases = [f"count_tokens[input {MAX_LENGTH}]", "count_tokens[output 700]",
+                   f"count_prompt_tokens[{turns} turns]", "history_update[+1 turn]",
+                   f"context_build[{turns} turns]"]
+    if skipped:
+        return cases, {name: skipped for name in token_cases}
+
+    history = long_interviewer(ai, turns)
+    counter = HistoryTokenCounter(model)
+    counter.update(history.messages)
+    growing = list(history.messages)
+
+    def history_update():
+        growing.append(Message(USER, wrapped_max))
+        counter.update(growing)
+
+    window = ContextWindow(token_budget=Config.CONTEXT_TOKEN_BUDGET, model=model)
+
+    cases.update({
+        token_cases[0]: lambda: count_tokens(wrapped_max, model),
+        token_cases[1]: lambda: count_tokens(reply, model),
+        token_cases[2]: lambda: count_prompt_tokens(history.messages, model),
+        token_cases[3]: history_update,
+        token_cases[4]: lambda: window.build(history.messages),
+    })
+    return cases, {}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Per-turn hot path micro-benchmarks")
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--turns", type=int, default=50)
+    parser.add_argument("--only", default=None, help="run cases whose name contains this")
+    parser.add_argument("--out", default=None, help="save results as JSON")
+    parser.add_argument("--baseline", default=None, help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="allowed p50 slowdown vs baseline (0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    # Keep the interviewer's console output out of the timings
+    with contextlib.redirect_stdout(io.StringIO()):
+        cases, skipped = build_cases(args.turns)
+        results = {}
+        for name, fn in cases.items():
+            if args.only and args.only not in name:
+                continue
+            repeat = max(50, args.repeat // 10) if "Interviewer" in name else args.repeat
+            results[name] = run_case(fn, repeat=repeat)
+    for name, reason in skipped.items():
+        results[name] = {"skipped": reason}
+
+    print_table(results)
+    if args.out:
+        save_results(args.out, results)
+        print(f"saved {args.out}")
+
+    if args.baseline:
+        regressions = find_regressions(load_results(args.baseline), results, args.threshold)
+        if regressions:
+            print("REGRESSIONS:")
+            for line in regressions:
+                print("  " + line)
+            return 1
+        print(f"no regressions over {args.threshold:.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+# Benchmark: how blocklist scan cost scales with the number of phrases.
+# Compares the compiled Aho-Corasick matcher with the old per-phrase loop.
+#
+# Run from the repo root:  python -m benchmarks.bench_matcher
+import argparse
+import random
+import string
+import time
+
+from app.matcher import PhraseMatcher, normalize
+from app.security import FORBIDDEN_PHRASES, MAX_LENGTH
+
+
+def make_phrases(n: int, seed: int = 0):
+    """Built-in phrases plus random 1-4 word phrases up to n entries"""
+    rng = random.Random(seed)
+    phrases = list(FORBIDDEN_PHRASES)
+    while len(phrases) < n:
+        words = ["".join(rng.choices(string.ascii_lowercase, k=rng.randint(3, 9)))
+                 for _ in range(rng.randint(1, 4))]
+        phrases.append(" ".join(words))
+    return phrases[:n]
+
+
+def make_message(seed: int = 1) -> str:
+    """A clean, max-length interview answer"""
+    rng = random.Random(seed)
+    words = ["the", "service", "uses", "django", "with", "postgres", "and", "we",
+             "cache", "queries", "in", "redis", "to", "keep", "latency", "low"]
+    text = ""
+    while len(text) < MAX_LENGTH - 10:
+        text += rng.choice(words) + " "
+    return text[:MAX_LENGTH]
+
+
+def naive_scan(phrases, text):
+    """The original validate_input loop"""
+    text_lower = text.lower()
+    for phrase in phrases:
+        if phrase in text_lower:
+            return phrase
+    return None
+
+
+def per_call_us(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", default="23,100,1000,10000,50000")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    text = make_message()
+    print(f"message: {len(text)} chars")
+    print(f"{'phrases':>8} {'compile ms':>11} {'scan us':>9} {'naive us':>9} {'normalize us':>13}")
+    for n in [int(x) for x in args.sizes.split(",")]:
+        phrases = make_phrases(n)
+        naive_phrases = [p.lower() for p in phrases]
+
+        start = time.perf_counter()
+        matcher = PhraseMatcher(phrases)
+        compile_ms = (time.perf_counter() - start) * 1e3
+
+        scan = per_call_us(lambda: matcher.find(text), args.repeat)
+        naive = per_call_us(lambda: naive_scan(naive_phrases, text), args.repeat)
+        norm = per_call_us(lambda: normalize(text), args.repeat)
+        print(f"{n:>8} {compile_ms:>11.1f} {scan:>9.1f} {naive:>9.1f} {norm:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Benchmark: memory per interview session at N concurrent sessions.
+#
+# "legacy" rebuilds the layout Interviewer used before compact messages:
+# an object with a __dict__, one dict per message and a private copy of the
+# expanded system prompt. "compact" measures real Interviewer instances.
+# Both hold the same conversation; shared objects (the AI client, prompt
+# templates) are created before measuring.
+#
+# Run from the repo root:  python -m benchmarks.bench_memory --sessions 10000
+import argparse
+import contextlib
+import io
+import os
+import tracemalloc
+
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from app.ai_client import AIClient  # noqa: E402
+from app.interviewer import Interviewer  # noqa: E402
+from app.messages import ASSISTANT, USER, Message  # noqa: E402
+from app.prompts import build_system_prompt  # noqa: E402
+
+SETTINGS = [
+    ("Python Backend Engineer", "Django, REST, SQL", "Medium", "Zero-shot"),
+    ("Data Analyst", "SQL, Pandas", "Easy", "Few-shot"),
+    ("Site Reliability Engineer", "Kubernetes, Linux", "Hard", "Chain-of-Thought"),
+    ("Frontend Developer", "React, TypeScript", "Medium", "Dynamic"),
+]
+
+
+def conversation(turns: int):
+    """Shared reply texts, so both layouts hold identical content objects"""
+    return [(f"Answer number {t} about the project I worked on.",
+             f"Thanks. Question {t + 1}: how would you scale that design?")
+            for t in range(turns)]
+
+
+class LegacySession:
+    """The pre-compact layout (no __slots__, dict messages, prompt copy)"""
+
+    def __init__(self, ai, job_role, skills, difficulty, technique):
+        self.ai = ai
+        self.job_role = job_role
+        self.skills = skills
+        self.difficulty = difficulty
+        self.technique = technique
+        # A freshly built string per session, as the f-strings produced
+        self.system_prompt = "".join(build_system_prompt(technique, job_role, skills, difficulty))
+        self.messages = [{"role": "system", "content": self.system_prompt}]
+
+
+def build_legacy(n, ai, turns):
+    sessions = []
+    for i in range(n):
+        session = LegacySession(ai, *SETTINGS[i % len(SETTINGS)])
+        for user, reply in turns:
+            session.messages.append({"role": "user", "content": user})
+            session.messages.append({"role": "assistant", "content": reply})
+        sessions.append(session)
+    return sessions
+
+
+def build_compact(n, ai, turns):
+    sessions = []
+    for i in range(n):
+        session = Interviewer(*SETTINGS[i % len(SETTINGS)], ai=ai)
+        for user, reply in turns:
+            session.extend([Message(USER, user), Message(ASSISTANT, reply)])
+        sessions.append(session)
+    return sessions
+
+
+def measure(build, n, ai, turns) -> float:
+    """Bytes allocated per session while holding n sessions"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    sessions = build(n, ai, turns)
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    total = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    del sessions
+    return total / n
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--turns", type=int, default=5)
+    args = parser.parse_args()
+
+    # No network: the client object is never used to send anything
+    ai = AIClient(client=object())
+    turns = conversation(args.turns)
+
+    results = {}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, build in (("legacy", build_legacy), ("compact", build_compact)):
+            results[name] = measure(build, args.sessions, ai, turns)
+
+    print(f"{args.sessions} sessions, {args.turns} turns each")
+    for name, per_session in results.items():
+        print(f"  {name:8} {per_session:10,.0f} bytes/session  "
+              f"{per_session * args.sessions / 2**20:8.1f} MiB total")
+    print(f"  saving   {1 - results['compact'] / results['legacy']:10.0%}")
+
+
+if __name__ == "__main__":
+    main()
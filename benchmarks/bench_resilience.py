@@ -0,0 +1,133 @@
+# Hedging, circuit breakers and failover (app.resilience) against a local
+# fake OpenAI server with injected tail latency and errors:
+#
+# - tail: a share of requests is slow; latency percentiles with and
+#   without hedging, and how many extra upstream requests hedging cost
+# - outage: the primary model fails every request for a while; how many
+#   requests still succeed (on the backup), breaker trips and recovery
+#
+#   python -m benchmarks.bench_resilience --requests 400 --slow-rate 0.03 --slow-latency 2
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+os.environ.setdefault("OPENAI_API_KEY", "load-test")
+
+from app import resilience  # noqa: E402
+from app.ai_client import AIClient  # noqa: E402
+from app.config import Config  # noqa: E402
+from app.messages import USER, Message  # noqa: E402
+from benchmarks.harness import percentile, save_results  # noqa: E402
+from tools.fake_openai_server import FakeBehaviour, FakeOpenAIServer  # noqa: E402
+
+PRIMARY, BACKUP = "gpt-4.1-mini", "gpt-4.1-nano"
+
+
+def fresh_resilience(**kwargs) -> resilience.Resilience:
+    """Replaces the process-wide instance, so each case starts cold"""
+    resilience._resilience = resilience.Resilience(**kwargs)
+    return resilience._resilience
+
+
+def run_requests(ai: AIClient, count: int, concurrency: int, prefix: str) -> Dict[str, float]:
+    def one(i):
+        started = time.perf_counter()
+        try:
+            result = ai.complete([Message(USER, f"{prefix} {i}")], use_cache=False, model=PRIMARY)
+            return time.perf_counter() - started, result.model
+        except Exception:
+            return time.perf_counter() - started, None
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        outcomes = list(pool.map(one, range(count)))
+    latencies = sorted(seconds for seconds, _ in outcomes)
+    return {
+        "requests": count,
+        "succeeded": sum(model is not None for _, model in outcomes),
+        "on_backup": sum(model == BACKUP for _, model in outcomes),
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "max_ms": latencies[-1] * 1000,
+    }
+
+
+def tail_case(fake: FakeOpenAIServer, args, hedge: bool) -> Dict[str, float]:
+    fake.behaviour.per_model.clear()
+    fake.behaviour.slow_rate = args.slow_rate
+    guard = fresh_resilience(hedge_enabled=hedge, fallback_models=[])
+    upstream = fake.stats["requests"]
+    result = run_requests(AIClient(), args.requests, args.concurrency, f"tail {hedge}")
+    metrics = guard.metrics()
+    result["hedges"] = metrics["hedges"]
+    result["hedge_wins"] = metrics["hedge_wins"]
+    result["upstream_requests"] = fake.stats["requests"] - upstream
+    return result
+
+
+def outage_case(fake: FakeOpenAIServer, args) -> Dict[str, float]:
+    fake.behaviour.slow_rate = 0.0
+    guard = fresh_resilience(fallback_models=[BACKUP], reset_seconds=args.reset_seconds)
+    ai = AIClient()
+    # Healthy, then down, then healthy again after the breaker's reset time
+    healthy = run_requests(ai, args.requests // 4, args.concurrency, "before")
+    fake.behaviour.per_model[PRIMARY] = {"error_rate": 1.0}
+    down = run_requests(ai, args.requests // 2, args.concurrency, "outage")
+    fake.behaviour.per_model.clear()
+    time.sleep(args.reset_seconds)
+    recovered = run_requests(ai, args.requests // 4, args.concurrency, "after")
+    metrics = guard.metrics()
+    return {
+        "requests": healthy["requests"] + down["requests"] + recovered["requests"],
+        "succeeded": healthy["succeeded"] + down["succeeded"] + recovered["succeeded"],
+        "outage_on_backup": down["on_backup"],
+        "outage_p99_ms": down["p99_ms"],
+        "recovered_on_primary": recovered["succeeded"] - recovered["on_backup"],
+        "failovers": metrics["failovers"],
+        "trips": metrics["trips"],
+        "rejected": metrics.get(f"{PRIMARY}.rejected", 0),
+        "primary_state": metrics.get(f"{PRIMARY}.state", 0),
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Hedging and failover against a fake model")
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake model latency (s)")
+    parser.add_argument("--slow-rate", type=float, default=0.03, help="share of slow requests")
+    parser.add_argument("--slow-latency", type=float, default=1.5, help="extra seconds when slow")
+    parser.add_argument("--reset-seconds", type=float, default=1.0, help="breaker reset time")
+    parser.add_argument("--out", default=None, help="write JSON results here")
+    args = parser.parse_args(argv)
+
+    # Nothing should wait for the rate limiter, and failures should reach
+    # the breaker quickly instead of sitting in backoff
+    Config.RATE_LIMIT_RPM = 100_000
+    Config.RATE_LIMIT_TPM = 100_000_000
+    Config.RETRY_BASE_DELAY = 0.01
+    behaviour = FakeBehaviour(latency=args.latency, slow_latency=args.slow_latency,
+                              reply_words=20, seed=0)
+    with FakeOpenAIServer(behaviour) as fake:
+        os.environ["OPENAI_BASE_URL"] = fake.base_url
+        results = {
+            "tail_unhedged": tail_case(fake, args, hedge=False),
+            "tail_hedged": tail_case(fake, args, hedge=True),
+            "outage_failover": outage_case(fake, args),
+        }
+
+    for case, row in results.items():
+        print(case)
+        for key, value in row.items():
+            print(f"  {key:24} {value:.1f}" if isinstance(value, float) else f"  {key:24} {value}")
+    if args.out:
+        save_results(args.out, results)
+        print(f"saved {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
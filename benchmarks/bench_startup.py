@@ -0,0 +1,105 @@
+# Startup benchmark: how long importing the app takes, and how slow the
+# first turn of a fresh process is with and without the warm-up.
+# Every sample runs in a new interpreter against a local fake OpenAI server.
+#
+#   python -m benchmarks.bench_startup --repeat 5 --out startup.json
+#
+# Modes:
+#   import  - import the modules streamlit_app.py needs
+#   cold    - import, then the first turn straight away (no warm-up)
+#   warm    - import, background warm-up, then the first turn once it is done
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks.harness import percentile, save_results
+from tools.fake_openai_server import FakeBehaviour, FakeOpenAIServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+import app.interviewer, app.security, app.session_store, app.cost_tracker
+result = {"import_s": time.perf_counter() - start,
+          "heavy_modules": [m for m in ("openai", "tiktoken", "httpx") if m in sys.modules]}
+mode = sys.argv[1]
+if mode == "warm":
+    from app import warmup
+    start = time.perf_counter()
+    warmup.warm_up()
+    warmup.wait_until_warm()
+    result["warmup_s"] = time.perf_counter() - start
+if mode != "import":
+    from app.interviewer import answer_turn
+    from app.security import validate_input, wrap_user_input
+    start = time.perf_counter()
+    validate_input("I would start with the data model.")
+    answer_turn({}, wrap_user_input("I would start with the data model."),
+                job_role="Backend Engineer", use_cache=False)
+    result["first_turn_s"] = time.perf_counter() - start
+print(json.dumps(result))
+"""
+
+
+def run_child(mode: str, env) -> dict:
+    out = subprocess.run([sys.executable, "-c", CHILD, mode], cwd=ROOT, env=env,
+                         capture_output=True, text=True, timeout=300)
+    if out.returncode != 0:
+        raise RuntimeError(f"{mode} run failed:\n{out.stderr}")
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples, key: str) -> dict:
+    values = sorted(s[key] for s in samples if key in s)
+    if not values:
+        return {}
+    return {"median_ms": statistics.median(values) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "min_ms": values[0] * 1000}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Import and first-turn latency of a fresh process")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--modes", nargs="+", default=["import", "cold", "warm"])
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="fake server latency per request (s)")
+    parser.add_argument("--out", default=None, help="write JSON results here")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with FakeOpenAIServer(FakeBehaviour(latency=args.latency)) as server:
+        env = dict(os.environ,
+                   OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "benchmark"),
+                   OPENAI_BASE_URL=server.base_url,
+                   RESPONSE_CACHE_ENABLED="0",
+                   CONTEXT_SUMMARY_MODE="marker",
+                   PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get("PYTHONPATH")])))
+        for mode in args.modes:
+            samples = [run_child(mode, env) for _ in range(args.repeat)]
+            results[mode] = {
+                "import": summarize(samples, "import_s"),
+                "warmup": summarize(samples, "warmup_s"),
+                "first_turn": summarize(samples, "first_turn_s"),
+                "heavy_modules_after_import": samples[-1]["heavy_modules"],
+            }
+
+    print(f"{'mode':8} {'import ms':>10} {'warm-up ms':>11} {'first turn ms':>14}")
+    for mode, r in results.items():
+        cells = [f"{r[k]['median_ms']:.0f}" if r[k] else "-" for k in ("import", "warmup", "first_turn")]
+        print(f"{mode:8} {cells[0]:>10} {cells[1]:>11} {cells[2]:>14}")
+    heavy = results[args.modes[0]]["heavy_modules_after_import"]
+    print(f"heavy modules loaded by import: {', '.join(heavy) or 'none'}")
+
+    if args.out:
+        save_results(args.out, results)
+        print(f"saved {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+# Small benchmark harness shared by the benchmark scripts:
+# latency percentiles, per-call allocation peaks, JSON results and
+# regression checks against a saved baseline.
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+from typing import Callable, Dict, List
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_case(fn: Callable[[], object], repeat: int = 2000, warmup: int = 50,
+             alloc_repeat: int = 100) -> Dict[str, float]:
+    """
+    Times fn() `repeat` times (after `warmup` calls), then measures its
+    allocation peak over `alloc_repeat` calls with tracemalloc.
+    Latencies are in microseconds, allocations in bytes.
+    """
+    for _ in range(warmup):
+        fn()
+
+    samples = []
+    clock = time.perf_counter_ns
+    for _ in range(repeat):
+        start = clock()
+        fn()
+        samples.append((clock() - start) / 1000)
+    samples.sort()
+
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_repeat):
+            base = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn()
+            peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "calls": repeat,
+        "mean_us": statistics.fmean(samples),
+        "p50_us": percentile(samples, 0.50),
+        "p90_us": percentile(samples, 0.90),
+        "p99_us": percentile(samples, 0.99),
+        "max_us": samples[-1],
+        "alloc_peak_bytes": statistics.fmean(peaks) if peaks else 0.0,
+    }
+
+
+def metadata() -> Dict[str, str]:
+    """Where the numbers came from, for comparing runs across commits"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                                text=True, timeout=5).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        commit = ""
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+def save_results(path: str, results: Dict[str, Dict[str, float]]):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"meta": metadata(), "results": results}, f, indent=2)
+
+
+def load_results(path: str) -> Dict[str, Dict[str, float]]:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)["results"]
+
+
+def find_regressions(baseline: Dict[str, Dict[str, float]],
+                     current: Dict[str, Dict[str, float]],
+                     threshold: float, metric: str = "p50_us") -> List[str]:
+    """Cases whose `metric` grew by more than `threshold` (0.2 = 20%)"""
+    regressions = []
+    for name, result in current.items():
+        old = baseline.get(name, {}).get(metric)
+        if not old or metric not in result:
+            continue
+        change = result[metric] / old - 1
+        if change > threshold:
+            regressions.append(f"{name}: {metric} {old:.1f} -> {result[metric]:.1f} (+{change:.0%})")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, float]]):
+    print(f"{'case':34} {'p50 us':>9} {'p90 us':>9} {'p99 us':>9} {'alloc B':>9}")
+    for name, r in results.items():
+        if "skipped" in r:
+            print(f"{name:34} skipped: {r['skipped']}")
+            continue
+        print(f"{name:34} {r['p50_us']:9.1f} {r['p90_us']:9.1f} {r['p99_us']:9.1f} "
+              f"{r['alloc_peak_bytes']:9.0f}")
@@ -0,0 +1,323 @@
+# End-to-end load replay: how many concurrent interviews can one process
+# sustain before answer_turn latency degrades?
+#
+# Transcripts (lists of candidate answers plus interviewer settings) are
+# either exported from a session store or synthesized, then replayed at a
+# given concurrency and think time against a local fake OpenAI server,
+# calling answer_turn / answer_turn_stream directly.
+#
+#   # synthesize 200 interviews of 8 turns
+#   python -m benchmarks.load_replay synthesize --count 200 --turns 8 --out transcripts.jsonl
+#   # or export real ones from a SESSION_STORE
+#   python -m benchmarks.load_replay record --store sqlite --path sessions.db --out transcripts.jsonl
+#   # replay with 50 concurrent sessions, 1s think time, 5% injected errors
+#   python -m benchmarks.load_replay replay transcripts.jsonl --concurrency 50 \
+#       --think-time 1 --latency 0.4 --stream --error-rate 0.05 --out replay.json
+import argparse
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Dict, List
+
+os.environ.setdefault("OPENAI_API_KEY", "load-test")
+
+from app.config import Config  # noqa: E402
+from app.prompts import DIFFICULTY_INSTRUCTIONS, available_techniques  # noqa: E402
+from app.security import unwrap_user_input, wrap_user_input  # noqa: E402
+from benchmarks.harness import percentile  # noqa: E402
+from tools.fake_openai_server import FakeBehaviour, FakeOpenAIServer  # noqa: E402
+
+ROLES = [("Python Backend Engineer", "Django, REST, SQL"),
+         ("Data Analyst", "SQL, Pandas, dashboards"),
+         ("Site Reliability Engineer", "Kubernetes, Linux, observability"),
+         ("Frontend Developer", "React, TypeScript, accessibility")]
+
+ANSWERS = [
+    "I would start by clarifying the requirements and the expected load, then sketch the data model.",
+    "In my last project we used a message queue to decouple the services and retried failed jobs.",
+    "I usually add metrics and structured logs first, so I can see where the time actually goes.",
+    "We split the monolith gradually, starting with the billing module that changed most often.",
+    "I would write a failing test that reproduces the bug before touching the code.",
+    "Caching helped, but we had to be careful about invalidation when prices changed.",
+]
+
+
+# ---------- transcripts ----------
+
+def synthesize(count: int, turns: int, seed: int = 0) -> List[Dict]:
+    """Interviews across every technique and difficulty with canned answers"""
+    rng = random.Random(seed)
+    techniques = available_techniques()
+    difficulties = list(DIFFICULTY_INSTRUCTIONS)
+    transcripts = []
+    for i in range(count):
+        role, skills = ROLES[i % len(ROLES)]
+        transcripts.append({
+            "settings": {"job_role": role, "skills": skills,
+                         "difficulty": difficulties[i % len(difficulties)],
+                         "technique": techniques[i % len(techniques)]},
+            "user_turns": [rng.choice(ANSWERS) for _ in range(turns)],
+        })
+    return transcripts
+
+
+def record(store: str, path: str) -> List[Dict]:
+    """Exports the user turns of every session in a session store"""
+    from app.session_store import make_backend
+
+    backend = make_backend(store, path)
+    transcripts = []
+    try:
+        for session_id in backend.session_ids():
+            loaded = backend.load(session_id)
+            if loaded is None:
+                continue
+            settings, messages = loaded
+            turns = [unwrap_user_input(m["content"]) for m in messages if m["role"] == "user"]
+            if turns:
+                transcripts.append({"settings": settings, "user_turns": turns})
+    finally:
+        backend.close()
+    return transcripts
+
+
+def write_transcripts(path: str, transcripts: List[Dict]):
+    with open(path, "w", encoding="utf-8") as f:
+        for t in transcripts:
+            f.write(json.dumps(t, ensure_ascii=False) + "\n")
+
+
+def read_transcripts(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ---------- replay ----------
+
+def current_rss_bytes() -> int:
+    """Resident set size of this process (Linux), 0 if unavailable"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return 0
+
+
+class ReplayStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.ttfts: List[float] = []
+        self.errors: Dict[str, int] = {}
+        self.turns = 0
+
+    def add(self, latency: float, ttft: float = None):
+        with self.lock:
+            self.turns += 1
+            self.latencies.append(latency)
+            if ttft is not None:
+                self.ttfts.append(ttft)
+
+    def error(self, e: Exception):
+        with self.lock:
+            self.turns += 1
+            name = e.__class__.__name__
+            self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def replay_session(transcript: Dict, stats: ReplayStats, stream: bool,
+                   think_time: float, use_cache: bool, rng: random.Random):
+    from app.interviewer import answer_turn, answer_turn_stream
+
+    storage = {}
+    settings = transcript["settings"]
+    for answer in transcript["user_turns"]:
+        message = wrap_user_input(answer)
+        start = time.perf_counter()
+        try:
+            if stream:
+                ttft = None
+                for _ in answer_turn_stream(storage, message, use_cache=use_cache, **settings):
+                    if ttft is None:
+                        ttft = time.perf_counter() - start
+                stats.add(time.perf_counter() - start, ttft)
+            else:
+                answer_turn(storage, message, use_cache=use_cache, **settings)
+                stats.add(time.perf_counter() - start)
+        except Exception as e:
+            stats.error(e)
+        if think_time > 0:
+            # Exponential think time around the mean, like real users
+            time.sleep(rng.expovariate(1 / think_time))
+
+
+def replay(transcripts: List[Dict], concurrency: int, think_time: float, stream: bool,
+           use_cache: bool, sample_every: float, seed: int = 0) -> Dict:
+    work = queue.Queue()
+    for t in transcripts:
+        work.put(t)
+    stats = ReplayStats()
+    memory = []
+    done = threading.Event()
+
+    def worker(index: int):
+        rng = random.Random(seed + index)
+        while True:
+            try:
+                transcript = work.get_nowait()
+            except queue.Empty:
+                return
+            replay_session(transcript, stats, stream, think_time, use_cache, rng)
+
+    def sampler(started: float):
+        while not done.wait(sample_every):
+            with stats.lock:
+                turns = stats.turns
+            memory.append({"t": round(time.perf_counter() - started, 2),
+                           "rss_bytes": current_rss_bytes(),
+                           "traced_bytes": tracemalloc.get_traced_memory()[0],
+                           "turns": turns})
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    sampler_thread = threading.Thread(target=sampler, args=(started,), daemon=True)
+    sampler_thread.start()
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler_thread.join()
+    tracemalloc.stop()
+
+    latencies = sorted(stats.latencies)
+    ttfts = sorted(stats.ttfts)
+    errors = sum(stats.errors.values())
+    return {
+        "concurrency": concurrency,
+        "think_time_s": think_time,
+        "stream": stream,
+        "sessions": len(transcripts),
+        "turns": stats.turns,
+        "elapsed_s": elapsed,
+        "throughput_turns_per_s": stats.turns / elapsed if elapsed else 0.0,
+        "latency_s": {"p50": percentile(latencies, 0.5), "p95": percentile(latencies, 0.95),
+                      "p99": percentile(latencies, 0.99),
+                      "max": latencies[-1] if latencies else 0.0},
+        "ttft_s": {"p50": percentile(ttfts, 0.5), "p95": percentile(ttfts, 0.95),
+                   "p99": percentile(ttfts, 0.99)} if ttfts else None,
+        "error_rate": errors / stats.turns if stats.turns else 0.0,
+        "errors": stats.errors,
+        "memory": memory,
+    }
+
+
+def print_report(report: Dict):
+    lat = report["latency_s"]
+    print(f"sessions={report['sessions']} turns={report['turns']} "
+          f"concurrency={report['concurrency']} elapsed={report['elapsed_s']:.1f}s")
+    print(f"throughput   {report['throughput_turns_per_s']:.1f} turns/s")
+    print(f"latency      p50={lat['p50']*1000:.0f}ms p95={lat['p95']*1000:.0f}ms "
+          f"p99={lat['p99']*1000:.0f}ms max={lat['max']*1000:.0f}ms")
+    if report["ttft_s"]:
+        ttft = report["ttft_s"]
+        print(f"ttft         p50={ttft['p50']*1000:.0f}ms p95={ttft['p95']*1000:.0f}ms "
+              f"p99={ttft['p99']*1000:.0f}ms")
+    print(f"error rate   {report['error_rate']:.2%} {report['errors'] or ''}")
+    if report["memory"]:
+        first, last = report["memory"][0], report["memory"][-1]
+        print(f"memory       rss {first['rss_bytes']/2**20:.1f} -> {last['rss_bytes']/2**20:.1f} MiB, "
+              f"traced {first['traced_bytes']/2**20:.1f} -> {last['traced_bytes']/2**20:.1f} MiB")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Load replay against a fake OpenAI server")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("synthesize", help="generate transcripts from the techniques")
+    p.add_argument("--count", type=int, default=100)
+    p.add_argument("--turns", type=int, default=6)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", required=True)
+
+    p = sub.add_parser("record", help="export transcripts from a session store")
+    p.add_argument("--store", choices=["sqlite", "log"], required=True)
+    p.add_argument("--path", required=True)
+    p.add_argument("--out", required=True)
+
+    p = sub.add_parser("replay", help="replay transcripts and report")
+    p.add_argument("transcripts")
+    p.add_argument("--concurrency", type=int, default=20)
+    p.add_argument("--think-time", type=float, default=0.0, help="mean seconds between turns")
+    p.add_argument("--stream", action="store_true", help="use answer_turn_stream")
+    p.add_argument("--use-cache", action="store_true", help="allow the response cache")
+    p.add_argument("--sample-every", type=float, default=1.0, help="memory sample interval (s)")
+    p.add_argument("--base-url", default=None, help="use this server instead of the built-in fake")
+    p.add_argument("--latency", type=float, default=0.3)
+    p.add_argument("--jitter", type=float, default=0.1)
+    p.add_argument("--ttft", type=float, default=0.0)
+    p.add_argument("--tokens-per-second", type=float, default=0.0)
+    p.add_argument("--error-rate", type=float, default=0.0)
+    p.add_argument("--error-status", type=int, default=500)
+    p.add_argument("--rpm", type=int, default=100_000)
+    p.add_argument("--tpm", type=int, default=100_000_000)
+    p.add_argument("--out", default=None, help="write the JSON report here")
+    args = parser.parse_args(argv)
+
+    if args.command == "synthesize":
+        write_transcripts(args.out, synthesize(args.count, args.turns, args.seed))
+        print(f"wrote {args.count} transcripts to {args.out}")
+        return 0
+    if args.command == "record":
+        transcripts = record(args.store, args.path)
+        write_transcripts(args.out, transcripts)
+        print(f"wrote {len(transcripts)} transcripts to {args.out}")
+        return 0
+
+    # Must be configured before the shared client and scheduler are created
+    Config.RATE_LIMIT_RPM = args.rpm
+    Config.RATE_LIMIT_TPM = args.tpm
+    Config.OPENAI_MAX_CONNECTIONS = max(Config.OPENAI_MAX_CONNECTIONS, args.concurrency)
+    Config.OPENAI_MAX_KEEPALIVE_CONNECTIONS = max(Config.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                                                  args.concurrency)
+    Config.CONTEXT_SUMMARY_MODE = "marker"
+
+    server = None
+    if args.base_url:
+        Config.OPENAI_BASE_URL = args.base_url
+    else:
+        server = FakeOpenAIServer(FakeBehaviour(
+            latency=args.latency, jitter=args.jitter, ttft=args.ttft,
+            tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+            error_status=args.error_status,
+        )).start()
+        Config.OPENAI_BASE_URL = server.base_url
+
+    # Like the app at startup, so cold-start imports don't skew the first turns
+    from app.warmup import warm_up
+    warm_up(background=False)
+
+    try:
+        report = replay(read_transcripts(args.transcripts), args.concurrency,
+                        args.think_time, args.stream, args.use_cache, args.sample_every)
+    finally:
+        if server is not None:
+            server.stop()
+
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"saved {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
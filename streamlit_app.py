@@ -1,8 +1,40 @@
+import uuid
+
 import streamlit as st
-from app.interviewer import answer_turn, InterviewerFactory
+from app.interviewer import answer_turn_stream, regenerate_turn_stream, InterviewerFactory
 from app.auth import check_password
-from app.security import validate_input, wrap_user_input
-from app.cost_tracker import count_tokens, calculate_cost, format_cost
+from app.security import validate_input, wrap_user_input, unwrap_user_input
+from app.session_store import get_session_storage
+from app.config import Config
+from app.cost_tracker import CostLedger, format_cost, pricing_info
+from app.response_cache import get_response_cache
+from app.prefetch import OpeningPrefetch
+from app.prompts import available_techniques, prefix_cache_stats
+from app.resilience import CircuitOpenError
+from app.scheduler import QueueTimeoutError
+from app.question_bank import get_question_bank
+from app.telemetry import configure_logging, start_exporters, telemetry
+from app.transcript import TranscriptArchive
+from app.usage_ledger import ANONYMOUS, BudgetExceededError, get_usage_ledger
+from app.warmup import warm_up
+
+# All once per process (the script itself reruns on every interaction)
+configure_logging()
+start_exporters()
+Config.validate()
+if Config.WARMUP_ENABLED:
+    # Tokenizers, blocklist and the OpenAI client load while the page renders
+    warm_up()
+
+# Shown when there is no opening question (yet)
+GREETING = "Hi, I am your interviewer. Ready to go?"
+
+# Transcript: messages rendered live on each rerun; older ones are frozen
+# into pages of TRANSCRIPT_PAGE_SIZE, shown on demand
+TRANSCRIPT_RECENT_MESSAGES = 12
+TRANSCRIPT_PAGE_SIZE = 20
+# How often the cost panel refreshes itself (seconds)
+METRICS_REFRESH_SECONDS = 2
 
 # ==================== PASSWORD PROTECTION ====================
 if not check_password():
@@ -18,13 +50,48 @@ st.set_page_config(
 
 st.title("🤖 Interview Practice bot")
 
+# ==================== SESSION STORAGE ====================
+# By default the interviewer lives in st.session_state. With a persistent
+# SESSION_STORE it lives in a process-wide store under a session id kept in
+# the URL, so the interview survives a page reload or a server restart.
+# peek() reads the interviewer without keeping it in memory (for panels
+# that refresh on a timer).
+session_storage = get_session_storage()
+if session_storage is None:
+    storage, storage_key = st.session_state, "interviewer"
+    peek = storage.get
+else:
+    storage = session_storage
+    peek = session_storage.peek
+    if "sid" not in st.query_params:
+        st.query_params["sid"] = uuid.uuid4().hex
+    storage_key = st.query_params["sid"]
+    session_storage.evict_idle()
+
+    # New browser session for a stored interview: restore it
+    if "interviewer_settings" not in st.session_state and storage_key in storage:
+        restored = storage[storage_key]
+        st.session_state.interviewer_settings = restored.get_settings()
+        st.session_state.messages = [
+            {"role": "assistant", "content": "Welcome back! Let's continue."}
+        ] + [
+            {"role": m["role"], "content": unwrap_user_input(m["content"])}
+            for m in restored.messages[1:]
+        ]
+
 # ==================== INITIALIZE SESSION STATE ====================
-if "total_cost" not in st.session_state:
-    st.session_state.total_cost = 0.0
-if "total_input_tokens" not in st.session_state:
-    st.session_state.total_input_tokens = 0
-if "total_output_tokens" not in st.session_state:
-    st.session_state.total_output_tokens = 0
+# Whose budget turns count against (app.usage_ledger): the user an auth
+# proxy in front of the app names in USAGE_USER_HEADER. Without one, each
+# browser session is its own user, so one visitor cannot use up a per-user
+# cap shared by everyone (a reload starts a new one: reliable per-user
+# caps need the header)
+if "visitor_id" not in st.session_state:
+    st.session_state.visitor_id = f"{ANONYMOUS}-{uuid.uuid4().hex[:12]}"
+user_id = st.context.headers.get(Config.USAGE_USER_HEADER) or st.session_state.visitor_id
+
+# Tokens and cost of this browser session, filled in by post-turn jobs
+if "cost_ledger" not in st.session_state:
+    st.session_state.cost_ledger = CostLedger()
 if "session_messages" not in st.session_state:
     st.session_state.session_messages = 0
 
@@ -38,35 +105,46 @@ if "interviewer_settings" not in st.session_state:
 
 if "messages" not in st.session_state:
     st.session_state.messages = [
-        {"role": "assistant", "content": "Hi, I am your interviewer. Ready to go?"}
+        {"role": "assistant", "content": GREETING}
     ]
 
 # ==================== SIDEBAR ====================
-with st.sidebar:
+# Sidebar sections are fragments: editing a setting or refreshing the cost
+# metrics reruns only that section, not the whole chat.
+
+@st.fragment
+def settings_panel():
     st.header("Setup for the interview bot")
 
+    # Widget values are kept in st.session_state under these keys, where
+    # the chat below reads them
     job_role = st.text_input(
         "Job role (e.g., 'Python Backend Engineer at Google')",
-        value=st.session_state.interviewer_settings["job_role"]
+        value=st.session_state.interviewer_settings["job_role"],
+        key="job_role"
     )
     skills = st.text_input(
         "Skills to focus on (e.g., 'Django, REST, SQL')",
-        value=st.session_state.interviewer_settings["skills"]
+        value=st.session_state.interviewer_settings["skills"],
+        key="skills"
     )
     difficulty = st.selectbox(
         "Difficulty level",
         ["Easy", "Medium", "Hard"],
         index=["Easy", "Medium", "Hard"].index(
             st.session_state.interviewer_settings["difficulty"]
-        )
+        ),
+        key="difficulty"
     )
 
+    techniques = available_techniques()
     prompt_technique = st.selectbox(
         "Prompt Technique",
-        ["Zero-shot", "Few-shot", "Chain-of-Thought", "Dynamic", "Least-to-Most"],
-        index=["Zero-shot", "Few-shot", "Chain-of-Thought", "Dynamic", "Least-to-Most"].index(
+        techniques,
+        index=techniques.index(
             st.session_state.interviewer_settings["technique"]
-        )
+        ),
+        key="technique"
     )
 
     st.divider()
@@ -77,7 +155,15 @@ with st.sidebar:
         max_value=2.0,
         value=0.7,
         step=0.1,
-        help="Lower = more focused, Higher = more creative/varied"
+        help="Lower = more focused, Higher = more creative/varied",
+        key="temperature"
+    )
+    st.checkbox(
+        "Reuse cached responses",
+        value=True,
+        help="Identical requests (e.g. the opening question for the same settings) "
+             "are answered from cache. Untick for varied answers.",
+        key="use_cache"
     )
 
     # Settings change detection
@@ -89,16 +175,59 @@ with st.sidebar:
     }
     
     if current_settings != st.session_state.interviewer_settings:
+        # A prefetched opening for the old settings won't be used
+        prefetch = st.session_state.get("opening_prefetch")
+        if prefetch is not None and not prefetch.matches(current_settings):
+            prefetch.cancel()
         st.warning("⚠️ Settings changed! Click 'Reset Interview' to apply.")
         if st.button("🔄 Reset Interview"):
             st.session_state.interviewer_settings = current_settings
-            InterviewerFactory.reset(st.session_state, "interviewer")
-            st.session_state.messages = [
-                {"role": "assistant", "content": "Hi, I am your interviewer. Ready to go?"}
-            ]
+            InterviewerFactory.reset(storage, storage_key)
+            if Config.OPENING_PREFETCH_ENABLED:
+                # The opening question is fetched in the background (question
+                # bank first, then the live model) and streamed into the chat
+                st.session_state.opening_prefetch = OpeningPrefetch.start(
+                    current_settings, temperature, st.session_state.use_cache,
+                    user_id=user_id
+                )
+                st.session_state.messages = []
+            else:
+                greeting = GREETING
+                if get_question_bank() is not None:
+                    # Open with a real question: instant from the question bank,
+                    # or from the live model if these settings aren't in it
+                    with st.spinner("Preparing your first question..."):
+                        try:
+                            _, opening, _ = InterviewerFactory.open_interview(
+                                storage, storage_key, temperature=temperature,
+                                user_id=user_id, use_cache=st.session_state.use_cache,
+                                **current_settings
+                            )
+                        except BudgetExceededError:
+                            # Over budget: the plain greeting, no live question
+                            opening = None
+                    greeting = opening or greeting
+                st.session_state.messages = [
+                    {"role": "assistant", "content": greeting}
+                ]
+            # The transcript changed: rerun the whole app
             st.rerun()
 
-    # Cost tracking display
+
+@st.fragment(run_every=METRICS_REFRESH_SECONDS)
+def usage_panel():
+    # Cost tracking display; the ledger is updated in the background, so
+    # this refreshes on its own
+    cost_ledger = st.session_state.cost_ledger
+    # Not storage[...]: polling must not keep an idle session in memory
+    interviewer = peek(storage_key)
+    if interviewer is not None:
+        # Answer scores arrive after the turn; their grading cost with them
+        for answer, evaluation in list(interviewer.evaluations.items()):
+            if evaluation.usage is not None:
+                cost_ledger.record((interviewer.session_id, answer.serial, "score"),
+                                   evaluation.usage)
+    ledger = cost_ledger.snapshot()
     st.divider()
     st.subheader("💰 Cost Tracking")
 
@@ -107,7 +236,7 @@ with st.sidebar:
     with col1:
         st.metric(
             "Total Cost",
-            format_cost(st.session_state.total_cost),
+            format_cost(ledger["cost"]),
             help="Estimated API cost for this session"
         )
     
@@ -119,29 +248,187 @@ with st.sidebar:
         )
     
     with st.expander("📊 Token Details"):
-        st.write(f"**Input tokens:** {st.session_state.total_input_tokens:,}")
-        st.write(f"**Output tokens:** {st.session_state.total_output_tokens:,}")
-        st.write(f"**Total tokens:** {st.session_state.total_input_tokens + st.session_state.total_output_tokens:,}")
+        st.write(f"**Input tokens:** {ledger['input_tokens']:,}")
+        st.write(f"**Output tokens:** {ledger['output_tokens']:,}")
+        st.write(f"**Total tokens:** {ledger['input_tokens'] + ledger['output_tokens']:,}")
+
+        report = interviewer.last_context_report if interviewer else None
+        if report:
+            st.write(f"**Context last turn:** {report.tokens_after:,} tokens "
+                     f"(history {report.tokens_before:,})")
+        route = interviewer.last_route if interviewer else None
+        if route:
+            st.write(f"**Model last turn:** {route.model} ({route.reason})")
+
+        usage_ledger = get_usage_ledger()
+        if usage_ledger.budget_usd or usage_ledger.user_budget_usd:
+            spent_total, spent_mine = usage_ledger.spent_today(user_id)
+            if usage_ledger.budget_usd:
+                st.write(f"**Spent today (all users):** {format_cost(spent_total)} "
+                         f"of {format_cost(usage_ledger.budget_usd)}")
+            if usage_ledger.user_budget_usd:
+                st.write(f"**Spent today (you):** {format_cost(spent_mine)} "
+                         f"of {format_cost(usage_ledger.user_budget_usd)}")
+
+        for model_name, used in ledger["by_model"].items():
+            st.caption(f"{model_name}: {format_cost(used['cost'])} over {used['turns']} turns "
+                       f"({used['input_tokens']:,} in / {used['output_tokens']:,} out)")
         
+        cache_stats = get_response_cache().stats()
+        st.caption(f"Response cache: {cache_stats['hits'] + cache_stats['coalesced']} hits, "
+                   f"{cache_stats['misses']} misses, {cache_stats['evictions']} evictions")
+        st.caption(f"Prompt prefix cache hit rate: {prefix_cache_stats.hit_rate():.0%}")
+        bank = get_question_bank()
+        if bank is not None:
+            st.caption(f"Question bank hit rate: {bank.stats()['hit_rate']:.0%}")
+
         st.divider()
-        model = "gpt-4o-mini"
-        st.caption(f"**Pricing ({model}):**")
-        st.caption("• Input: $0.150/1M tokens")
-        st.caption("• Output: $0.600/1M tokens")
+        for model_name in dict.fromkeys([Config.MODEL_NAME, *ledger["by_model"]]):
+            prices = pricing_info(model_name)
+            st.caption(f"**Pricing ({model_name}):**")
+            st.caption(f"• Input: {prices['input']} (cached: {prices['cached_input']})")
+            st.caption(f"• Output: {prices['output']}")
+
+    # Scores of the latest answer, graded in the background
+    evaluations = interviewer.branch_evaluations() if interviewer is not None else {}
+    if evaluations:
+        evaluation = evaluations[max(evaluations)]
+        with st.expander(f"📝 Last answer: {evaluation.overall:.1f}/5"):
+            st.write(f"**Accuracy:** {evaluation.accuracy}/5 · **Depth:** {evaluation.depth}/5 · "
+                     f"**Relevance:** {evaluation.relevance}/5")
+            if evaluation.feedback:
+                st.caption(evaluation.feedback)
     
     if st.button("🔄 Reset Usage Stats"):
-        st.session_state.total_cost = 0.0
-        st.session_state.total_input_tokens = 0
-        st.session_state.total_output_tokens = 0
+        st.session_state.cost_ledger.reset()
         st.session_state.session_messages = 0
         st.success("Usage stats reset!")
+        st.rerun(scope="fragment")
+
+
+def show_branch(interviewer):
+    """Replaces the transcript with the interviewer's current branch"""
+    messages = [{"role": m["role"], "content": unwrap_user_input(m["content"])}
+                for m in interviewer.messages[1:]]
+    if not messages or messages[0]["role"] != "assistant":
+        messages.insert(0, {"role": "assistant", "content": GREETING})
+    st.session_state.messages = messages
+
+
+def branch_panel():
+    # Earlier versions of the conversation (from "Ask another question" or
+    # "Answer again"); they share everything before the point they differ
+    interviewer = storage.get(storage_key)
+    if interviewer is None or len(interviewer.branches) < 2:
+        return
+    st.divider()
+    branch = st.selectbox(
+        "🌿 Conversation branch",
+        range(len(interviewer.branches)),
+        index=interviewer.branch,
+        format_func=lambda b: f"Branch {b + 1} ({len(interviewer.branches[b]) - 1} messages)",
+    )
+    if branch != interviewer.branch:
+        interviewer.switch_branch(branch)
+        InterviewerFactory.save(storage, storage_key)
+        show_branch(interviewer)
         st.rerun()
 
+
+with st.sidebar:
+    settings_panel()
+    branch_panel()
+    usage_panel()
+
 # ==================== CHAT INTERFACE ====================
+# Older messages are frozen into pre-rendered pages (see app.transcript),
+# shown on demand; only the recent turns are rendered on every rerun.
+if "transcript_archive" not in st.session_state:
+    st.session_state.transcript_archive = TranscriptArchive(TRANSCRIPT_PAGE_SIZE,
+                                                            TRANSCRIPT_RECENT_MESSAGES)
+
+
+@st.fragment
+def earlier_messages(archive: TranscriptArchive):
+    if not archive.pages:
+        return
+    if not st.toggle(f"Show {archive.archived_count} earlier messages", key="show_earlier"):
+        return
+    page = len(archive.pages)
+    if page > 1:
+        page = st.select_slider("Page", options=list(range(1, len(archive.pages) + 1)),
+                                value=page, key="earlier_page")
+    with st.container(border=True):
+        st.markdown(archive.pages[page - 1])
+
+
 # Render chat messages
-for message in st.session_state.messages:
-    with st.chat_message(message["role"]):
-        st.markdown(message["content"])
+with telemetry.span("render"):
+    archive = st.session_state.transcript_archive
+    live_from = archive.sync(st.session_state.messages)
+    earlier_messages(archive)
+    for message in st.session_state.messages[live_from:]:
+        with st.chat_message(message["role"]):
+            st.markdown(message["content"])
+
+# Opening question prefetched after a reset: show what has arrived so far
+# and follow the rest of the stream, then take over its interviewer
+prefetch = st.session_state.get("opening_prefetch")
+if prefetch is not None:
+    with st.chat_message("assistant"):
+        if prefetch.cancelled:
+            opening = None
+        else:
+            st.write_stream(prefetch.stream())
+            opening = prefetch.claim(storage, storage_key)
+        if opening is None:
+            st.markdown(GREETING)
+    st.session_state.messages.append({"role": "assistant", "content": opening or GREETING})
+    st.session_state.opening_prefetch = None
+
+def answer_again(interviewer):
+    # New branch without the last answer and the reply to it
+    interviewer.fork(len(interviewer.messages) - 2)
+    InterviewerFactory.save(storage, storage_key)
+    show_branch(interviewer)
+
+
+def record_turn(interviewer):
+    # Token usage for the whole request (history included) is worked out by
+    # a post-turn job (API counts if given, priced at the model that
+    # answered) and lands in the ledger; the cost panel picks it up
+    if interviewer.last_usage is not None:
+        st.session_state.cost_ledger.record_when_done(
+            (interviewer.session_id, interviewer.history.head.serial), interviewer.last_usage
+        )
+    st.session_state.session_messages += 1
+
+
+# Retry controls for the latest question
+interviewer = storage.get(storage_key)
+if prefetch is None and interviewer is not None and interviewer.messages[-1]["role"] == "assistant":
+    col1, col2 = st.columns(2)
+    regenerate = col1.button("🔁 Ask another question")
+    col2.button("✏️ Answer again", disabled=len(interviewer.messages) < 4,
+                on_click=answer_again, args=(interviewer,),
+                help="Go back to the previous question and answer it differently")
+    if regenerate:
+        # The new question replaces the last one, on a new branch
+        st.session_state.messages.pop()
+        try:
+            with st.chat_message("assistant"):
+                question = st.write_stream(regenerate_turn_stream(
+                    storage, storage_key=storage_key,
+                    temperature=st.session_state.temperature, user_id=user_id
+                ))
+        except (QueueTimeoutError, CircuitOpenError, BudgetExceededError) as e:
+            show_branch(interviewer)
+            st.error(str(e) if isinstance(e, BudgetExceededError)
+                     else "The interviewer is busy right now. Please try again in a moment.")
+            st.stop()
+        record_turn(interviewer)
+        st.session_state.messages.append({"role": "assistant", "content": question})
+        st.rerun()
 
 # Chat input
 prompt = st.chat_input("Type your message here...")
@@ -161,31 +448,31 @@ if prompt:
     with st.chat_message("user"):
         st.markdown(prompt)
     
-    # Count input tokens
-    input_tokens = count_tokens(wrapped_prompt, model="gpt-4o-mini")
-    
-    # Get AI response
-    bot_reply = answer_turn(
-        storage=st.session_state,
-        user_message=wrapped_prompt,
-        job_role=job_role,
-        skills=skills,
-        difficulty=difficulty,
-        technique=prompt_technique,
-        temperature=temperature
-    )
+    # Get AI response, rendering it token by token as it arrives
+    try:
+        with st.chat_message("assistant"):
+            bot_reply = st.write_stream(answer_turn_stream(
+                storage=storage,
+                storage_key=storage_key,
+                user_message=wrapped_prompt,
+                job_role=st.session_state.job_role,
+                skills=st.session_state.skills,
+                difficulty=st.session_state.difficulty,
+                technique=st.session_state.technique,
+                temperature=st.session_state.temperature,
+                use_cache=st.session_state.use_cache,
+                user_id=user_id
+            ))
+    except (QueueTimeoutError, CircuitOpenError):
+        st.session_state.messages.pop()
+        st.error("The interviewer is busy right now. Please try again in a moment.")
+        st.stop()
+    except BudgetExceededError as e:
+        st.session_state.messages.pop()
+        st.error(f"{e}. Please come back tomorrow.")
+        st.stop()
 
-    # Calculate output tokens and cost
-    output_tokens = count_tokens(bot_reply, model="gpt-4o-mini")
-    turn_cost = calculate_cost(input_tokens, output_tokens, model="gpt-4o-mini")
-    
-    # Update tracking
-    st.session_state.total_input_tokens += input_tokens
-    st.session_state.total_output_tokens += output_tokens
-    st.session_state.total_cost += turn_cost
-    st.session_state.session_messages += 1
+    record_turn(storage[storage_key])
 
-    # Display AI response
+    # Keep AI response in the transcript
     st.session_state.messages.append({"role": "assistant", "content": bot_reply})
-    with st.chat_message("assistant"):
-        st.markdown(bot_reply)
@@ -0,0 +1,45 @@
+# Shared fixtures. Tests run without a real API key or network: model calls
+# go to tools.fake_openai_server.
+import os
+
+# Before app.config is first read (settings are parsed on first access)
+os.environ.setdefault("OPENAI_API_KEY", "test")
+os.environ.setdefault("CONTEXT_SUMMARY_MODE", "marker")
+os.environ.setdefault("RESPONSE_CACHE_ENABLED", "0")
+os.environ.setdefault("LENGTH_GOVERNOR_HOLDOUT", "0")
+os.environ.setdefault("RETRY_BASE_DELAY", "0.01")
+
+import pytest  # noqa: E402
+
+from tools.fake_openai_server import FakeBehaviour, FakeOpenAIServer  # noqa: E402
+
+
+@pytest.fixture(scope="session", autouse=True)
+def _fake_server():
+    # One server for the whole run, started before any test can create the
+    # shared clients (they keep the base URL they were created with)
+    with FakeOpenAIServer(FakeBehaviour(reply_words=12, seed=0)) as server:
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+        yield server
+
+
+@pytest.fixture
+def fake_openai(_fake_server, monkeypatch):
+    """
+    The fake OpenAI server, with default behaviour for this test, and
+    fresh breakers (no hedging or backups unless a test sets them up)
+    """
+    from app import resilience
+    monkeypatch.setattr(resilience, "_resilience",
+                        resilience.Resilience(hedge_enabled=False, fallback_models=[]))
+    _fake_server.behaviour = FakeBehaviour(reply_words=12, seed=0)
+    return _fake_server
+
+
+@pytest.fixture
+def usage_ledger(monkeypatch):
+    """A fresh in-process usage ledger in place of the shared one"""
+    from app import usage_ledger as module
+    ledger = module.UsageLedger(":memory:", flush_interval=60, budget_usd=0, user_budget_usd=0)
+    monkeypatch.setattr(module, "_ledger", ledger)
+    return ledger
@@ -0,0 +1,64 @@
+import asyncio
+
+import openai
+
+from app import client_registry
+from app.ai_client import AIClient, AsyncAIClient, ChatResult, get_ai_client
+from app.messages import USER, Message
+
+MESSAGES = [Message(USER, "Tell me about yourself")]
+
+
+def spy_on_close(monkeypatch, cls):
+    closed = []
+    original = cls.close
+
+    if asyncio.iscoroutinefunction(original):
+        async def close(self):
+            closed.append(self)
+            await original(self)
+    else:
+        def close(self):
+            closed.append(self)
+            original(self)
+    monkeypatch.setattr(cls, "close", close)
+    return closed
+
+
+def test_stream_closed_when_consumer_stops_early(fake_openai, monkeypatch):
+    fake_openai.behaviour.reply_words = 200
+    closed = spy_on_close(monkeypatch, openai.Stream)
+    stream = AIClient().stream_chat_completion(MESSAGES, use_cache=False)
+    assert next(stream)
+    stream.close()
+    assert len(closed) == 1
+
+
+def test_async_stream_closed_when_consumer_stops_early(fake_openai, monkeypatch):
+    fake_openai.behaviour.reply_words = 200
+    closed = spy_on_close(monkeypatch, openai.AsyncStream)
+
+    async def run():
+        stream = AsyncAIClient().stream_chat_completion(MESSAGES)
+        assert await stream.__anext__()
+        await stream.aclose()
+
+    asyncio.run(run())
+    assert len(closed) == 1
+
+
+def test_stream_fills_result(fake_openai):
+    result = ChatResult()
+    text = "".join(AIClient().stream_chat_completion(MESSAGES, result=result, use_cache=False))
+    assert text and result.text == text
+    assert result.finish_reason == "stop" and result.usage is not None
+
+
+def test_clients_share_one_pool_and_survive_close(fake_openai):
+    ai = get_ai_client()
+    assert AIClient().client is ai.client is client_registry.get_client()
+    old = ai.client
+    client_registry.close_clients()
+    # The shared AIClient picks up a fresh client instead of the closed one
+    assert ai.client is not old
+    assert ai.complete(MESSAGES, use_cache=False).text
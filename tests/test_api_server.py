@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pytest
+
+from app.ai_client import AsyncAIClient
+from app import api_server
+from app.api_server import InterviewAPI
+from app.cost_tracker import TurnUsage
+from app.question_bank import QuestionBankIndex, make_record
+from app.session_store import InMemoryBackend, SessionStorage
+
+SESSION = {"job_role": "Backend Developer", "skills": "Python",
+           "difficulty": "Medium", "technique": "Zero-shot"}
+
+
+async def request(port, method, path, body=None, headers=None):
+    """One request on a fresh connection; returns (status, headers, body)"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    payload = json.dumps(body or {}).encode()
+    extra = "".join(f"{name}: {value}\r\n" for name, value in (headers or {}).items())
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nConnection: close\r\n{extra}"
+                 f"Content-Type: application/json\r\nContent-Length: {len(payload)}\r\n\r\n"
+                 .encode() + payload)
+    head, _, rest = (await reader.read()).partition(b"\r\n\r\n")
+    writer.close()
+    lines = head.decode().split("\r\n")
+    fields = dict(line.split(": ", 1) for line in lines[1:])
+    return int(lines[0].split(" ", 2)[1]), fields, rest
+
+
+def events(body):
+    """Server-sent events as (event, data) pairs"""
+    parsed = []
+    for block in body.decode().split("\n\n"):
+        if block:
+            event, data = block.split("\n", 1)
+            parsed.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+
+def run_api(scenario):
+    """Runs scenario(port) against a fresh API on a free port"""
+    async def main():
+        api = InterviewAPI(SessionStorage(InMemoryBackend()), AsyncAIClient())
+        ready = asyncio.Event()
+        server = asyncio.create_task(api.serve("127.0.0.1", 0, ready))
+        await ready.wait()
+        try:
+            return await scenario(api.address[1])
+        finally:
+            server.cancel()
+    return asyncio.run(main())
+
+
+@pytest.fixture
+def api_env(fake_openai, usage_ledger):
+    """The fake OpenAI server, with turns billed to a fresh ledger"""
+    return fake_openai
+
+
+def test_streamed_turn(api_env):
+    async def scenario(port):
+        status, _, body = await request(port, "POST", "/sessions", SESSION)
+        created = json.loads(body)
+        assert status == 201 and created["opening_source"] == "live" and created["opening"]
+        sid = created["session_id"]
+
+        status, headers, body = await request(port, "POST", f"/sessions/{sid}/turns",
+                                              {"message": "I use asyncio.", "stream": True})
+        assert status == 200 and headers["Content-Type"] == "text/event-stream"
+        received = events(body)
+        *deltas, (last, done) = received
+        assert deltas and all(event == "delta" for event, _ in deltas)
+        assert last == "done"
+        assert done["reply"] == "".join(data["text"] for _, data in deltas)
+        assert done["usage"]["output_tokens"] > 0
+
+        status, _, body = await request(port, "GET", f"/sessions/{sid}")
+        messages = json.loads(body)["messages"]
+        assert [m["role"] for m in messages] == ["assistant", "user", "assistant"]
+        assert messages[1]["content"] == "I use asyncio."
+        assert messages[2]["content"] == done["reply"]
+
+    run_api(scenario)
+
+
+def test_plain_turn_and_errors(api_env):
+    async def scenario(port):
+        status, _, body = await request(port, "POST", "/sessions", {**SESSION, "open": False})
+        sid = json.loads(body)["session_id"]
+        status, _, body = await request(port, "POST", f"/sessions/{sid}/turns",
+                                        {"message": "Hello"})
+        assert status == 200 and json.loads(body)["reply"]
+
+        assert (await request(port, "POST", "/sessions/nope/turns", {"message": "Hi"}))[0] == 404
+        assert (await request(port, "POST", "/sessions", {**SESSION, "difficulty": "Huge"}))[0] == 400
+        assert (await request(port, "GET", "/sessions"))[0] == 405
+
+    run_api(scenario)
+
+
+def test_upstream_failure_is_an_error_event(api_env):
+    async def scenario(port):
+        status, _, body = await request(port, "POST", "/sessions", {**SESSION, "open": False})
+        sid = json.loads(body)["session_id"]
+        api_env.behaviour.error_rate = 1.0
+        status, _, body = await request(port, "POST", f"/sessions/{sid}/turns",
+                                        {"message": "Hello", "stream": True})
+        assert status == 200
+        assert events(body)[-1] == ("error", {"error": "Model request failed (InternalServerError)",
+                                              "status": 502})
+
+    run_api(scenario)
+
+
+def test_turn_over_budget_is_rejected(api_env, usage_ledger):
+    usage_ledger.user_budget_usd = 1.0
+    usage_ledger.record("alice", "Zero-shot", TurnUsage(10_000_000, 0, "gpt-4.1-mini", "api"))
+
+    async def scenario(port):
+        status, _, body = await request(port, "POST", "/sessions", {**SESSION, "open": False})
+        sid = json.loads(body)["session_id"]
+        before = api_env.stats["requests"]
+        status, headers, _ = await request(port, "POST", f"/sessions/{sid}/turns",
+                                           {"message": "Hello", "stream": True},
+                                           {"X-Forwarded-User": "alice"})
+        assert status == 429 and int(headers["Retry-After"]) > 0
+        assert api_env.stats["requests"] == before
+
+    run_api(scenario)
+
+
+def test_opening_from_the_bank(api_env, monkeypatch):
+    record = make_record(*SESSION.values(), "What is the GIL?", ["And asyncio?"], "gpt-4.1-mini")
+    monkeypatch.setattr(api_server, "get_question_bank", lambda: QuestionBankIndex([record]))
+
+    async def scenario(port):
+        before = api_env.stats["requests"]
+        created = json.loads((await request(port, "POST", "/sessions", SESSION))[2])
+        assert created["opening_source"] == "bank"
+        assert created["opening"] == "What is the GIL?"
+        assert created["follow_ups"] == ["And asyncio?"]
+        assert api_env.stats["requests"] == before
+
+        # A varied opening is asked of the model instead
+        created = json.loads((await request(port, "POST", "/sessions",
+                                            {**SESSION, "use_cache": False}))[2])
+        assert created["opening_source"] == "live" and created["follow_ups"] == []
+
+    run_api(scenario)
@@ -0,0 +1,62 @@
+import pytest
+
+from app.batch_generate import load_checkpoint, parse_follow_ups, run
+from app.question_bank import open_store, settings_key
+
+COMBOS = [("Backend Developer", "Python", "Medium", "Zero-shot"),
+          ("Data Analyst", "SQL", "Easy", "Zero-shot"),
+          ("Site Reliability Engineer", "Kubernetes", "Hard", "Zero-shot")]
+
+
+def stored(path):
+    store = open_store(str(path))
+    try:
+        return {record["key"]: record for record in store.load()}
+    finally:
+        store.close()
+
+
+def test_parse_follow_ups():
+    text = "- What broke first?\n\n* How did you find it?\n\tWhat would you change?\nFourth?"
+    assert parse_follow_ups(text, 3) == ["What broke first?", "How did you find it?",
+                                         "What would you change?"]
+    assert parse_follow_ups("", 3) == []
+
+
+@pytest.mark.parametrize("name", ["bank.jsonl", "bank.db"])
+def test_run_stores_records_and_resumes(fake_openai, usage_ledger, tmp_path, name):
+    out, checkpoint = tmp_path / name, str(tmp_path / "bank.checkpoint")
+    stats = run(COMBOS[:2], str(out), checkpoint, workers=2, follow_ups=2, temperature=0.7)
+    assert stats == {"generated": 2, "failed": 0, "skipped": 0}
+    assert load_checkpoint(checkpoint) == {settings_key(*c) for c in COMBOS[:2]}
+
+    # Only the combination not yet done is generated (opening and follow-ups)
+    before = fake_openai.stats["requests"]
+    stats = run(COMBOS, str(out), checkpoint, workers=2, follow_ups=2, temperature=0.7)
+    assert stats == {"generated": 1, "failed": 0, "skipped": 2}
+    assert fake_openai.stats["requests"] - before == 2
+
+    records = stored(out)
+    assert set(records) == {settings_key(*c) for c in COMBOS}
+    record = records[settings_key(*COMBOS[2])]
+    assert record["opening"] and record["technique"] == "Zero-shot"
+    assert 1 <= len(record["follow_ups"]) <= 2
+
+
+def test_failed_combinations_are_not_checkpointed(fake_openai, usage_ledger, tmp_path):
+    fake_openai.behaviour.error_rate = 1.0
+    out, checkpoint = str(tmp_path / "bank.jsonl"), str(tmp_path / "bank.checkpoint")
+    stats = run(COMBOS[:1], out, checkpoint, workers=1, follow_ups=0, temperature=0.7)
+    assert stats == {"generated": 0, "failed": 1, "skipped": 0}
+    assert load_checkpoint(checkpoint) == set()
+    assert stored(out) == {}
+
+
+def test_structured_follow_ups_keep_only_questions(fake_openai, usage_ledger, tmp_path):
+    combo = ("Backend Developer", "Python", "Medium", "Chain-of-Thought")
+    out, checkpoint = str(tmp_path / "bank.jsonl"), str(tmp_path / "bank.checkpoint")
+    run([combo], out, checkpoint, workers=1, follow_ups=3, temperature=0.7)
+    record = stored(out)[settings_key(*combo)]
+    assert record["follow_ups"]
+    for question in [record["opening"]] + record["follow_ups"]:
+        assert "[" not in question and "reason about" not in question
@@ -0,0 +1,117 @@
+import pytest
+
+from app.cost_tracker import TurnUsage
+from app.interviewer import InterviewerFactory, answer_turn_stream, regenerate_turn_stream
+from app.prefetch import OpeningPrefetch
+from app.usage_ledger import ANONYMOUS, BudgetExceededError, UsageLedger, current_hour, main
+
+SETTINGS = {"job_role": "Backend Developer", "skills": "Python",
+            "difficulty": "Medium", "technique": "Zero-shot"}
+
+
+def spend(ledger, user, dollars=1.0):
+    # gpt-4.1-mini input is well under $1 per million tokens
+    ledger.record(user, "Zero-shot", TurnUsage(int(dollars * 10_000_000), 0, "gpt-4.1-mini", "api"))
+
+
+def test_per_user_and_global_caps(usage_ledger):
+    usage_ledger.user_budget_usd = 1.0
+    spend(usage_ledger, "alice")
+    with pytest.raises(BudgetExceededError) as raised:
+        usage_ledger.check_budget("alice")
+    assert raised.value.scope == "user"
+    usage_ledger.check_budget("bob")
+
+    usage_ledger.budget_usd = 1.5
+    spend(usage_ledger, "bob")
+    with pytest.raises(BudgetExceededError) as raised:
+        usage_ledger.check_budget("carol")
+    assert raised.value.scope == "global"
+
+
+def test_spend_survives_flush(usage_ledger):
+    spend(usage_ledger, "alice", 0.5)
+    before = usage_ledger.spent_today("alice")
+    assert usage_ledger.flush() == 1
+    assert usage_ledger.spent_today("alice") == pytest.approx(before)
+    rows = usage_ledger.rollup(by=("user",))
+    assert [row["user"] for row in rows] == ["alice"]
+
+
+def test_stream_facades_check_budget_before_iteration(usage_ledger):
+    usage_ledger.user_budget_usd = 1.0
+    spend(usage_ledger, "alice")
+    storage = {}
+    with pytest.raises(BudgetExceededError):
+        answer_turn_stream(storage, "hello", user_id="alice", **SETTINGS)
+    with pytest.raises(BudgetExceededError):
+        regenerate_turn_stream(storage, user_id="alice")
+
+
+def test_turns_and_openings_are_billed_to_the_user(fake_openai, usage_ledger):
+    storage = {}
+    _, opening, source = InterviewerFactory.open_interview(
+        storage, "s", user_id="alice", **SETTINGS)
+    assert source == "live" and opening
+    "".join(answer_turn_stream(storage, "An answer", storage_key="s", **SETTINGS))
+    storage["s"].last_usage.result(timeout=5)
+
+    usage_ledger.flush()
+    users = {row["user"]: row["turns"] for row in usage_ledger.rollup(by=("user",))}
+    assert users == {"alice": 2}
+
+
+def test_live_opening_over_budget(fake_openai, usage_ledger):
+    usage_ledger.user_budget_usd = 1.0
+    spend(usage_ledger, "alice")
+    requests = fake_openai.stats["requests"]
+    with pytest.raises(BudgetExceededError):
+        InterviewerFactory.open_interview({}, "s", user_id="alice", **SETTINGS)
+    assert fake_openai.stats["requests"] == requests
+
+    prefetch = OpeningPrefetch.start(SETTINGS, user_id="alice")
+    assert prefetch.claim({}) is None
+    assert isinstance(prefetch.error, BudgetExceededError)
+
+    prefetch = OpeningPrefetch.start(SETTINGS, user_id=ANONYMOUS)
+    storage = {}
+    assert prefetch.claim(storage)
+    assert storage["interviewer"].user_id == ANONYMOUS
+
+
+def test_rollup_groups_and_filters(usage_ledger):
+    spend(usage_ledger, "alice", 0.2)
+    spend(usage_ledger, "alice", 0.2)
+    spend(usage_ledger, "bob", 0.1)
+    usage_ledger.record("bob", "Few-shot", TurnUsage(1000, 50, "gpt-4.1-nano", "api"))
+    today = current_hour()[:10]
+
+    rows = usage_ledger.rollup(by=("day", "user", "technique"))
+    assert [(r["day"], r["user"], r["technique"], r["turns"]) for r in rows] == [
+        (today, "alice", "Zero-shot", 2), (today, "bob", "Few-shot", 1),
+        (today, "bob", "Zero-shot", 1)]
+    assert [r["model"] for r in usage_ledger.rollup(user="bob")] == ["gpt-4.1-mini",
+                                                                      "gpt-4.1-nano"]
+    assert usage_ledger.rollup(by=("user",), since=today, until=today + "T99")
+    assert usage_ledger.rollup(by=("user",), until=today) == []
+    with pytest.raises(ValueError):
+        usage_ledger.rollup(by=("colour",))
+
+
+def test_processes_share_the_ledger_file(tmp_path, capsys):
+    path = str(tmp_path / "usage.db")
+    # Two ledgers on one file, as two processes would have
+    first = UsageLedger(path, flush_interval=60, budget_usd=0, user_budget_usd=0)
+    second = UsageLedger(path, flush_interval=60, budget_usd=0, user_budget_usd=0)
+    spend(first, "alice", 0.3)
+    spend(second, "alice", 0.3)
+    first.flush()
+    second.flush()
+    assert second.rollup(by=("user",))[0]["turns"] == 2
+    # The other process's spend counts from this one's next flush on
+    first.flush()
+    assert first.spent_today("alice") == pytest.approx(second.spent_today("alice"))
+
+    assert main(["--path", path, "--by", "user", "technique"]) == 0
+    line, = capsys.readouterr().out.splitlines()
+    assert line.startswith("alice Zero-shot") and "2 turns" in line
@@ -0,0 +1,75 @@
+from app.ai_client import ChatResult
+from app.context_window import SUMMARY_PREFIX, ContextWindow, make_llm_summarizer
+from app.messages import ASSISTANT, SYSTEM, USER, Message
+
+
+def conversation(turns):
+    messages = [Message(SYSTEM, "You are an interviewer.")]
+    for i in range(turns):
+        messages.append(Message(USER, f"answer {i} " + "word " * 40))
+        messages.append(Message(ASSISTANT, f"question {i} " + "word " * 40))
+    return messages
+
+
+class Summarizer:
+    """Records what it was asked to summarize; fails while `failing` is set"""
+
+    def __init__(self):
+        self.failing = False
+        self.seen = []
+
+    def __call__(self, previous, messages):
+        if self.failing:
+            raise RuntimeError("upstream down")
+        self.seen.extend(m["content"].split()[1] for m in messages if m["role"] == USER)
+        return f"{previous} covered {len(self.seen)}".strip()
+
+
+def build_and_wait(window, messages):
+    context, report = window.build(messages)
+    if window._pending is not None:
+        window._pending[1].exception(timeout=5)
+    return context, report
+
+
+def test_failed_summary_is_retried_with_the_same_messages():
+    summarize = Summarizer()
+    window = ContextWindow(token_budget=300, keep_recent_turns=1, summarizer=summarize)
+    messages = conversation(6)
+
+    summarize.failing = True
+    build_and_wait(window, messages)
+    assert window._cut == 0 and summarize.seen == []
+
+    summarize.failing = False
+    build_and_wait(window, messages)
+    context, report = window.build(messages)
+    # Every dropped answer made it into the summary, the first ones included
+    dropped = [m for m in messages[1:] if m not in context]
+    assert summarize.seen == [m["content"].split()[1] for m in dropped if m["role"] == USER]
+    assert summarize.seen[0] == "0"
+    assert context[1]["content"].startswith(SUMMARY_PREFIX) and report.summarized
+
+
+def test_summary_is_written_off_the_request_path():
+    summarize = Summarizer()
+    window = ContextWindow(token_budget=300, keep_recent_turns=1, summarizer=summarize)
+    messages = conversation(6)
+
+    context, report = window.build(messages)
+    # Until the summary is in, a marker stands in for the dropped turns
+    assert "omitted" in context[1]["content"] and not report.summarized
+    window._pending[1].result(timeout=5)
+    context, report = window.build(messages)
+    assert context[1]["content"].startswith(SUMMARY_PREFIX)
+
+
+def test_summarizer_usage_is_charged():
+    class AI:
+        def complete(self, messages, temperature=0.7, **kwargs):
+            return ChatResult(text="short summary", model="gpt-4.1-mini")
+
+    charged = []
+    summarize = make_llm_summarizer(AI(), charge=charged.append)
+    assert summarize("", conversation(1)[1:]) == "short summary"
+    assert len(charged) == 1 and charged[0].input_tokens > 0 and charged[0].cost > 0
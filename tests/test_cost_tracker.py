@@ -0,0 +1,124 @@
+import threading
+from collections import OrderedDict
+from types import SimpleNamespace
+
+from app import cost_tracker
+from app.cost_tracker import (REPLY_PRIMING_TOKENS, TOKENS_PER_MESSAGE, CostLedger,
+                              HistoryTokenCounter, TokenAccountant, TurnUsage,
+                              count_message_tokens, count_prompt_tokens, count_tokens)
+from app.messages import ASSISTANT, SYSTEM, USER, Message
+
+MODEL = "gpt-4.1-mini"
+
+
+def counting_calls(monkeypatch):
+    """Counts texts actually tokenized from here on"""
+    calls = []
+    original = cost_tracker.count_tokens
+
+    def count(text, model="gpt-4o-mini"):
+        calls.append(text)
+        return original(text, model)
+    monkeypatch.setattr(cost_tracker, "count_tokens", count)
+    return calls
+
+
+def history(n):
+    return [Message(SYSTEM, "You are an interviewer.")] + [
+        Message(USER if i % 2 else ASSISTANT, f"message number {i} " * (i + 1))
+        for i in range(n)]
+
+
+def test_message_counts_are_memoized_by_identity(monkeypatch):
+    calls = counting_calls(monkeypatch)
+    message = Message(USER, "Tell me about a hard bug you fixed.")
+    expected = TOKENS_PER_MESSAGE + count_tokens(message.content, MODEL)
+    assert count_message_tokens(message, MODEL) == expected
+    assert count_message_tokens(message, MODEL) == expected
+    assert len(calls) == 1
+
+    # An equal but different message, and the same message with new
+    # content, are counted again
+    assert count_message_tokens(Message(USER, message.content), MODEL) == expected
+    message.content = "Shorter."
+    assert count_message_tokens(message, MODEL) == TOKENS_PER_MESSAGE + count_tokens("Shorter.", MODEL)
+    assert len(calls) == 3
+
+
+def test_mutated_dict_message_is_recounted():
+    message = {"role": USER, "content": "one"}
+    first = count_message_tokens(message, MODEL)
+    message["content"] = "one two three four five six seven eight nine ten"
+    assert count_message_tokens(message, MODEL) > first
+
+
+def test_memo_stays_bounded(monkeypatch):
+    monkeypatch.setattr(cost_tracker, "_message_memo", OrderedDict())
+    monkeypatch.setattr(cost_tracker, "_MESSAGE_MEMO_SIZE", 5)
+    for message in history(20):
+        count_message_tokens(message, MODEL)
+    assert len(cost_tracker._message_memo) <= 5
+
+
+def test_history_counter_only_counts_new_messages(monkeypatch):
+    messages = history(6)
+    counter = HistoryTokenCounter(MODEL)
+    assert counter.update(messages[:4]) + REPLY_PRIMING_TOKENS == \
+        count_prompt_tokens(messages[:4], MODEL)
+
+    calls = counting_calls(monkeypatch)
+    counter.update(messages)
+    assert calls == [m.content for m in messages[4:]]
+    assert counter.prompt_tokens == count_prompt_tokens(messages, MODEL)
+
+
+def test_history_counter_recounts_replaced_or_trimmed_history():
+    messages = history(6)
+    counter = HistoryTokenCounter(MODEL)
+    counter.update(messages)
+    # Trimmed (e.g. a regenerated turn)
+    assert counter.update(messages[:3]) == count_prompt_tokens(messages[:3], MODEL) - REPLY_PRIMING_TOKENS
+    # Same length, different messages (another branch)
+    other = messages[:2] + history(1)[1:]
+    assert counter.update(other) == count_prompt_tokens(other, MODEL) - REPLY_PRIMING_TOKENS
+    assert len(counter.sizes) == 3
+
+
+def test_counts_agree_across_threads():
+    messages = history(30)
+    expected = count_prompt_tokens(messages, MODEL)
+    cost_tracker._message_memo.clear()
+    results = []
+
+    def count():
+        results.append(count_prompt_tokens(messages, MODEL))
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [expected] * 8
+
+
+def test_measure_turn_prefers_reported_usage():
+    accountant = TokenAccountant(MODEL)
+    context = history(2)
+    usage = SimpleNamespace(prompt_tokens=120, completion_tokens=30,
+                            prompt_tokens_details=SimpleNamespace(cached_tokens=64))
+    assert accountant.measure_turn(context, "Reply", usage) == \
+        TurnUsage(120, 30, MODEL, "api", 64)
+    assert accountant.measure_turn(context, "Reply") == TurnUsage(
+        count_prompt_tokens(context, MODEL), count_tokens("Reply", MODEL), MODEL, "estimate")
+    cached = accountant.measure_turn(context, "Reply", usage, cached=True)
+    assert cached.source == "cache" and cached.cost == 0.0
+
+
+def test_cost_ledger_counts_each_turn_once():
+    ledger = CostLedger()
+    usage = TurnUsage(1000, 100, MODEL, "api")
+    assert ledger.record(("s", 1), usage)
+    assert not ledger.record(("s", 1), usage)
+    assert ledger.record(("s", 2), usage)
+    snapshot = ledger.snapshot()
+    assert snapshot["turns"] == 2 and snapshot["input_tokens"] == 2000
+    assert snapshot["by_model"][MODEL]["cost"] == snapshot["cost"] == 2 * usage.cost
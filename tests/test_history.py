@@ -0,0 +1,91 @@
+import pytest
+
+from app import history as history_module
+from app.cost_tracker import count_prompt_tokens
+from app.history import History
+from app.interviewer import Interviewer
+from app.messages import ASSISTANT, SYSTEM, USER, Message
+
+MODEL = "gpt-4.1-mini"
+
+
+def conversation(n):
+    return History.of([Message(SYSTEM, "You are an interviewer.")] + [
+        Message(USER if i % 2 else ASSISTANT, f"message {i}") for i in range(n)])
+
+
+def test_new_versions_share_the_unchanged_nodes():
+    base = conversation(4)
+    longer = base.append(Message(USER, "an answer"))
+    other = base.truncate(3).append({"role": USER, "content": "another answer"})
+    # The original is unchanged
+    assert len(base) == 5 and len(longer) == 6 and len(other) == 4
+    assert longer.nodes()[:5] == base.nodes()
+    assert all(a is b for a, b in zip(other.nodes()[:3], base.nodes()))
+    assert longer.common_length(other) == other.common_length(longer) == 3
+    assert base.common_length(conversation(4)) == 0
+
+
+def test_reads_like_a_list():
+    messages = conversation(3)
+    assert messages[-1].content == "message 2" and messages[1].role == ASSISTANT
+    assert [m.content for m in messages[1:3]] == ["message 0", "message 1"]
+    assert len(messages + [Message(USER, "x")]) == 5
+    assert list(messages.truncate(0)) == [] and len(History()) == 0
+    with pytest.raises(IndexError):
+        messages.truncate(5)
+
+
+def test_branches_count_their_shared_prefix_once(monkeypatch):
+    base = conversation(6)
+    assert base.prompt_tokens(MODEL) == count_prompt_tokens(list(base), MODEL)
+
+    counted = []
+    original = history_module.count_message_tokens
+
+    def count(message, model):
+        counted.append(message.content)
+        return original(message, model)
+    monkeypatch.setattr(history_module, "count_message_tokens", count)
+    branch = base.truncate(4).append(Message(USER, "a different answer"))
+    assert branch.prompt_tokens(MODEL) == count_prompt_tokens(list(branch), MODEL)
+    assert counted == ["a different answer"]
+
+
+def test_regenerate_keeps_the_old_branch(fake_openai, usage_ledger):
+    interviewer = Interviewer(job_role="Backend Developer", skills="Python",
+                              difficulty="Medium", technique="Zero-shot")
+    interviewer.open()
+    interviewer.chat("I would use a queue.")
+    first = list(interviewer.messages)
+
+    reply = interviewer.regenerate(temperature=1.0)
+    assert interviewer.branch == 1 and len(interviewer.branches) == 2
+    assert interviewer.messages[-1].content == reply
+    # The answer is sent again on the new branch; what came before it is
+    # shared, not copied
+    assert interviewer.branches[0].common_length(interviewer.branches[1]) == len(first) - 2
+    assert interviewer.messages[-2].content == "I would use a queue."
+    assert list(interviewer.branches[0]) == first
+
+    # Answer the opening question again, from the first branch
+    interviewer.switch_branch(0)
+    interviewer.chat("I would use a stack.", from_index=2)
+    assert interviewer.branch == 2
+    assert [m.content for m in interviewer.messages[:2]] == [m.content for m in first[:2]]
+    assert interviewer.messages[2].content == "I would use a stack."
+    with pytest.raises(IndexError):
+        interviewer.switch_branch(3)
+
+
+def test_failed_turn_on_a_new_branch_is_dropped(fake_openai, usage_ledger):
+    interviewer = Interviewer(job_role="Backend Developer", skills="Python",
+                              difficulty="Medium", technique="Zero-shot")
+    interviewer.open()
+    interviewer.chat("I would use a queue.")
+    before = list(interviewer.messages)
+    fake_openai.behaviour.error_rate = 1.0
+    with pytest.raises(Exception):
+        interviewer.chat("Another answer.", from_index=2)
+    assert interviewer.branch == 0 and len(interviewer.branches) == 1
+    assert list(interviewer.messages) == before
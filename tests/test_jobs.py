@@ -0,0 +1,58 @@
+import asyncio
+import threading
+import time
+
+from app.jobs import JobPipeline, JobShedError, get_accounting_pipeline, get_post_turn_pipeline
+
+
+def test_accounting_does_not_wait_behind_scoring():
+    scoring, release = get_post_turn_pipeline(), threading.Event()
+    for i in range(8):
+        scoring.submit(("slow", i, "score"), release.wait, 5, sheddable=True)
+    try:
+        future = get_accounting_pipeline().submit(("fast", "usage"), lambda: "measured")
+        assert future.result(timeout=1) == "measured"
+    finally:
+        release.set()
+
+
+def test_same_key_runs_once():
+    pipeline = JobPipeline(workers=1)
+    calls = []
+    first = pipeline.submit(("s", 1, "usage"), calls.append, 1)
+    second = pipeline.submit(("s", 1, "usage"), calls.append, 1)
+    assert first is second
+    first.result(timeout=1)
+    assert calls == [1]
+
+
+def test_full_queue_sheds_optional_jobs():
+    pipeline, release = JobPipeline(workers=1, max_queue=1), threading.Event()
+    pipeline.submit("running", release.wait, 5)
+    time.sleep(0.05)
+    pipeline.submit("queued", release.wait, 5)
+    try:
+        dropped = pipeline.submit("optional", lambda: None, sheddable=True)
+        assert isinstance(dropped.exception(timeout=1), JobShedError)
+    finally:
+        release.set()
+
+
+def test_full_queue_never_blocks_the_event_loop():
+    pipeline, release = JobPipeline(workers=1, max_queue=1, put_timeout=5), threading.Event()
+    pipeline.submit("running", release.wait, 5)
+    time.sleep(0.05)
+    pipeline.submit("queued", release.wait, 5)
+
+    async def submit():
+        started = time.perf_counter()
+        future = pipeline.submit("required", lambda: "done")
+        waited = time.perf_counter() - started
+        return waited, await asyncio.wrap_future(future)
+
+    try:
+        waited, result = asyncio.run(submit())
+    finally:
+        release.set()
+    assert waited < 0.5 and result == "done"
+    assert pipeline.metrics()["inline"] == 1
@@ -0,0 +1,123 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import length_governor
+from app.interviewer import Interviewer
+from app.length_governor import (CONTINUE_REQUEST, QUESTION_REQUEST, GovernedReply,
+                                 LengthGovernor, OutputPlan, split_structured, trim_to_sentence)
+
+
+def result(finish_reason="stop", completion_tokens=10):
+    usage = SimpleNamespace(prompt_tokens=5, completion_tokens=completion_tokens,
+                            total_tokens=5 + completion_tokens, prompt_tokens_details=None)
+    return SimpleNamespace(finish_reason=finish_reason, usage=usage)
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    """A fresh governor with no holdout turns in place of the shared one"""
+    governor = LengthGovernor(enabled=True, holdout_rate=0, max_continuations=1)
+    monkeypatch.setattr(length_governor, "_governor", governor)
+    return governor
+
+
+def test_split_structured():
+    text = "[REASONING]\nThink first.\n[QUESTION]\nWhat is a mutex?\n[END] trailing"
+    assert split_structured(text) == ("Think first.", "What is a mutex?")
+    # No question marker: all of it is the question
+    assert split_structured("[REASONING]\nJust this.") == ("", "Just this.")
+
+
+def test_trim_to_sentence():
+    assert trim_to_sentence("A first, complete sentence. Then a cut") == \
+        "A first, complete sentence."
+    # Too little would be left: kept as it is
+    assert trim_to_sentence("Hi. A long unfinished sentence without an end") == \
+        "Hi. A long unfinished sentence without an end"
+
+
+def test_structured_reply_shows_only_the_question():
+    reply = GovernedReply(OutputPlan(100, ("[END]",), structured=True))
+    shown = [reply.feed(delta) for delta in ("[REASONING]\nHm. [QUES", "TION]\n What", " is it?")]
+    # The marker arrives split over two deltas
+    assert shown == ["", "What", " is it?"]
+    assert reply.next_request(result()) is None
+    assert reply.final_text() == ("Hm.", "What is it?")
+
+
+def test_cut_off_reply_asks_for_continuation_once():
+    reply = GovernedReply(OutputPlan(200, None, structured=False), max_continuations=1)
+    reply.feed("Tell me about queues. And then")
+    extra = reply.next_request(result("length", 200))
+    assert [m.content for m in extra] == ["Tell me about queues. And then", CONTINUE_REQUEST]
+    assert reply.max_tokens == 100
+    reply.feed(" stacks")
+    # Still cut off, and out of continuations: the unfinished sentence goes
+    assert reply.next_request(result("length", 100)) is None
+    assert reply.usage.completion_tokens == 300
+    assert reply.final_text() == ("", "Tell me about queues.")
+    assert reply.final_text(trim=False)[1] == "Tell me about queues. And then stacks"
+
+
+def test_reply_cut_off_while_reasoning_asks_for_the_question():
+    reply = GovernedReply(OutputPlan(200, ("[END]",), structured=True))
+    reply.feed("[REASONING]\nStill thinking")
+    assert reply.next_request(result("length"))[1].content == QUESTION_REQUEST
+
+
+def test_budget_adapts_to_observed_replies():
+    governor = LengthGovernor(enabled=True, headroom=1.5, min_samples=3, holdout_rate=0)
+    assert governor.budget("Zero-shot", "Medium") == 350
+    for tokens in (40, 50, 60):
+        reply = governor.start("Zero-shot", "Medium")
+        reply.next_request(result(completion_tokens=tokens))
+        governor.record("Zero-shot", "Medium", reply, 0.1)
+    assert governor.budget("Zero-shot", "Medium") == 90
+    assert governor.report()["Zero-shot"]["governed_turns"] == 3
+
+
+def test_budget_recovers_after_cut_off_replies():
+    governor = LengthGovernor(enabled=True, headroom=1.5, min_samples=3, holdout_rate=0,
+                              max_continuations=0)
+
+    def turn(finish_reason, tokens):
+        reply = governor.start("Zero-shot", "Medium")
+        reply.next_request(result(finish_reason, tokens))
+        governor.record("Zero-shot", "Medium", reply, 0.1)
+
+    for tokens in (40, 50, 60):
+        turn("stop", tokens)
+    assert governor.budget("Zero-shot", "Medium") == 90
+    # Longer replies now: every one hits the budget and is cut off
+    budgets = []
+    for _ in range(6):
+        budget = governor.budget("Zero-shot", "Medium")
+        budgets.append(budget)
+        turn("length", budget)
+    assert budgets == sorted(budgets) and budgets[1] > 90
+    assert governor.budget("Zero-shot", "Medium") == governor.ceiling("Zero-shot", "Medium")
+
+
+def test_cut_off_reply_is_continued(fake_openai, usage_ledger, governor):
+    # Longer than the Medium budget (350 tokens)
+    fake_openai.behaviour.reply_words = 600
+    before = fake_openai.stats["requests"]
+    interviewer = Interviewer(job_role="Backend Developer", skills="Python",
+                              difficulty="Medium", technique="Zero-shot")
+    opening = interviewer.open()
+    assert fake_openai.stats["requests"] - before == 2
+    assert opening.endswith("Take your time and be specific.")
+    assert governor.report()["Zero-shot"]["continuations"] == 1
+
+
+def test_structured_reply_cut_off_while_reasoning_gets_its_question(
+        fake_openai, usage_ledger, governor):
+    fake_openai.behaviour.reply_words = 1000
+    before = fake_openai.stats["requests"]
+    interviewer = Interviewer(job_role="Backend Developer", skills="Python",
+                              difficulty="Medium", technique="Chain-of-Thought")
+    opening = interviewer.open()
+    assert fake_openai.stats["requests"] - before == 2
+    assert opening and "[" not in opening and "reason about" not in opening
+    assert interviewer.messages[-1].content == opening
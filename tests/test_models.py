@@ -0,0 +1,94 @@
+import pytest
+
+from app import models
+from app.interviewer import Interviewer
+from app.models import ModelRouter, find_model, get_model, record_latency
+
+SMALL, STANDARD, LARGE = "gpt-4.1-nano", "gpt-4.1-mini", "gpt-4.1"
+
+
+@pytest.fixture
+def latencies(monkeypatch):
+    """Fresh latency stats, so observations made here do not leak"""
+    monkeypatch.setattr(models, "_latency", {})
+
+
+def router(**kwargs):
+    options = dict(enabled=True, small=SMALL, standard=STANDARD, large=LARGE,
+                   latency_target=2.0, long_context_tokens=1000, short_input_words=5,
+                   min_latency_samples=3)
+    options.update(kwargs)
+    return ModelRouter(**options)
+
+
+def test_snapshot_names_resolve_to_their_base_model():
+    assert find_model("gpt-4.1-mini-2025-04-14").name == "gpt-4.1-mini"
+    assert find_model("gpt-4o-2024-08-06").name == "gpt-4o"
+    assert find_model("claude-unknown") is None
+    assert get_model("claude-unknown") is get_model()
+
+
+def test_cost_is_priced_per_model():
+    mini, large = get_model("gpt-4.1-mini"), get_model("gpt-4.1")
+    assert mini.cost(1_000_000, 1_000_000) == pytest.approx(0.40 + 1.60)
+    assert large.cost(1_000_000, 0) == pytest.approx(2.00)
+    # Cached prompt tokens are billed at the cached price
+    assert mini.cost(1_000_000, 0, cached_input_tokens=500_000) == pytest.approx(0.20 + 0.05)
+
+
+def test_routes_by_technique_difficulty_and_answer_length(latencies):
+    choose = router().choose
+    assert choose("Zero-shot", "Hard", 100, 40).model == LARGE
+    assert choose("Chain-of-Thought", "Easy", 100, 40).model == LARGE
+    assert choose("Zero-shot", "Easy", 100, 2).model == SMALL
+    assert choose("Zero-shot", "Easy", 100, 40).model == STANDARD
+    # The opening question has no answer to judge
+    assert choose("Zero-shot", "Easy", 100, None).model == STANDARD
+    assert choose("Few-shot", "Medium", 100, 2).model == STANDARD
+
+
+def test_disabled_router_always_uses_the_standard_model(latencies):
+    assert router(enabled=False).choose("Zero-shot", "Hard", 100, 2) == \
+        models.RouteDecision(STANDARD, "default")
+
+
+def test_long_conversations_skip_the_small_model(latencies):
+    decision = router().choose("Zero-shot", "Easy", 5000, 2)
+    assert (decision.model, decision.reason) == (STANDARD, "long conversation")
+
+
+def test_context_too_large_for_the_model_steps_up(latencies):
+    decision = router(standard="gpt-4").choose("Few-shot", "Medium", 10_000, 40)
+    assert (decision.model, decision.reason) == (LARGE, "context size")
+
+
+def test_slow_model_steps_down_while_the_cheaper_one_is_fast(latencies):
+    choose = router().choose
+    for _ in range(3):
+        record_latency(LARGE, 5.0)
+    # Too few samples of the standard model to judge it: counted as fast
+    decision = choose("Zero-shot", "Hard", 100, 40)
+    assert (decision.model, decision.reason) == (STANDARD, "latency")
+    for _ in range(3):
+        record_latency(STANDARD, 5.0)
+    assert choose("Zero-shot", "Hard", 100, 40).model == LARGE
+    # Snapshot names count towards their base model
+    for _ in range(3):
+        record_latency(STANDARD + "-2025-04-14", 0.5)
+    assert choose("Few-shot", "Medium", 100, 40) == models.RouteDecision(SMALL, "latency")
+    # Long conversations never step down to the small model
+    assert choose("Few-shot", "Medium", 5000, 40).model == STANDARD
+
+
+def test_routed_turn_is_answered_and_priced_by_its_model(fake_openai, usage_ledger, monkeypatch,
+                                                         latencies):
+    monkeypatch.setattr(models, "_router", router())
+    interviewer = Interviewer(job_role="Backend Developer", skills="Python",
+                              difficulty="Hard", technique="Zero-shot")
+    interviewer.open()
+    assert interviewer.last_route.model == LARGE
+    usage = interviewer.last_usage.result()
+    assert usage.model == LARGE
+    assert usage.cost == pytest.approx(get_model(LARGE).cost(
+        usage.input_tokens, usage.output_tokens, usage.cached_input_tokens))
+    assert models.get_router().stats() == {LARGE: 1}
@@ -0,0 +1,56 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.prefetch import OpeningPrefetch
+from app.question_bank import QuestionBankIndex
+
+SETTINGS = {"job_role": "Backend Developer", "skills": "Python",
+            "difficulty": "Medium", "technique": "Zero-shot"}
+
+
+@pytest.fixture
+def empty_bank():
+    """No stored openings: every prefetch goes to the live model"""
+    return QuestionBankIndex([])
+
+
+def test_readers_follow_the_stream_and_claim_stores_the_interviewer(
+        fake_openai, usage_ledger, empty_bank):
+    fake_openai.behaviour.tokens_per_second = 200
+    prefetch = OpeningPrefetch.start(SETTINGS, question_bank=empty_bank)
+    assert prefetch.matches(dict(SETTINGS)) and not prefetch.matches({**SETTINGS, "skills": "Go"})
+
+    with ThreadPoolExecutor(2) as pool:
+        streamed = list(pool.map(lambda _: "".join(prefetch.stream()), range(2)))
+    storage = {}
+    opening = prefetch.claim(storage)
+    assert prefetch.source == "live" and opening
+    assert streamed == [opening, opening]
+    # A reader arriving late replays the buffer from the start
+    assert "".join(prefetch.stream()) == opening
+    assert storage["interviewer"].messages[-1].content == opening
+
+
+def test_cancelled_prefetch_leaves_no_trace(fake_openai, usage_ledger, empty_bank):
+    fake_openai.behaviour.tokens_per_second = 20
+    prefetch = OpeningPrefetch.start(SETTINGS, question_bank=empty_bank)
+    stream = prefetch.stream()
+    first = next(stream)
+    prefetch.cancel()
+    # The stream ends rather than waiting for the rest of the reply
+    assert first + "".join(stream) == prefetch.text
+    storage = {}
+    assert prefetch.claim(storage) is None
+    assert prefetch.wait(timeout=5) and prefetch.interviewer is None
+    assert storage == {}
+
+
+def test_failed_prefetch_is_not_claimed(fake_openai, usage_ledger, empty_bank):
+    fake_openai.behaviour.error_rate = 1.0
+    prefetch = OpeningPrefetch.start(SETTINGS, question_bank=empty_bank)
+    storage = {}
+    assert prefetch.claim(storage) is None
+    assert prefetch.error is not None and prefetch.done
+    assert "".join(prefetch.stream()) == ""
+    assert storage == {}
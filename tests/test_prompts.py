@@ -0,0 +1,65 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app import prompts
+from app.interviewer import Interviewer
+from app.prompts import (SECURITY_INSTRUCTION, PrefixCacheStats, available_techniques,
+                         build_system_prompt, get_template, is_structured, register_technique)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """A copy of the registry, so techniques added here do not leak"""
+    monkeypatch.setattr(prompts, "_registry", dict(prompts._registry))
+
+
+def usage(prompt_tokens, cached_tokens=None):
+    details = None if cached_tokens is None else SimpleNamespace(cached_tokens=cached_tokens)
+    return SimpleNamespace(prompt_tokens=prompt_tokens, prompt_tokens_details=details)
+
+
+@pytest.mark.parametrize("technique", available_techniques())
+def test_sessions_share_the_static_prefix(technique):
+    one = build_system_prompt(technique, "Backend Developer", "Python", "Medium")
+    two = build_system_prompt(technique, "Data Analyst", "SQL", "Hard")
+    prefix = get_template(technique).prefix
+    assert one.startswith(prefix) and two.startswith(prefix)
+    assert prefix.endswith(SECURITY_INSTRUCTION)
+    # Session details come only after the shared prefix
+    assert "Backend Developer" not in prefix and "Backend Developer" in one[len(prefix):]
+
+
+def test_unknown_technique_falls_back_to_zero_shot():
+    assert get_template("No such technique") is get_template("Zero-shot")
+    assert is_structured("Chain-of-Thought") and not is_structured("Zero-shot")
+
+
+def test_registered_technique_needs_no_interviewer_changes(registry, fake_openai):
+    register_technique("Rapid-fire", "Ask short questions about the skills given below.")
+    assert available_techniques()[-1] == "Rapid-fire"
+    with pytest.raises(ValueError):
+        register_technique("Rapid-fire", "Something else.")
+    register_technique("Rapid-fire", "Ask one short question at a time.", replace=True)
+
+    interviewer = Interviewer(job_role="Backend Developer", skills="Python",
+                              difficulty="Easy", technique="Rapid-fire")
+    system_prompt = interviewer.messages[0].content
+    assert system_prompt.startswith("Ask one short question at a time.")
+    assert system_prompt.endswith(prompts.DIFFICULTY_INSTRUCTIONS["Easy"] + "\n")
+
+
+def test_prefix_cache_hit_rate():
+    stats = PrefixCacheStats()
+    stats.record("Zero-shot", usage(1000, 800))
+    stats.record("Zero-shot", usage(1000))
+    stats.record("Few-shot", usage(500, 0))
+    # No usage reported: nothing to count
+    stats.record("Few-shot", None)
+    assert stats.hit_rate("Zero-shot") == 0.4
+    assert stats.hit_rate() == 800 / 2500
+    assert stats.hit_rate("Dynamic") == 0.0
+    assert stats.report() == {
+        "Zero-shot": {"prompt_tokens": 2000, "cached_tokens": 800, "hit_rate": 0.4},
+        "Few-shot": {"prompt_tokens": 500, "cached_tokens": 0, "hit_rate": 0.0},
+    }
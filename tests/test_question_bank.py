@@ -0,0 +1,69 @@
+import pytest
+
+from app.interviewer import InterviewerFactory
+from app.prefetch import OpeningPrefetch
+from app.question_bank import QuestionBankIndex, make_record, normalize_tokens
+
+OPENING = "How would you structure a Django project for a growing team?"
+
+
+@pytest.fixture
+def bank():
+    return QuestionBankIndex([
+        make_record("Python Backend Engineer", "Django, REST, SQL", "Medium", "Zero-shot",
+                    OPENING, ["How do you version the API?"], "gpt-4.1-mini"),
+        make_record("Data Analyst", "Pandas", "Easy", "Zero-shot",
+                    "How do you clean a messy CSV?", [], "gpt-4.1-mini"),
+    ])
+
+
+def test_normalize_tokens():
+    assert normalize_tokens("Python Backend Engineer @ the Cloud") == \
+        {"python", "backend", "engineer", "cloud"}
+    assert normalize_tokens("C++ and C#") == {"c++", "c#"}
+
+
+def test_exact_normalized_and_fuzzy_lookup(bank):
+    settings = ("Medium", "Zero-shot")
+    assert bank.lookup("Python Backend Engineer", "Django, REST, SQL", *settings)["opening"] == OPENING
+    # Case, punctuation and stop words do not matter
+    assert bank.lookup("python backend engineer", "django rest and sql", *settings)["opening"] == OPENING
+    # Close enough on both role and skills
+    assert bank.lookup("Python Backend", "Django, SQL", *settings)["opening"] == OPENING
+    assert bank.stats()["exact_hits"] == 2 and bank.stats()["fuzzy_hits"] == 1
+
+
+def test_lookup_misses(bank):
+    # Difficulty and technique must match exactly
+    assert bank.lookup("Python Backend Engineer", "Django, REST, SQL", "Hard", "Zero-shot") is None
+    # A shared word is not enough
+    assert bank.lookup("Frontend Engineer", "React", "Medium", "Zero-shot") is None
+    stats = bank.stats()
+    assert stats["misses"] == 2 and stats["hit_rate"] == 0.0
+
+
+def test_opening_is_served_from_the_bank(fake_openai, usage_ledger, bank):
+    before = fake_openai.stats["requests"]
+    storage = {}
+    interviewer, opening, source = InterviewerFactory.open_interview(
+        storage, job_role="python backend engineer", skills="Django, REST, SQL",
+        question_bank=bank)
+    assert (opening, source) == (OPENING, "bank")
+    assert interviewer.messages[-1].content == OPENING
+    assert fake_openai.stats["requests"] == before
+
+
+def test_varied_opening_skips_the_bank(fake_openai, usage_ledger, bank):
+    before = fake_openai.stats["requests"]
+    _, opening, source = InterviewerFactory.open_interview(
+        {}, job_role="Python Backend Engineer", skills="Django, REST, SQL",
+        question_bank=bank, use_cache=False)
+    assert source == "live" and opening != OPENING
+    assert fake_openai.stats["requests"] == before + 1
+
+    settings = {"job_role": "Python Backend Engineer", "skills": "Django, REST, SQL",
+                "difficulty": "Medium", "technique": "Zero-shot"}
+    prefetch = OpeningPrefetch.start(settings, use_cache=False, question_bank=bank)
+    assert prefetch.claim({}) and prefetch.source == "live"
+    prefetch = OpeningPrefetch.start(settings, question_bank=bank)
+    assert prefetch.claim({}) and prefetch.source == "bank"
@@ -0,0 +1,189 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app import resilience
+from app.ai_client import AIClient, AsyncAIClient
+from app.messages import USER, Message
+from app.resilience import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, Resilience
+from app.scheduler import AdmissionScheduler
+
+PRIMARY, BACKUP = "gpt-4.1-mini", "gpt-4.1-nano"
+
+
+def hedging(**kwargs):
+    """Resilience that hedges every request after 50ms"""
+    guard = Resilience(hedge_enabled=True, hedge_min_delay=0.05, hedge_min_samples=1,
+                       hedge_max_rate=1.0, fallback_models=[], **kwargs)
+    guard.call("m", "complete", lambda: "warm")
+    return guard
+
+
+def slow_then_fast():
+    calls = []
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            calls.append(len(calls))
+            first = len(calls) == 1
+        time.sleep(0.3 if first else 0.0)
+        return "slow" if first else "fast"
+    return fn, calls
+
+
+def test_hedge_needs_admission():
+    guard = hedging()
+    fn, calls = slow_then_fast()
+    assert guard.call("m", "complete", fn, admit=lambda: False) == "slow"
+    assert len(calls) == 1
+    assert guard.metrics()["hedges_skipped"] == 1
+
+
+def test_requests_do_not_wait_for_hedge_threads():
+    # One hedge thread; four slow requests still run at the same time
+    guard = hedging(max_workers=1)
+    started = time.perf_counter()
+    threads = [threading.Thread(target=guard.call,
+                                args=("m", "complete", lambda: time.sleep(0.2)),
+                                kwargs={"admit": lambda: False})
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert time.perf_counter() - started < 0.5
+
+
+def test_admit_is_called_without_the_lock():
+    guard = hedging()
+    fn, calls = slow_then_fast()
+    outcome = []
+
+    def admit():
+        # Would deadlock if admit() ran under the Resilience lock
+        return guard.metrics()["hedges"] >= 0
+
+    thread = threading.Thread(target=lambda: outcome.append(
+        guard.call("m", "complete", fn, admit=admit)), daemon=True)
+    thread.start()
+    thread.join(timeout=2)
+    assert outcome == ["fast"]
+
+
+def test_losing_hedge_is_discarded():
+    guard = hedging()
+    fn, calls = slow_then_fast()
+    discarded = threading.Event()
+    lost = []
+
+    def discard(value):
+        lost.append(value)
+        discarded.set()
+
+    assert guard.call("m", "complete", fn, discard=discard, admit=lambda: True) == "fast"
+    assert discarded.wait(1) and lost == ["slow"]
+    assert guard.metrics()["hedge_wins"] == 1
+
+
+def test_async_losing_hedge_finishes_and_is_discarded():
+    guard = hedging()
+    lost = []
+
+    async def slow():
+        await asyncio.sleep(0.3)
+        return "slow"
+
+    async def fast():
+        return "fast"
+
+    async def discard(value):
+        lost.append(value)
+
+    async def run():
+        attempts = iter([slow, fast])
+        value = await guard.acall("m", "complete", lambda: next(attempts)(),
+                                  discard=discard, admit=lambda: True)
+        # The loser is not cancelled: it finishes and is discarded
+        await asyncio.sleep(0.4)
+        return value
+
+    assert asyncio.run(run()) == "fast"
+    assert lost == ["slow"]
+
+
+def test_try_acquire_only_takes_spare_budget():
+    scheduler = AdmissionScheduler(requests_per_minute=2, tokens_per_minute=10_000)
+    assert scheduler.try_acquire(100)
+    assert not scheduler.try_acquire(20_000)
+    assert scheduler.try_acquire(100)
+    assert not scheduler.try_acquire(100)
+    assert scheduler.metrics()["admitted"] == 2
+
+
+def test_breaker_opens_probes_and_closes():
+    breaker = CircuitBreaker("m", failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    assert breaker.state == CLOSED and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.trips == 1
+    assert not breaker.allow() and breaker.is_open()
+
+    time.sleep(0.06)
+    # One probe at a time once the reset time is up
+    assert breaker.allow() and breaker.state == HALF_OPEN
+    assert not breaker.allow() and breaker.is_open()
+    breaker.record_success()
+    assert breaker.state == CLOSED and breaker.allow()
+    assert breaker.rejected == 4
+
+
+def test_failed_probe_reopens_breaker():
+    breaker = CircuitBreaker("m", failure_threshold=1, reset_seconds=0.05)
+    breaker.record_failure()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == OPEN and breaker.trips == 2
+    assert not breaker.allow()
+
+
+@pytest.fixture
+def with_backup(fake_openai, usage_ledger, monkeypatch):
+    """Breakers that trip after 2 failures, with BACKUP behind PRIMARY"""
+    guard = Resilience(hedge_enabled=False, fallback_models=[BACKUP],
+                       failure_threshold=2, reset_seconds=0.3)
+    monkeypatch.setattr(resilience, "_resilience", guard)
+    fake_openai.behaviour.per_model[PRIMARY] = {"error_rate": 1.0}
+    return guard
+
+
+def test_failover_while_primary_is_down(fake_openai, with_backup):
+    ai = AIClient()
+    request = [Message(USER, "Hello")]
+    assert ai.complete(request, use_cache=False, model=PRIMARY).model == BACKUP
+    metrics = with_backup.metrics()
+    assert metrics["failovers"] == 1 and metrics["trips"] == 1
+
+    # While open, the primary is skipped without a request
+    errors = fake_openai.stats["errors"]
+    assert ai.complete(request, use_cache=False, model=PRIMARY).model == BACKUP
+    assert fake_openai.stats["errors"] == errors
+    assert with_backup.metrics()[f"{PRIMARY}.rejected"] >= 1
+
+    # Back up: after the reset time a probe goes through and closes it
+    fake_openai.behaviour.per_model.clear()
+    time.sleep(0.35)
+    assert ai.complete(request, use_cache=False, model=PRIMARY).model == PRIMARY
+    assert with_backup.metrics()[f"{PRIMARY}.state"] == 0
+
+
+def test_async_failover(fake_openai, with_backup):
+    async def run():
+        result = await AsyncAIClient().complete([Message(USER, "Hello")], model=PRIMARY)
+        return result.model
+
+    assert asyncio.run(run()) == BACKUP
+    assert with_backup.metrics()["failovers"] == 1
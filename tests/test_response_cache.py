@@ -0,0 +1,115 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import response_cache
+from app.ai_client import AIClient
+from app.config import Config
+from app.messages import USER, Message
+from app.response_cache import DiskCacheBackend, ResponseCache, make_cache_key
+from app.security import wrap_user_input
+
+MODEL = "gpt-4.1-mini"
+
+
+def test_cache_key_ignores_input_ids_and_whitespace():
+    one = [{"role": USER, "content": wrap_user_input("Hello  there")}]
+    two = [{"role": USER, "content": wrap_user_input("Hello there\n")}]
+    assert one[0]["content"] != two[0]["content"]
+    assert make_cache_key(one, MODEL, 0.7) == make_cache_key(two, MODEL, 0.7)
+    assert make_cache_key(one, MODEL, 0.7) != make_cache_key(one, MODEL, 0.2)
+    assert make_cache_key(one, MODEL, 0.7) != make_cache_key(one, "gpt-4.1", 0.7)
+    assert make_cache_key(one, MODEL, 0.7) != make_cache_key(one, MODEL, 0.7, {"max_tokens": 50})
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == ("1", "3")
+    assert cache.stats()["evictions"] == 1
+
+
+def test_entries_expire():
+    cache = ResponseCache(ttl_seconds=0.05)
+    cache.set("a", "1")
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_concurrent_misses_share_one_call():
+    cache = ResponseCache()
+    calls = []
+    started = threading.Barrier(8)
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.1)
+        return "reply"
+
+    def ask(_):
+        started.wait()
+        return cache.get_or_compute("key", compute)
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(ask, range(8)))
+    assert len(calls) == 1
+    assert sorted(results) == [("reply", False)] + [("reply", True)] * 7
+    stats = cache.stats()
+    assert stats["misses"] == 1 and stats["coalesced"] == 7
+
+
+def test_failed_call_is_shared_but_not_cached():
+    cache = ResponseCache()
+    release = threading.Event()
+
+    def fail():
+        release.wait()
+        raise RuntimeError("upstream down")
+
+    with ThreadPoolExecutor(2) as pool:
+        leader = pool.submit(cache.get_or_compute, "key", fail)
+        time.sleep(0.05)
+        follower = pool.submit(cache.get_or_compute, "key", lambda: "unused")
+        time.sleep(0.05)
+        release.set()
+        for future in (leader, follower):
+            with pytest.raises(RuntimeError):
+                future.result()
+    assert cache.get_or_compute("key", lambda: "later") == ("later", False)
+
+
+def test_rejected_value_is_not_stored():
+    cache = ResponseCache()
+    assert cache.get_or_compute("key", lambda: "cut off", lambda v: False) == ("cut off", False)
+    assert cache.get("key") is None
+
+
+def test_disk_entries_survive_a_restart(tmp_path):
+    path = str(tmp_path / "responses.db")
+    ResponseCache(disk=DiskCacheBackend(path)).set("key", "reply")
+    restarted = ResponseCache(disk=DiskCacheBackend(path))
+    assert restarted.get("key") == "reply"
+    assert restarted.stats()["disk_hits"] == 1
+
+
+def test_identical_requests_reach_the_model_once(fake_openai, monkeypatch):
+    monkeypatch.setattr(Config, "RESPONSE_CACHE_ENABLED", True)
+    monkeypatch.setattr(response_cache, "_response_cache", ResponseCache())
+    ai = AIClient()
+    messages = [Message(USER, "Ask me one question about Python.")]
+    before = fake_openai.stats["requests"]
+    first = ai.complete(messages, temperature=0.0)
+    second = ai.complete(messages, temperature=0.0)
+    assert not first.cached and second.cached and second.text == first.text
+    # Streaming reads the same entry
+    assert "".join(ai.stream_chat_completion(messages, temperature=0.0)) == first.text
+    # Asked for a varied reply: sent again
+    assert not ai.complete(messages, temperature=0.0, use_cache=False).cached
+    assert fake_openai.stats["requests"] - before == 2
@@ -0,0 +1,103 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from app.scheduler import AdmissionScheduler, QueueTimeoutError
+
+
+def drained(max_wait=5.0):
+    """A scheduler whose token budget (100/s) has just been used up"""
+    scheduler = AdmissionScheduler(requests_per_minute=6000, tokens_per_minute=6000,
+                                   max_wait=max_wait)
+    scheduler.acquire("warm", 6000)
+    return scheduler
+
+
+def test_async_waiter_is_admitted_when_budget_refills():
+    scheduler = drained()
+
+    async def run():
+        started = time.perf_counter()
+        await scheduler.aacquire("s", 20)
+        return time.perf_counter() - started
+
+    assert 0.1 < asyncio.run(run()) < 1.5
+
+
+def test_async_waiters_hold_no_threads():
+    scheduler = drained()
+    threads = threading.active_count()
+
+    async def run():
+        waiters = [asyncio.ensure_future(scheduler.aacquire(f"s{i}", 1000)) for i in range(200)]
+        await asyncio.sleep(0.1)
+        assert scheduler.metrics()["queue_depth"] == 200
+        assert threading.active_count() <= threads + 1
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+
+    asyncio.run(run())
+    assert scheduler.metrics()["queue_depth"] == 0
+
+
+def test_cancelled_waiter_takes_no_budget():
+    scheduler = drained()
+
+    async def run():
+        waiter = asyncio.ensure_future(scheduler.aacquire("s", 50))
+        await asyncio.sleep(0.05)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        # Long enough that the cancelled request would have been admitted
+        await asyncio.sleep(0.6)
+
+    asyncio.run(run())
+    stats = scheduler.metrics()
+    assert stats["admitted"] == 1 and stats["queue_depth"] == 0
+    # The refilled budget is still there for the next request
+    assert scheduler.try_acquire(50)
+
+
+def test_async_waiter_times_out():
+    scheduler = drained(max_wait=0.1)
+
+    async def run():
+        await scheduler.aacquire("s", 5000)
+
+    with pytest.raises(QueueTimeoutError):
+        asyncio.run(run())
+    assert scheduler.metrics()["timed_out"] == 1
+
+
+def test_async_waiter_behind_a_thread_is_woken():
+    scheduler = drained()
+    order = []
+
+    def sync_request():
+        scheduler.acquire("a", 30)
+        order.append("thread")
+
+    async def run():
+        thread = threading.Thread(target=sync_request)
+        thread.start()
+        await asyncio.sleep(0.02)
+        await scheduler.aacquire("b", 30)
+        order.append("coroutine")
+        thread.join()
+
+    asyncio.run(run())
+    assert order == ["thread", "coroutine"]
+
+
+def test_zero_attempts_still_sends_the_request():
+    scheduler = AdmissionScheduler(requests_per_minute=60, tokens_per_minute=10_000,
+                                   max_attempts=0)
+    assert scheduler.call("s", 10, lambda: "reply") == "reply"
+
+    async def reply():
+        return "reply"
+    assert asyncio.run(scheduler.acall("s", 10, reply)) == "reply"
@@ -0,0 +1,167 @@
+import os
+
+import pytest
+
+from app.interviewer import Interviewer, InterviewerFactory
+from app.messages import ASSISTANT, USER, Message
+from app.session_store import (AppendOnlyLogBackend, InMemoryBackend, SessionBackend,
+                               SessionStorage, make_backend)
+
+
+def make_storage(max_in_memory=1):
+    return SessionStorage(InMemoryBackend(), max_in_memory=max_in_memory)
+
+
+def stored_messages(storage, session_id):
+    return storage.backend.load(session_id)[1]
+
+
+def add_turn(interviewer, n=1):
+    interviewer.extend([Message(USER, f"answer {n}"), Message(ASSISTANT, f"question {n}")])
+
+
+def test_turn_on_held_session_survives_cap():
+    storage = make_storage()
+    storage["a"] = Interviewer(job_role="Dev")
+    with storage.hold("a"):
+        a = storage["a"]
+        storage["b"] = Interviewer(job_role="Ops")
+        add_turn(a)
+        storage.persist("a")
+    assert [m["content"] for m in stored_messages(storage, "a")] == ["answer 1", "question 1"]
+    # The held session stayed; the other one went to make room
+    assert storage["a"] is a
+    assert stored_messages(storage, "b") == []
+
+
+def test_turn_on_evicted_interviewer_is_saved():
+    storage = make_storage()
+    storage["a"] = Interviewer(job_role="Dev")
+    a = storage["a"]
+    storage["b"] = Interviewer(job_role="Ops")
+    add_turn(a)
+    InterviewerFactory.save(storage, "a", a)
+    assert len(stored_messages(storage, "a")) == 2
+    # It is the live version again, and later turns are appended once
+    assert storage["a"] is a
+    add_turn(a, 2)
+    InterviewerFactory.save(storage, "a", a)
+    assert [m["content"] for m in stored_messages(storage, "a")] == [
+        "answer 1", "question 1", "answer 2", "question 2"]
+
+
+def test_evicted_interviewer_on_another_branch_replaces_stored_turns():
+    storage = make_storage()
+    storage["a"] = Interviewer(job_role="Dev")
+    a = storage["a"]
+    add_turn(a)
+    storage.persist("a")
+    storage["b"] = Interviewer(job_role="Ops")
+    a.fork(len(a.messages) - 1)
+    a.extend([Message(ASSISTANT, "other question")])
+    InterviewerFactory.save(storage, "a", a)
+    assert [m["content"] for m in stored_messages(storage, "a")] == ["answer 1", "other question"]
+
+
+def test_deleted_session_is_not_brought_back():
+    storage = make_storage()
+    storage["a"] = Interviewer(job_role="Dev")
+    a = storage["a"]
+    del storage["a"]
+    add_turn(a)
+    InterviewerFactory.save(storage, "a", a)
+    assert "a" not in storage
+
+
+def test_idle_eviction_skips_held_sessions():
+    storage = SessionStorage(InMemoryBackend(), max_idle_seconds=0)
+    storage["a"] = Interviewer(job_role="Dev")
+    storage["b"] = Interviewer(job_role="Ops")
+    with storage.hold("a"):
+        assert storage.evict_idle() == 1
+        assert storage.live_count() == 1
+    assert storage.evict_idle() == 1
+
+
+def test_peek_neither_loads_nor_keeps_sessions():
+    storage = make_storage(max_in_memory=2)
+    storage["a"] = Interviewer(job_role="Dev")
+    storage["b"] = Interviewer(job_role="Ops")
+    assert storage.peek("a") is storage["a"]
+    # Peeking does not make "b" the most recently used
+    storage.peek("b")
+    storage["c"] = Interviewer(job_role="QA")
+    assert storage.peek("b") is None
+    assert storage.live_count() == 2
+    # Nor does it bring an evicted session back
+    assert storage.peek("b") is None and storage.live_count() == 2
+    assert storage["b"].job_role == "Ops"
+
+
+def messages(n):
+    return [{"role": USER, "content": f"answer {i}"} for i in range(n)]
+
+
+def test_log_recovers_from_torn_write(tmp_path):
+    path = str(tmp_path / "sessions.log")
+    log = AppendOnlyLogBackend(path)
+    log.create("a", {"job_role": "Dev"})
+    log.append("a", messages(1))
+    log.close()
+    with open(path, "ab") as f:
+        f.write(b'{"type":"append","sid":"a","mess')
+
+    log = AppendOnlyLogBackend(path)
+    assert log.load("a")[1] == messages(1)
+    log.create("b", {"job_role": "Ops"})
+    log.append("a", messages(2)[1:])
+    log.close()
+
+    # Events written after the recovery survive the next restart too
+    log = AppendOnlyLogBackend(path)
+    assert log.load("a")[1] == messages(2)
+    assert log.load("b") == ({"job_role": "Ops"}, [])
+
+
+def test_log_truncate_and_compaction(tmp_path):
+    path = str(tmp_path / "sessions.log")
+    log = AppendOnlyLogBackend(path, compact_min_bytes=0)
+    log.create("a", {"job_role": "Dev"})
+    log.append("a", messages(3))
+    log.truncate("a", 1)
+    log.append("a", [{"role": ASSISTANT, "content": "other"}])
+    assert [m["content"] for m in log.load("a")[1]] == ["answer 0", "other"]
+
+    log.create("b", {"job_role": "Ops"})
+    log.append("b", messages(20))
+    size = os.path.getsize(path)
+    log.delete("b")
+    # The deleted session outweighed the live one, so the log was rewritten
+    assert os.path.getsize(path) < size
+    assert not log.exists("b")
+    assert [m["content"] for m in log.load("a")[1]] == ["answer 0", "other"]
+    log.close()
+    log = AppendOnlyLogBackend(path)
+    assert log.session_ids() == ["a"]
+    assert [m["content"] for m in log.load("a")[1]] == ["answer 0", "other"]
+
+
+def test_incomplete_backend_fails_when_created():
+    class NoDelete(SessionBackend):
+        def create(self, session_id, settings): ...
+        def append(self, session_id, messages): ...
+        def load(self, session_id): ...
+        def session_ids(self): ...
+
+    with pytest.raises(TypeError):
+        NoDelete()
+
+
+def test_every_backend_is_complete(tmp_path):
+    for kind in ("memory", "sqlite", "log"):
+        backend = make_backend(kind, str(tmp_path / f"sessions.{kind}"))
+        backend.create("a", {"job_role": "Dev"})
+        backend.append("a", [{"role": USER, "content": "hi"}])
+        assert backend.load("a")[1] == [{"role": USER, "content": "hi"}]
+        assert backend.session_ids() == ["a"]
+        backend.close()
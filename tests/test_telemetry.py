@@ -0,0 +1,46 @@
+import re
+
+from app.telemetry import Telemetry
+
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[a-zA-Z_][a-zA-Z0-9_]*="[^"]*"'
+                    r'(,[a-zA-Z_][a-zA-Z0-9_]*="[^"]*")*\})? \S+$')
+
+
+def test_prometheus_output_has_valid_names():
+    telemetry = Telemetry(enabled=True)
+    telemetry.inc("openai_requests_total", model="gpt-4.1-mini")
+    telemetry.observe("ttft", 0.2, model="gpt-4.1-mini")
+    telemetry.register_collector("resilience", lambda: {
+        "hedges": 3, "gpt-4.1-mini.state": 2, "gpt-4.1-nano.state": 0,
+        "gpt-4.1-mini.complete_hedge_delay_s": 1.5}, label="model")
+    telemetry.register_collector("length_governor", lambda: {
+        "Chain-of-Thought.max_tokens": 600}, label="technique")
+    telemetry.register_collector("odd", lambda: {"weird-key.x y": 1})
+
+    lines = telemetry.render_prometheus().splitlines()
+    samples = [line for line in lines if not line.startswith("#")]
+    assert all(SAMPLE.match(line) for line in samples), samples
+    types = [line for line in lines if line.startswith("# TYPE")]
+    assert len(types) == len(set(types))
+    assert 'interviewer_resilience_state{model="gpt-4.1-mini"} 2' in samples
+    assert 'interviewer_resilience_state{model="gpt-4.1-nano"} 0' in samples
+    assert 'interviewer_length_governor_max_tokens{technique="Chain-of-Thought"} 600' in samples
+    assert "interviewer_odd_weird_key_x_y 1" in samples
+
+
+def test_metrics_server_is_local_by_default(monkeypatch):
+    import socket
+
+    from app import telemetry as module
+
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    monkeypatch.setattr(module, "_exporters_started", False)
+    monkeypatch.setattr(module.telemetry, "_enabled", True)
+    server = module.start_exporters(port=port, path="")
+    try:
+        assert server.server_address[0] == "127.0.0.1"
+    finally:
+        server.shutdown()
+        server.server_close()
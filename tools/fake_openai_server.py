@@ -0,0 +1,296 @@
+# A local stand-in for the OpenAI chat completions API.
+#
+# Speaks enough of /v1/chat/completions (plain and streaming SSE) for the
+# openai SDK, with programmable latency, streaming speed and error injection.
+# Used to exercise the app, batch jobs and load tests without a real key.
+#
+#   python -m tools.fake_openai_server --port 8089 --latency 0.3 --error-rate 0.05
+#   # 5% of requests take 3s longer (tail latency, e.g. to see hedging)
+#   python -m tools.fake_openai_server --latency 0.2 --slow-rate 0.05 --slow-latency 3
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake streamlit run streamlit_app.py
+import argparse
+import hashlib
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+QUESTIONS = [
+    "Can you walk me through how you would design {topic} for a growing team?",
+    "What trade-offs have you made when working with {topic}?",
+    "Tell me about a bug related to {topic} that was hard to track down.",
+    "How would you explain {topic} to a junior colleague?",
+    "How do you test code that relies on {topic}?",
+]
+
+
+class FakeBehaviour:
+    """Knobs for the fake server; can be changed while it is running"""
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0,
+                 ttft: float = 0.0, tokens_per_second: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 500,
+                 retry_after: float = None, reply_words: int = 40, seed: int = None,
+                 slow_rate: float = 0.0, slow_latency: float = 0.0):
+        self.latency = latency                      # seconds before responding
+        self.jitter = jitter                        # +/- uniform seconds
+        self.slow_rate = slow_rate                  # share of requests that are slow
+        self.slow_latency = slow_latency            # extra seconds for those (tail latency)
+        self.ttft = ttft                            # extra delay before first chunk
+        self.tokens_per_second = tokens_per_second  # 0 = as fast as possible
+        self.error_rate = error_rate                # share of requests that fail
+        self.error_status = error_status            # e.g. 429 or 500
+        self.retry_after = retry_after              # Retry-After header on errors
+        self.reply_words = reply_words
+        # Per-model overrides, e.g. {"gpt-4.1": {"latency": 2.0}}
+        self.per_model = {}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def get(self, model: str, name: str):
+        return self.per_model.get(model, {}).get(name, getattr(self, name))
+
+    def random(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+
+def fake_reply(messages, words: int) -> str:
+    """Deterministic interviewer-style reply for a conversation"""
+    last = messages[-1]["content"] if messages else ""
+    digest = int(hashlib.sha256(json.dumps(messages, sort_keys=True).encode()).hexdigest(), 16)
+    if messages and "Reply with JSON only" in messages[0].get("content", ""):
+        # A grading request (app.evaluation)
+        scores = {name: 1 + (digest >> (8 * i)) % 5
+                  for i, name in enumerate(("accuracy", "depth", "relevance"))}
+        return json.dumps({**scores, "feedback": "Clear structure; add a concrete example."})
+    topic = "the systems you have built"
+    for message in messages:
+        if message["role"] == "system" and "Skills to focus on:" in message["content"]:
+            topic = message["content"].split("Skills to focus on:", 1)[1].splitlines()[0].strip() or topic
+    question = QUESTIONS[digest % len(QUESTIONS)].format(topic=topic)
+    filler = ("Thanks for that answer. " if "USER_INPUT" in last else "")
+    text = filler + question
+    pad = " ".join(["Take your time and be specific."] * max(0, (words - len(text.split())) // 6))
+    text = (text + " " + pad).strip()
+    if "was cut off" in last:
+        # Continuation of a reply cut off by max_tokens (app.length_governor)
+        if "[QUESTION]" in last:
+            return f"[QUESTION]\n{question}\n[END]"
+        return "Take your time and be specific."
+    if messages and "[QUESTION]" in messages[0].get("content", ""):
+        # Structured technique: reasoning first, then the question
+        reasoning = " ".join([f"The candidate should show how they reason about {topic}."]
+                             * max(1, words // 10))
+        return f"[REASONING]\n{reasoning}\n[QUESTION]\n{text}\n[END]"
+    return text
+
+
+def _usage(messages, reply):
+    prompt = sum(len(m.get("content", "").split()) + 4 for m in messages) + 3
+    completion = len(reply.split())
+    return {"prompt_tokens": prompt, "completion_tokens": completion,
+            "total_tokens": prompt + completion,
+            "prompt_tokens_details": {"cached_tokens": 0}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeOpenAI/1.0"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, body: dict, headers: dict = None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [
+                {"id": "gpt-4.1-mini", "object": "model", "owned_by": "fake"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        server = self.server
+        behaviour = server.behaviour
+        model = request.get("model", "gpt-4.1-mini")
+        server.count("requests")
+
+        delay = behaviour.get(model, "latency") + behaviour.get(model, "jitter") * (2 * behaviour.random() - 1)
+        slow_rate = behaviour.get(model, "slow_rate")
+        if slow_rate and behaviour.random() < slow_rate:
+            delay += behaviour.get(model, "slow_latency")
+        if delay > 0:
+            time.sleep(delay)
+
+        if behaviour.random() < behaviour.get(model, "error_rate"):
+            server.count("errors")
+            status = behaviour.get(model, "error_status")
+            headers = {}
+            if behaviour.retry_after is not None:
+                headers["Retry-After"] = str(behaviour.retry_after)
+            self._send_json(status, {"error": {"message": f"injected {status}",
+                                               "type": "fake_error"}}, headers)
+            return
+
+        messages = request.get("messages", [])
+        reply = fake_reply(messages, behaviour.reply_words)
+        stop = request.get("stop") or []
+        for sequence in [stop] if isinstance(stop, str) else stop:
+            reply = reply.split(sequence, 1)[0].rstrip()
+        max_tokens = request.get("max_tokens") or request.get("max_completion_tokens")
+        finish_reason = "stop"
+        if max_tokens and len(reply.split()) > max_tokens:
+            reply = " ".join(reply.split()[:max_tokens])
+            finish_reason = "length"
+        completion_id = "chatcmpl-" + uuid.uuid4().hex[:12]
+        created = int(time.time())
+        usage = _usage(messages, reply)
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": created,
+                "model": model,
+                "choices": [{"index": 0, "finish_reason": finish_reason,
+                             "message": {"role": "assistant", "content": reply}}],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def send(chunk):
+            self.wfile.write(b"data: " + json.dumps(chunk).encode() + b"\n\n")
+            self.wfile.flush()
+
+        def chunk(delta, finish=None):
+            return {"id": completion_id, "object": "chat.completion.chunk",
+                    "created": created, "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+
+        ttft = behaviour.get(model, "ttft")
+        if ttft > 0:
+            time.sleep(ttft)
+        tps = behaviour.get(model, "tokens_per_second")
+        send(chunk({"role": "assistant", "content": ""}))
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            send(chunk({"content": word if i == 0 else " " + word}))
+            if tps > 0:
+                time.sleep(1 / tps)
+        send(chunk({}, finish_reason))
+        if (request.get("stream_options") or {}).get("include_usage"):
+            send({"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                  "model": model, "choices": [], "usage": usage})
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+class FakeOpenAIServer(ThreadingHTTPServer):
+    """
+    In-process fake server. Use as a context manager:
+
+        with FakeOpenAIServer(FakeBehaviour(latency=0.1)) as server:
+            Config.OPENAI_BASE_URL = server.base_url
+    """
+
+    daemon_threads = True
+
+    def __init__(self, behaviour: FakeBehaviour = None, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _Handler)
+        self.behaviour = behaviour or FakeBehaviour()
+        self.stats = {"requests": 0, "errors": 0}
+        self._stats_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def handle_error(self, request, client_address):
+        # A client that hung up (e.g. a cancelled hedged request) is normal here
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self) -> "FakeOpenAIServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake OpenAI chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=0.0)
+    parser.add_argument("--ttft", type=float, default=0.0)
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--reply-words", type=int, default=40)
+    args = parser.parse_args()
+
+    behaviour = FakeBehaviour(
+        latency=args.latency, jitter=args.jitter, ttft=args.ttft,
+        tokens_per_second=args.tokens_per_second, error_rate=args.error_rate,
+        error_status=args.error_status, retry_after=args.retry_after,
+        reply_words=args.reply_words, slow_rate=args.slow_rate,
+        slow_latency=args.slow_latency,
+    )
+    server = FakeOpenAIServer(behaviour, args.host, args.port)
+    print(f"Fake OpenAI server on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()